@@ -0,0 +1,917 @@
+#!/usr/bin/env python3
+
+# Audit of the image assets and the optimized copies shipped in their place.
+#
+# Every shield, logo and flag is decoded and checked against byte and pixel budgets,
+# then gets thumbnails at THUMBNAIL_SIZES, or a minified copy for SVGs. Derivatives are
+# named by the hash of the asset content. The cache maps the size and mtime of every
+# file to that hash and every hash to its audit, so a rerun only reads changed files.
+#
+# Without Pillow, PNGs are decoded here and only get PNG thumbnails. The other raster
+# formats only have their structure checked and get no thumbnails.
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import pickle
+import re
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from xml.etree import ElementTree
+
+import verify
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+ASSET_ROOTS = ["world", "stadium", "teams", "competitions"]
+ASSETS_DIR = "{build}/assets".format(build=verify.BUILD_DIR)
+MAX_BYTES = 256 * 1024
+MAX_PIXELS = 1024 * 1024
+THUMBNAIL_SIZES = [64, 128, 256]
+WEBP_QUALITY = 80
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Origin and step of the seven Adam7 passes of an interlaced PNG.
+ADAM7 = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+JPEG_FRAMES = set(range(0xc0, 0xd0)) - {0xc4, 0xc8, 0xcc}
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+# Elements and attributes of the editors the files were exported from, never rendered.
+EDITOR_NAMESPACES = {
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd",
+    "http://ns.adobe.com/AdobeIllustrator/10.0/",
+    "http://ns.adobe.com/Extensibility/1.0/",
+    "http://ns.adobe.com/SaveForWeb/1.0/",
+    "http://www.bohemiancoding.com/sketch/ns",
+}
+DROPPED_ELEMENTS = {"{" + SVG_NAMESPACE + "}metadata"}
+DROPPED_ATTRIBUTES = {"enable-background"}
+# Coordinates are rounded to the decimals that keep their error under this fraction of the
+# viewBox, after the transforms. Transform factors keep TRANSFORM_DIGITS significant digits.
+SVG_PRECISION = 1e-4
+TRANSFORM_DIGITS = 6
+ANGLE_DECIMALS = 3
+# Arguments of the path commands: coordinates, radii, angles and arc flags.
+PATH_ARGUMENTS = {"m": "xy", "l": "xy", "t": "xy", "h": "x", "v": "y", "c": "xyxyxy", "s": "xyxy", "q": "xyxy", "a": "rranffxy", "z": ""}
+NUMBER_REGEX = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+TRANSFORM_REGEX = re.compile(r"\s*(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)\s*,?")
+REFERENCE_REGEX = re.compile(r"#([^\s\"')]+)")
+# Only shapes inside these groups are rounded, other elements may use object bounding box units.
+SVG_CONTAINERS = {"g", "a", "switch"}
+SVG_SHAPES = {"path", "rect", "circle", "ellipse", "line", "polyline", "polygon", "use", "image"}
+SVG_LENGTHS = ["x", "y", "width", "height", "cx", "cy", "r", "rx", "ry", "x1", "y1", "x2", "y2", "stroke-width"]
+# Their contents are rendered where they are referenced, so they inherit nothing from here.
+SVG_UNRENDERED = {"defs", "symbol", "clipPath", "mask", "pattern", "marker", "linearGradient", "radialGradient", "filter", "font"}
+# Initial values of the inherited properties, and of some that are not inherited.
+SVG_INHERITED = {
+    "fill": "#000",
+    "fill-opacity": "1",
+    "fill-rule": "nonzero",
+    "clip-rule": "nonzero",
+    "stroke": "none",
+    "stroke-opacity": "1",
+    "stroke-width": "1",
+    "stroke-linecap": "butt",
+    "stroke-linejoin": "miter",
+    "stroke-miterlimit": "4",
+    "stroke-dasharray": "none",
+    "stroke-dashoffset": "0",
+    "visibility": "visible",
+    "font-style": "normal",
+    "font-weight": "normal",
+}
+SVG_DEFAULTS = {"opacity": "1", "display": "inline", "clip-path": "none", "mask": "none", "filter": "none"}
+# Penalty of a filtered byte when choosing the filter of a PNG row: small deltas compress best.
+FILTER_WEIGHTS = [value if value < 128 else 256 - value for value in range(256)]
+
+ElementTree.register_namespace("", SVG_NAMESPACE)
+ElementTree.register_namespace("xlink", "http://www.w3.org/1999/xlink")
+
+
+class Picture:
+    # Decoded pixels, one RGBA bytearray per row.
+    def __init__(self, width, height, rows):
+        self.width = width
+        self.height = height
+        self.rows = rows
+
+
+def png_chunks(data):
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("the PNG signature is missing")
+    position = 8
+    while position + 12 <= len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        if len(body) != length or position + 12 + length > len(data):
+            break
+        if zlib.crc32(kind + body) != struct.unpack(">I", data[position + 8 + length:position + 12 + length])[0]:
+            raise ValueError("the {kind} chunk is corrupt".format(kind=kind.decode("latin-1")))
+        yield kind, body
+        if kind == b"IEND":
+            return
+        position += 12 + length
+    raise ValueError("the file is truncated")
+
+
+def png_row_bytes(width, channels, depth):
+    return (width * channels * depth + 7) // 8
+
+
+def png_passes(width, height, interlaced):
+    # Each pass is a smaller image of columns x rows pixels, an image without interlacing has one.
+    passes = []
+    for x0, y0, dx, dy in ADAM7 if interlaced else [(0, 0, 1, 1)]:
+        columns = (width - x0 + dx - 1) // dx
+        rows = (height - y0 + dy - 1) // dy
+        if columns > 0 and rows > 0:
+            passes.append((x0, y0, dx, dy, columns, rows))
+    return passes
+
+
+def png_pixel_bytes(width, height, channels, depth, interlaced):
+    return sum(rows * (1 + png_row_bytes(columns, channels, depth)) for _, _, _, _, columns, rows in png_passes(width, height, interlaced))
+
+
+def unfilter_png(raw, stride, height, bpp):
+    # Up, the most common filter, adds whole rows at once as big integers without carries.
+    low = int.from_bytes(b"\x7f" * stride, "big")
+    high = int.from_bytes(b"\x80" * stride, "big")
+    previous = bytearray(stride)
+    rows = []
+    position = 0
+    for _ in range(height):
+        kind = raw[position]
+        row = bytearray(raw[position + 1:position + 1 + stride])
+        position += 1 + stride
+        if kind == 1:
+            for i in range(bpp, stride):
+                row[i] = (row[i] + row[i - bpp]) & 255
+        elif kind == 2:
+            a = int.from_bytes(row, "big")
+            b = int.from_bytes(previous, "big")
+            row = bytearray((((a & low) + (b & low)) ^ ((a ^ b) & high)).to_bytes(stride, "big"))
+        elif kind == 3:
+            for i in range(stride):
+                row[i] = (row[i] + ((row[i - bpp] if i >= bpp else 0) + previous[i]) // 2) & 255
+        elif kind == 4:
+            for i in range(stride):
+                a = row[i - bpp] if i >= bpp else 0
+                b = previous[i]
+                c = previous[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 255
+        elif kind != 0:
+            raise ValueError("a row has the unknown filter {kind}".format(kind=kind))
+        rows.append(row)
+        previous = row
+    return rows
+
+
+def png_samples(rows, width, channels, depth, color):
+    # Samples of 16 bits keep their high byte. Samples of 1, 2 and 4 bits are unpacked
+    # a byte at a time through a table, scaled to 8 bits unless they are palette indexes.
+    if depth == 8:
+        return rows
+    if depth == 16:
+        return [row[0::2] for row in rows]
+    per_byte = 8 // depth
+    mask = (1 << depth) - 1
+    scale = 1 if color == 3 else 255 // mask
+    table = [bytes(((value >> (8 - depth * (i + 1))) & mask) * scale for i in range(per_byte)) for value in range(256)]
+    return [bytearray(b"".join(map(table.__getitem__, row))[:width * channels]) for row in rows]
+
+
+def rgba_rows(rows, width, color, palette, transparency):
+    if color == 6:
+        return rows
+    if color == 3:
+        alphas = list(transparency) + [255] * (256 - len(transparency))
+        colors = [bytes(palette[i * 3:i * 3 + 3]) + bytes([alphas[i]]) for i in range(len(palette) // 3)]
+        colors += [b"\x00\x00\x00\xff"] * (256 - len(colors))
+        return [bytearray(b"".join(colors[index] for index in row)) for row in rows]
+    converted = []
+    for row in rows:
+        pixels = bytearray(width * 4)
+        if color == 2:
+            pixels[0::4] = row[0::3]
+            pixels[1::4] = row[1::3]
+            pixels[2::4] = row[2::3]
+            pixels[3::4] = b"\xff" * width
+        elif color == 4:
+            pixels[0::4] = pixels[1::4] = pixels[2::4] = row[0::2]
+            pixels[3::4] = row[1::2]
+        else:
+            pixels[0::4] = pixels[1::4] = pixels[2::4] = row
+            pixels[3::4] = b"\xff" * width
+        converted.append(pixels)
+    return converted
+
+
+def read_png(data, max_pixels):
+    # Every chunk checksum and the whole compressed stream are checked. Images within
+    # max_pixels are decoded into a Picture, pass by pass when they are interlaced.
+    header = None
+    palette = b""
+    transparency = b""
+    stream = zlib.decompressobj()
+    pixels = 0
+    picture = None
+    compressed = []
+    for kind, body in png_chunks(data):
+        if header is None and kind != b"IHDR":
+            raise ValueError("the IHDR chunk is not the first one")
+        if kind == b"IHDR":
+            width, height, depth, color, _, _, interlaced = header = struct.unpack(">IIBBBBB", body)
+            if width == 0 or height == 0 or not color in PNG_CHANNELS or not depth in (1, 2, 4, 8, 16):
+                raise ValueError("the IHDR chunk is invalid")
+            decode = width * height <= max_pixels
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"tRNS":
+            transparency = body
+        elif kind == b"IDAT":
+            while body:
+                chunk = stream.decompress(body, 1 << 20)
+                pixels += len(chunk)
+                if decode:
+                    compressed.append(chunk)
+                body = stream.unconsumed_tail
+    expected = png_pixel_bytes(width, height, PNG_CHANNELS[color], depth, interlaced)
+    if not stream.eof or pixels != expected:
+        raise ValueError("the image data has {pixels} bytes, expected {expected}".format(pixels=pixels, expected=expected))
+    if color == 3 and not palette:
+        raise ValueError("the palette is missing")
+    if decode:
+        raw = b"".join(compressed)
+        channels = PNG_CHANNELS[color]
+        position = 0
+        picture = Picture(width, height, [bytearray(width * 4) for _ in range(height)] if interlaced else [])
+        for x0, y0, dx, dy, columns, rows in png_passes(width, height, interlaced):
+            stride = png_row_bytes(columns, channels, depth)
+            filtered = unfilter_png(raw[position:position + rows * (1 + stride)], stride, rows, max(1, channels * depth // 8))
+            position += rows * (1 + stride)
+            pixels = rgba_rows(png_samples(filtered, columns, channels, depth, color), columns, color, palette, transparency)
+            if not interlaced:
+                picture.rows = pixels
+                continue
+            for y, row in zip(range(y0, height, dy), pixels):
+                for channel in range(4):
+                    picture.rows[y][x0 * 4 + channel::dx * 4] = row[channel::4]
+    return width, height, picture
+
+
+def read_jpeg(data):
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("the JPEG start marker is missing")
+    size = None
+    position = 2
+    while True:
+        if position + 4 > len(data):
+            raise ValueError("the file is truncated")
+        if data[position] != 0xff:
+            raise ValueError("the marker at byte {position} is corrupt".format(position=position))
+        marker = data[position + 1]
+        if marker == 0xff:
+            position += 1
+            continue
+        if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+            position += 2
+            continue
+        length = struct.unpack(">H", data[position + 2:position + 4])[0]
+        if marker in JPEG_FRAMES:
+            height, width = struct.unpack(">HH", data[position + 5:position + 9])
+            size = width, height
+        if marker == 0xda:
+            break
+        position += 2 + length
+    if size is None:
+        raise ValueError("the frame header is missing")
+    if data.rfind(b"\xff\xd9") < position:
+        raise ValueError("the file is truncated")
+    return size
+
+
+def skip_gif_blocks(data, position):
+    while position < len(data):
+        size = data[position]
+        position += 1 + size
+        if size == 0:
+            return position
+    raise ValueError("the file is truncated")
+
+
+def read_gif(data):
+    if not data[:6] in (b"GIF87a", b"GIF89a"):
+        raise ValueError("the GIF signature is missing")
+    width, height, flags = struct.unpack("<HHB", data[6:11])
+    position = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    frames = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("the file is truncated")
+        block = data[position]
+        if block == 0x3b:
+            break
+        if block == 0x21:
+            position = skip_gif_blocks(data, position + 2)
+        elif block == 0x2c:
+            flags = data[position + 9] if position + 9 < len(data) else 0
+            position += 10 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+            position = skip_gif_blocks(data, position + 1)
+            frames += 1
+        else:
+            raise ValueError("the block at byte {position} is corrupt".format(position=position))
+    if frames == 0:
+        raise ValueError("the image has no frames")
+    return width, height
+
+
+def read_webp(data):
+    if data[:4] != b"RIFF" or data[8:12] != b"WEBP":
+        raise ValueError("the WebP signature is missing")
+    if struct.unpack("<I", data[4:8])[0] + 8 > len(data):
+        raise ValueError("the file is truncated")
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b"VP8L" and data[20] == 0x2f:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3fff) + 1, (bits >> 14 & 0x3fff) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    raise ValueError("the {chunk} chunk is not a known WebP image".format(chunk=chunk.decode("latin-1")))
+
+
+def svg_length(value):
+    try:
+        return float(value.strip().removesuffix("px")) if value else None
+    except ValueError:
+        return None
+
+
+def read_svg(data):
+    root = ElementTree.fromstring(data)
+    if root.tag != "{" + SVG_NAMESPACE + "}svg":
+        raise ValueError("the root element is not an SVG")
+    width, height = svg_length(root.get("width")), svg_length(root.get("height"))
+    box = root.get("viewBox", "").replace(",", " ").split()
+    if (width is None or height is None) and len(box) == 4:
+        width, height = svg_length(box[2]), svg_length(box[3])
+    return round(width or 0), round(height or 0), root
+
+
+def namespace(name):
+    return name[1:].partition("}")[0] if name.startswith("{") else None
+
+
+def svg_value(value):
+    value = value.strip().lower()
+    if value == "black":
+        return "#000"
+    if re.fullmatch(r"#([0-9a-f])\1([0-9a-f])\2([0-9a-f])\3", value):
+        return "#" + value[1] + value[3] + value[5]
+    if NUMBER_REGEX.fullmatch(value.removesuffix("px")):
+        return "{value:g}".format(value=float(value.removesuffix("px")))
+    return value
+
+
+def svg_number(value, decimals):
+    text = "{value:.{decimals}f}".format(value=value, decimals=max(decimals, 0))
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = "-" + text[2:]
+    return "0" if text == "-0" else text
+
+
+def significant(value, digits):
+    return digits - 1 - math.floor(math.log10(abs(value))) if value else 0
+
+
+def join_numbers(tokens):
+    # Separators only where the next number would otherwise run into the previous one.
+    text = ""
+    last = ""
+    for token in tokens:
+        if last[-1:].isdigit() and (token[:1].isdigit() or token[:1] == "." and not "." in last):
+            text += " "
+        text += token
+        last = token
+    return text
+
+
+def parse_path(data):
+    segments = []
+    position = 0
+    command = None
+    while True:
+        while position < len(data) and data[position] in " \t\r\n,":
+            position += 1
+        if position == len(data):
+            return segments
+        if data[position].isalpha():
+            command = data[position]
+            position += 1
+            if not command.lower() in PATH_ARGUMENTS:
+                raise ValueError("unknown path command " + command)
+            if command in "zZ":
+                segments.append((command, []))
+                continue
+        elif command is None or command in "zZ":
+            raise ValueError("path data without a command")
+        arguments = []
+        for kind in PATH_ARGUMENTS[command.lower()]:
+            while position < len(data) and data[position] in " \t\r\n,":
+                position += 1
+            if kind == "f":
+                if not data[position:position + 1] in ("0", "1"):
+                    raise ValueError("invalid arc flag")
+                arguments.append(int(data[position]))
+                position += 1
+                continue
+            match = NUMBER_REGEX.match(data, position)
+            if match is None:
+                raise ValueError("invalid path number")
+            arguments.append(float(match.group()))
+            position = match.end()
+        segments.append((command, arguments))
+        # Coordinates after a moveto are implicit linetos.
+        command = {"m": "l", "M": "L"}.get(command, command)
+
+
+def minify_path(segments, decimals):
+    # Relative coordinates are rounded against the rounded current point, so the
+    # rounding errors of a long relative path never add up.
+    exact = [0.0, 0.0]
+    rounded = [0.0, 0.0]
+    start = ([0.0, 0.0], [0.0, 0.0])
+    tokens = []
+    previous = None
+    for command, arguments in segments:
+        relative = command.islower()
+        end_exact = list(exact)
+        end_rounded = list(rounded)
+        values = []
+        for kind, value in zip(PATH_ARGUMENTS[command.lower()], arguments):
+            if kind in "xy":
+                axis = 0 if kind == "x" else 1
+                target = exact[axis] + value if relative else value
+                emitted = round(target - rounded[axis], decimals) if relative else round(value, decimals)
+                values.append(svg_number(emitted, decimals))
+                end_exact[axis] = target
+                end_rounded[axis] = rounded[axis] + emitted if relative else emitted
+            elif kind == "r":
+                values.append(svg_number(round(value, decimals), decimals))
+            elif kind == "a":
+                values.append(svg_number(round(value, ANGLE_DECIMALS), ANGLE_DECIMALS))
+            else:
+                values.append(str(value))
+        if command in "zZ":
+            end_exact, end_rounded = list(start[0]), list(start[1])
+        exact, rounded = end_exact, end_rounded
+        if command in "mM":
+            start = (list(exact), list(rounded))
+        if command != previous or command in "mM":
+            if not (previous, command) in (("m", "l"), ("M", "L")):
+                tokens.append(command)
+        tokens.extend(values)
+        previous = command
+    return join_numbers(tokens)
+
+
+def parse_transform(value):
+    functions = []
+    position = 0
+    while position < len(value.rstrip()):
+        match = TRANSFORM_REGEX.match(value, position)
+        if match is None:
+            return None
+        arguments = match.group(2).replace(",", " ").split()
+        if not all(NUMBER_REGEX.fullmatch(argument) for argument in arguments):
+            return None
+        functions.append((match.group(1), [float(argument) for argument in arguments]))
+        position = match.end()
+    return functions
+
+
+def transform_scale(functions):
+    scale = 1.0
+    for name, arguments in functions:
+        if name == "matrix" and len(arguments) == 6:
+            scale *= math.sqrt(abs(arguments[0] * arguments[3] - arguments[1] * arguments[2]))
+        elif name == "scale" and arguments:
+            scale *= math.sqrt(abs(arguments[0] * arguments[-1]))
+    return scale
+
+
+def minify_transform(functions, decimals):
+    # Translations are coordinates of the parent, the other factors keep their significant digits.
+    texts = []
+    for name, arguments in functions:
+        values = []
+        for position, value in enumerate(arguments):
+            if name == "translate" or name == "matrix" and position >= 4 or name == "rotate" and position >= 1:
+                places = decimals
+            elif name in ("rotate", "skewX", "skewY"):
+                places = ANGLE_DECIMALS
+            else:
+                places = significant(value, TRANSFORM_DIGITS)
+            values.append(svg_number(round(value, places), places))
+        texts.append(name + "(" + join_numbers(values) + ")")
+    return " ".join(texts)
+
+
+def svg_decimals(tolerance, scale):
+    return max(0, math.ceil(-math.log10(tolerance / scale)))
+
+
+def parse_style(style):
+    declarations = {}
+    for declaration in style.split(";"):
+        name, _, value = declaration.partition(":")
+        if name.strip() and value.strip():
+            declarations[name.strip()] = value.strip()
+    return declarations
+
+
+def strip_defaults(element, inherited):
+    # A property is dropped when it only repeats what the element would get anyway. The
+    # style attribute wins over the presentation attribute of the same property.
+    style = {name: value for name, value in parse_style(element.get("style", "")).items() if not name.startswith("-inkscape")}
+    inherited = dict(inherited)
+    for name in list(style) + [key for key in element.attrib if key in SVG_INHERITED or key in SVG_DEFAULTS]:
+        if name in style and name in element.attrib:
+            del element.attrib[name]
+        value = style.get(name, element.get(name))
+        if value is None:
+            continue
+        if name in SVG_INHERITED:
+            same = value.strip() == "inherit" or svg_value(value) == inherited[name]
+        elif name in SVG_DEFAULTS:
+            same = svg_value(value) == SVG_DEFAULTS[name]
+        else:
+            continue
+        if same:
+            style.pop(name, None)
+            element.attrib.pop(name, None)
+        elif name in SVG_INHERITED:
+            inherited[name] = svg_value(value)
+    if style:
+        element.set("style", ";".join(name + ":" + value for name, value in style.items()))
+    else:
+        element.attrib.pop("style", None)
+    return inherited
+
+
+def minify_element(element, tolerance, scale, inherited, referenced):
+    # scale is None where the coordinates can not be rounded, inherited is None where the
+    # inherited properties are not known.
+    if namespace(element.tag) != SVG_NAMESPACE:
+        return
+    name = element.tag.rpartition("}")[2]
+    if element.get("id") in referenced:
+        inherited = None
+    if inherited is not None:
+        inherited = strip_defaults(element, inherited)
+    if element.get("transform") is not None:
+        functions = parse_transform(element.get("transform"))
+        if functions is None or scale is None or transform_scale(functions) == 0:
+            scale = None
+        else:
+            element.set("transform", minify_transform(functions, svg_decimals(tolerance, scale)))
+            scale *= transform_scale(functions)
+    if scale is not None and name in SVG_SHAPES:
+        decimals = svg_decimals(tolerance, scale)
+        for key in SVG_LENGTHS:
+            if NUMBER_REGEX.fullmatch(element.get(key, "")):
+                element.set(key, svg_number(round(float(element.get(key)), decimals), decimals))
+        try:
+            if name == "path" and element.get("d") is not None:
+                element.set("d", minify_path(parse_path(element.get("d")), decimals))
+        except ValueError:
+            pass
+        points = element.get("points", "").replace(",", " ").split()
+        if name in ("polygon", "polyline") and points and all(NUMBER_REGEX.fullmatch(point) for point in points):
+            element.set("points", join_numbers([svg_number(round(float(point), decimals), decimals) for point in points]))
+    for child in element:
+        minify_element(child, tolerance, scale if name in SVG_CONTAINERS else None, inherited if not name in SVG_UNRENDERED else None, referenced)
+
+
+def minify_svg(root):
+    # Comments and processing instructions are already gone once parsed.
+    referenced = set()
+    styled = False
+    for element in root.iter():
+        for child in list(element):
+            if child.tag in DROPPED_ELEMENTS or namespace(child.tag) in EDITOR_NAMESPACES:
+                element.remove(child)
+        for key in list(element.attrib):
+            if key in DROPPED_ATTRIBUTES or namespace(key) in EDITOR_NAMESPACES:
+                del element.attrib[key]
+            elif key.endswith("href") and element.attrib[key].startswith("data:"):
+                # Base64 decoders skip whitespace, the encoders wrap lines with it.
+                element.attrib[key] = "".join(element.attrib[key].split())
+        if element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+        styled = styled or element.tag == "{" + SVG_NAMESPACE + "}style"
+        for value in element.attrib.values():
+            referenced.update(REFERENCE_REGEX.findall(value))
+    # A stylesheet may set any property, so the defaults are only dropped without one.
+    inherited = None if styled else strip_defaults(root, {name: svg_value(value) for name, value in SVG_INHERITED.items()})
+    box = [svg_length(value) for value in root.get("viewBox", "").replace(",", " ").split()]
+    size = max(box[2:]) if len(box) == 4 and not None in box else max(svg_length(root.get("width")) or 0, svg_length(root.get("height")) or 0)
+    for child in root:
+        minify_element(child, SVG_PRECISION * size, 1.0 if size else None, inherited, referenced)
+    # Text and attributes have their > escaped, so " />" only ever closes an element.
+    return ElementTree.tostring(root, encoding="utf-8", xml_declaration=False).replace(b" />", b"/>")
+
+
+def resize(picture, width, height):
+    # Box filter over premultiplied alpha, so transparent pixels do not darken the edges.
+    def spans(source, target):
+        return [(i * source // target, max((i + 1) * source // target, i * source // target + 1)) for i in range(target)]
+
+    columns = spans(picture.width, width)
+    narrow = []
+    for row in picture.rows:
+        sums = []
+        for x0, x1 in columns:
+            r = g = b = a = 0
+            for i in range(x0 * 4, x1 * 4, 4):
+                alpha = row[i + 3]
+                r += row[i] * alpha
+                g += row[i + 1] * alpha
+                b += row[i + 2] * alpha
+                a += alpha
+            sums.append((r, g, b, a, x1 - x0))
+        narrow.append(sums)
+    rows = []
+    for y0, y1 in spans(picture.height, height):
+        row = bytearray(width * 4)
+        for x in range(width):
+            r = g = b = a = count = 0
+            for y in range(y0, y1):
+                pr, pg, pb, pa, pc = narrow[y][x]
+                r += pr
+                g += pg
+                b += pb
+                a += pa
+                count += pc
+            if a:
+                row[x * 4:x * 4 + 4] = bytes(((r + a // 2) // a, (g + a // 2) // a, (b + a // 2) // a, (a + count // 2) // count))
+        rows.append(row)
+    return Picture(width, height, rows)
+
+
+def png_chunk(kind, body):
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def write_png(picture):
+    # Opaque pictures drop the alpha channel, every row takes the filter with the smallest deltas.
+    opaque = all(row[3::4].count(255) == picture.width for row in picture.rows)
+    bpp = 3 if opaque else 4
+    raw = []
+    previous = bytes(picture.width * bpp)
+    for row in picture.rows:
+        if opaque:
+            row = bytearray(row)
+            del row[3::4]
+        sub = bytes((row[i] - (row[i - bpp] if i >= bpp else 0)) & 255 for i in range(len(row)))
+        up = bytes((row[i] - previous[i]) & 255 for i in range(len(row)))
+        candidates = [(0, bytes(row)), (1, sub), (2, up)]
+        kind, filtered = min(candidates, key=lambda candidate: sum(map(FILTER_WEIGHTS.__getitem__, candidate[1])))
+        raw.append(bytes([kind]) + filtered)
+        previous = row
+    header = struct.pack(">IIBBBBB", picture.width, picture.height, 8, 2 if opaque else 6, 0, 0, 0)
+    return PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(b"".join(raw), 9)) + png_chunk(b"IEND", b"")
+
+
+def thumbnail_size(width, height, size):
+    if width <= size and height <= size:
+        return None
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def write_derivative(path, data):
+    with open(path + ".tmp", "wb") as derivative:
+        derivative.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def derivative_path(output, digest, name):
+    return "{output}/files/{digest}-{name}".format(output=output, digest=digest, name=name)
+
+
+def pillow_thumbnails(data, digest, sizes, output):
+    derivatives = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        width, height = image.size
+        image = image.convert("RGBA")
+    for size in sorted(sizes, reverse=True):
+        target = thumbnail_size(width, height, size)
+        if target is None:
+            continue
+        thumbnail = image.resize(target, Image.LANCZOS)
+        for kind, options in [("png", {"optimize": True}), ("webp", {"quality": WEBP_QUALITY, "method": 6})]:
+            path = derivative_path(output, digest, "{size}.{kind}".format(size=size, kind=kind))
+            encoded = io.BytesIO()
+            thumbnail.save(encoded, kind.upper(), **options)
+            write_derivative(path, encoded.getvalue())
+            derivatives["{size}.{kind}".format(size=size, kind=kind)] = path
+    return width, height, derivatives
+
+
+def audit_asset(sizes, max_pixels, output, path, digest):
+    with open(path, "rb") as asset_file:
+        data = asset_file.read()
+    kind = path.rpartition(".")[2]
+    result = {"kind": kind, "bytes": len(data), "width": None, "height": None, "error": None, "derivatives": {}}
+    try:
+        if kind == "svg":
+            result["width"], result["height"], root = read_svg(data)
+            derivative = derivative_path(output, digest, "min.svg")
+            minified = minify_svg(root)
+            write_derivative(derivative, minified if len(minified) < len(data) else data)
+            result["derivatives"]["min.svg"] = derivative
+        elif Image is not None:
+            result["width"], result["height"], result["derivatives"] = pillow_thumbnails(data, digest, sizes, output)
+        elif kind == "png":
+            result["width"], result["height"], picture = read_png(data, max_pixels)
+            for size in sorted(sizes, reverse=True):
+                target = picture and thumbnail_size(picture.width, picture.height, size)
+                if target:
+                    picture = resize(picture, *target)
+                    derivative = derivative_path(output, digest, "{size}.png".format(size=size))
+                    write_derivative(derivative, write_png(picture))
+                    result["derivatives"]["{size}.png".format(size=size)] = derivative
+        else:
+            result["width"], result["height"] = {"jpg": read_jpeg, "jpeg": read_jpeg, "gif": read_gif, "webp": read_webp}[kind](data)
+    except (ValueError, IndexError, struct.error, zlib.error, ElementTree.ParseError) as e:
+        result["error"] = str(e) or type(e).__name__
+    except Exception as e:
+        # Pillow raises its own errors for images it cannot decode.
+        if Image is None:
+            raise
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+class AssetCache:
+    def __init__(self, path, settings):
+        self.path = path
+        version = hashlib.sha1(repr(settings).encode("utf-8"))
+        with open(__file__, "rb") as source:
+            version.update(source.read())
+        self.version = version.hexdigest()
+        self.stamps = {}
+        self.results = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "rb") as cache_file:
+                    version, stamps, results = pickle.load(cache_file)
+                if version == self.version:
+                    self.stamps = stamps
+                    self.results = results
+            except Exception:
+                print("Ignoring unreadable cache", path)
+
+    def digest(self, path):
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        cached = self.stamps.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1], True
+        with open(path, "rb") as asset_file:
+            digest = hashlib.sha1(asset_file.read()).hexdigest()
+        self.stamps[path] = (stamp, digest)
+        return digest, False
+
+    def lookup(self, digest):
+        result = self.results.get(digest)
+        if result is None or not all(os.path.isfile(path) for path in result["derivatives"].values()):
+            return None
+        return result
+
+    def save(self, paths):
+        stamps = {path: self.stamps[path] for path in paths}
+        digests = {stamp[1] for stamp in stamps.values()}
+        results = {digest: result for digest, result in self.results.items() if digest in digests}
+        with open(self.path + ".tmp", "wb") as cache_file:
+            pickle.dump((self.version, stamps, results), cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def list_assets(roots):
+    assets = []
+    for root in roots:
+        for directory, directories, files in os.walk(root):
+            directories.sort()
+            assets.extend(os.path.join(directory, name) for name in sorted(files) if name.rpartition(".")[2] in verify.IMAGE_KINDS)
+    return assets
+
+
+def check_asset(path, result, max_bytes, max_pixels):
+    directory, _, name = path.rpartition("/")
+    image = name.rpartition(".")[0]
+    error = "  Error found on {entity}:".format(entity=verify.entity_kind(directory))
+    slug = directory.rpartition("/")[2]
+    with verify.checking(directory):
+        if result["error"] is not None:
+            verify.exit_with_error(error, slug, "the", image, "image", name, "is invalid,", result["error"])
+        if result["bytes"] > max_bytes:
+            verify.continue_with_error(error, slug, "the", image, "image", name, "has", result["bytes"], "bytes, over the budget of", max_bytes)
+        if result["kind"] != "svg" and result["width"] * result["height"] > max_pixels:
+            verify.continue_with_error(error, slug, "the", image, "image", name, "has {width}x{height} pixels, over the budget of".format(width=result["width"], height=result["height"]), max_pixels)
+
+
+def audit_assets(paths, cache, pool, sizes, max_pixels, output):
+    digests = {}
+    pending = {}
+    stamped = 0
+    for path in paths:
+        digest, known = cache.digest(path)
+        digests[path] = digest
+        stamped += known
+        if cache.lookup(digest) is None:
+            pending.setdefault(digest, path)
+    os.makedirs(output + "/files", exist_ok=True)
+    audit = partial(audit_asset, sizes, max_pixels, output)
+    items = list(pending.items())
+    results = pool.map(audit, [path for _, path in items], [digest for digest, _ in items]) if pool is not None else map(audit, [path for _, path in items], [digest for digest, _ in items])
+    for (digest, _), result in zip(items, results):
+        cache.results[digest] = result
+    return {path: (digest, cache.results[digest]) for path, digest in digests.items()}, len(items), stamped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode every image asset, check it against the byte and pixel budgets and write its optimized derivatives")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes decoding the assets, 0 uses every core")
+    parser.add_argument("-o", "--output", default=ASSETS_DIR, help="directory to write the derivatives, the manifest and the cache into")
+    parser.add_argument("--no-cache", action="store_true", help="audit every asset from scratch, ignoring the cache")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES, help="largest size of an asset file in bytes")
+    parser.add_argument("--max-pixels", type=int, default=MAX_PIXELS, help="largest number of pixels of a raster asset, larger PNGs get no thumbnails without Pillow")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in THUMBNAIL_SIZES), help="comma separated sides in pixels of the square boxes the thumbnails fit in")
+    parser.add_argument("--report", help="json file to write every problem found into, - writes to the standard output")
+    args = parser.parse_args()
+
+    try:
+        sizes = sorted({int(size) for size in args.sizes.split(",") if size})
+    except ValueError:
+        verify.exit_with_error("Error: invalid thumbnail sizes", args.sizes)
+    os.makedirs(args.output, exist_ok=True)
+    cache = AssetCache(os.path.join(args.output, "cache"), (sizes, args.max_pixels, Image is not None, os.path.abspath(args.output)))
+    if args.no_cache:
+        cache.stamps, cache.results = {}, {}
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    paths = list_assets(ASSET_ROOTS)
+    with ProcessPoolExecutor(jobs) if jobs > 1 else contextlib.nullcontext() as pool:
+        audited, decoded, stamped = audit_assets(paths, cache, pool, sizes, args.max_pixels, args.output)
+    cache.save(paths)
+
+    print("Checking assets:")
+    verify.REPORT = verify.Report()
+    for path, (digest, result) in audited.items():
+        check_asset(path, result, args.max_bytes, args.max_pixels)
+
+    manifest = {path: {"hash": digest, "kind": result["kind"], "bytes": result["bytes"], "width": result["width"], "height": result["height"], "derivatives": result["derivatives"]} for path, (digest, result) in audited.items()}
+    verify.write_output(os.path.join(args.output, "manifest.json"), json.dumps(manifest, indent=1) + "\n")
+
+    print("{assets} assets, {decoded} decoded, {cached} from the cache, {hashed} hashed again".format(assets=len(paths), decoded=decoded, cached=len(paths) - decoded, hashed=len(paths) - stamped))
+    original = sum(result["bytes"] for _, result in audited.values())
+    print("{bytes} bytes of assets".format(bytes=original))
+    for name in ["min.svg"] + ["{size}.{kind}".format(size=size, kind=kind) for size in sizes for kind in ["png", "webp"]]:
+        files = {result["derivatives"][name] for _, result in audited.values() if name in result["derivatives"]}
+        if files:
+            print("{count} {name} derivatives, {bytes} bytes".format(count=len(files), name=name, bytes=sum(os.path.getsize(path) for path in files)))
+    missing = sum(1 for _, result in audited.values() if result["kind"] != "svg" and result["error"] is None and not result["derivatives"] and max(result["width"], result["height"]) > min(sizes))
+    if missing:
+        print(missing, "raster assets without thumbnails" if Image is not None else "raster assets without thumbnails, install Pillow to decode them")
+    if verify.REPORT.problems:
+        verify.write_report(args.report)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
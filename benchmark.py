@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import string
+import tempfile
+import time
+
+import verify
+
+
+BENCHMARK_FILE = "{build}/benchmark.json".format(build=verify.BUILD_DIR)
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1 1"/>\n'
+SLUG_DIGITS = string.digits + string.ascii_lowercase
+VACATION_DATES = 4
+TOLERANCE = 1.5
+# Below this a phase is noise, a regression is only reported on slower phases.
+MINIMUM_TIME = 0.005
+SUPERLINEAR = 1.5
+
+
+def write_json(path, data):
+    with open(path + "/data.json", "w") as json_file:
+        json.dump(data, json_file, indent=4, ensure_ascii=False)
+
+
+def write_image(path, image):
+    with open("{path}/{image}.svg".format(path=path, image=image), "w") as image_file:
+        image_file.write(SVG)
+
+
+def localized(text):
+    return {"en": text}
+
+
+def team_slug(number):
+    # Always four characters, a letter first, so every slug passes verify_name.
+    rest = ""
+    value = number // 26
+    for _ in range(3):
+        value, digit = divmod(value, 36)
+        rest = SLUG_DIGITS[digit] + rest
+    return string.ascii_lowercase[number % 26] + rest
+
+
+def coordinate(rng):
+    value = 0.0
+    while value == 0.0:
+        value = round(rng.uniform(-60, 60), 6)
+    return value
+
+
+def subdirectories(paths):
+    return [os.path.join(path, name) for path in paths for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
+
+
+def current_size():
+    confederations = subdirectories(["world"])
+    countries = subdirectories(confederations)
+    regions = subdirectories(countries)
+    return {
+        "confederations": len(confederations),
+        "countries": len(countries),
+        "regions": len(regions),
+        "cities": len(subdirectories(regions)),
+        "stadiums": len(os.listdir("stadium")),
+        "teams": len(os.listdir("teams")),
+    }
+
+
+class Planned:
+    def __init__(self, slug, kind, mechanics, first=None, sources=None):
+        self.slug = slug
+        self.kind = kind
+        self.mechanics = mechanics
+        self.first = first
+        self.sources = sources
+        self.relegation = None
+
+
+def plan_competitions(teams):
+    # Every team plays one regional competition, national competitions take the teams in
+    # order while they last, and each national-a feeds a cup with a regional-a through a
+    # teams source. The three kinds use disjoint dates so no team is booked twice.
+    regionals = [mechanics for mechanics in verify.SUPPORTED_MECHANICS if mechanics.startswith("regional")]
+    nationals = [mechanics for mechanics in verify.SUPPORTED_MECHANICS if mechanics.startswith("national")]
+    cup = next(mechanics for mechanics in regionals if verify.SUPPORTED_MECHANICS[mechanics].teams == verify.SUPPORTED_MECHANICS["national-a"].teams + verify.SUPPORTED_MECHANICS["regional-a"].teams)
+
+    competitions = []
+    total = 0
+    while total < teams:
+        mechanics = regionals[len(competitions) % len(regionals)]
+        competitions.append(Planned("{mechanics}-{number}".format(mechanics=mechanics, number=len(competitions)), "regional", mechanics, total))
+        total += verify.SUPPORTED_MECHANICS[mechanics].teams
+
+    # Each national-a starts a pyramid, every division relegates into the next one.
+    first = 0
+    divisions = []
+    while first + verify.SUPPORTED_MECHANICS[nationals[len(divisions) % len(nationals)]].teams <= total:
+        mechanics = nationals[len(divisions) % len(nationals)]
+        division = Planned("{mechanics}-{number}".format(mechanics=mechanics, number=len(divisions)), "national", mechanics, first)
+        if divisions and mechanics != nationals[0]:
+            divisions[-1].relegation = division.slug
+        divisions.append(division)
+        first += verify.SUPPORTED_MECHANICS[mechanics].teams
+    competitions.extend(divisions)
+
+    # Cups share their dates, so no team may enter two of them.
+    def members(competition):
+        return set(range(competition.first, competition.first + verify.SUPPORTED_MECHANICS[competition.mechanics].teams))
+
+    entered = set()
+    regional_a = [competition for competition in competitions if competition.mechanics == "regional-a"]
+    for division in [division for division in divisions if division.mechanics == "national-a"]:
+        for regional in regional_a:
+            teams = members(division) | members(regional)
+            if len(teams) == verify.SUPPORTED_MECHANICS[cup].teams and not teams & entered:
+                entered |= teams
+                regional_a.remove(regional)
+                competitions.append(Planned("cup-{number}".format(number=len(competitions)), "cup", cup, sources=[division.slug, regional.slug]))
+                break
+    return total, competitions
+
+
+def generate(root, scale, seed=0):
+    rng = random.Random(seed)
+    base = current_size()
+    size = {kind: max(1, round(count * scale)) for kind, count in base.items()}
+    size["teams"], competitions = plan_competitions(size["teams"])
+
+    os.makedirs(root + "/world")
+    write_json(root + "/world", {"name": localized("World"), "nickname": localized("World")})
+    write_image(root + "/world", "logo")
+    confederations = []
+    for number in range(size["confederations"]):
+        path = "{root}/world/conf-{number}".format(root=root, number=number)
+        os.makedirs(path)
+        write_json(path, {"name": localized("Confederation {number}".format(number=number)), "nickname": localized("C{number}".format(number=number))})
+        write_image(path, "logo")
+        confederations.append("conf-{number}".format(number=number))
+    countries = []
+    for number in range(size["countries"]):
+        confederation = confederations[number % len(confederations)]
+        path = "{root}/world/{confederation}/country-{number}".format(root=root, confederation=confederation, number=number)
+        os.makedirs(path)
+        write_json(path, {"name": localized("Country {number}".format(number=number))})
+        write_image(path, "flag")
+        countries.append((confederation, "country-{number}".format(number=number)))
+    regions = []
+    for number in range(size["regions"]):
+        confederation, country = countries[number % len(countries)]
+        path = "{root}/world/{confederation}/{country}/r{number}".format(root=root, confederation=confederation, country=country, number=number)
+        os.makedirs(path)
+        write_json(path, {"name": localized("Region {number}".format(number=number))})
+        write_image(path, "flag")
+        regions.append((confederation, country, "r{number}".format(number=number)))
+    cities = []
+    for number in range(size["cities"]):
+        confederation, country, region = regions[number % len(regions)]
+        path = "{root}/world/{confederation}/{country}/{region}/city-{number}".format(root=root, confederation=confederation, country=country, region=region, number=number)
+        os.makedirs(path)
+        write_json(path, {"name": localized("City {number}".format(number=number)), "coord": {"lat": coordinate(rng), "lon": coordinate(rng)}})
+        write_image(path, "flag")
+        cities.append((confederation, country, region, "city-{number}".format(number=number)))
+
+    for number in range(size["stadiums"]):
+        path = "{root}/stadium/stadium-{number}".format(root=root, number=number)
+        os.makedirs(path)
+        write_json(path, {"name": localized("Stadium {number}".format(number=number)), "nickname": localized("S{number}".format(number=number)), "capacity": rng.randint(1000, 90000), "coord": {"lat": coordinate(rng), "lon": coordinate(rng)}})
+
+    teams = [team_slug(number) for number in range(size["teams"])]
+    for number, team in enumerate(teams):
+        path = "{root}/teams/{team}".format(root=root, team=team)
+        os.makedirs(path)
+        continent, country, region, city = cities[number % len(cities)]
+        write_json(path, {
+            "name": localized("Team {team}".format(team=team)),
+            "nickname": localized(team.capitalize()),
+            "acronym": localized(team.upper()),
+            "stadium": "stadium-{number}".format(number=number % size["stadiums"]),
+            "world": {"continent": continent, "country": country, "region": region, "city": city},
+        })
+        write_image(path, "shield")
+
+    # Vacation first, then one block of dates per kind of competition.
+    blocks = {}
+    dates = VACATION_DATES
+    for competition in competitions:
+        if not competition.kind in blocks:
+            blocks[competition.kind] = dates
+            dates += max(verify.SUPPORTED_MECHANICS[other.mechanics].dates for other in competitions if other.kind == competition.kind)
+    calendar = {str(date + 1): ["vacation"] if date < VACATION_DATES else [] for date in range(dates)}
+    for competition in competitions:
+        path = "{root}/competitions/{slug}".format(root=root, slug=competition.slug)
+        os.makedirs(path)
+        data = {"name": localized(competition.slug.replace("-", " ").title()), "nickname": localized(competition.slug.upper()), "mechanics": competition.mechanics}
+        if competition.relegation is not None:
+            data["relegation"] = competition.relegation
+        if competition.sources is not None:
+            data["teams_source"] = competition.sources
+        else:
+            data["teams"] = teams[competition.first:competition.first + verify.SUPPORTED_MECHANICS[competition.mechanics].teams]
+        write_json(path, data)
+        write_image(path, "logo")
+        for date in range(verify.SUPPORTED_MECHANICS[competition.mechanics].dates):
+            calendar[str(blocks[competition.kind] + date + 1)].append(competition.slug)
+    write_json(root + "/competitions", calendar)
+
+    size["competitions"] = len(competitions)
+    return size
+
+
+def timed(phases, phase, check, *args):
+    started = time.perf_counter()
+    result = check(*args)
+    elapsed = time.perf_counter() - started
+    phases[phase] = min(phases.get(phase, elapsed), elapsed)
+    return result
+
+
+def run_phases(phases):
+    verify.index_assets.cache_clear()
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            check_phases(phases)
+    except SystemExit:
+        # A generated dataset verify rejects is a bug of the generator, show why.
+        print(output.getvalue(), end="")
+        raise
+
+
+def check_phases(phases):
+    timed(phases, "index_assets", lambda: [verify.index_assets(root) for root in verify.ASSET_ROOTS])
+    stadiums = timed(phases, "check_stadiums", verify.check_stadiums)
+    locations = timed(phases, "check_locations", verify.check_locations)
+    teams = timed(phases, "check_teams", verify.check_teams, stadiums, locations)
+    competitions = timed(phases, "check_competitions", verify.check_competitions, teams)
+    index = timed(phases, "index_competitions", verify.index_competitions, competitions)
+    timed(phases, "check_teams_has_competitions", verify.check_teams_has_competitions, teams, index)
+    timed(phases, "check_mechanics", verify.check_mechanics, competitions, index)
+    timed(phases, "check_calendar", lambda: verify.check_calendar(verify.index_calendar(competitions, index), index))
+    timed(phases, "check_regions", lambda: [verify.check_regions(teams, index, ["sp"], 2), verify.check_regions(teams, index, ["pr", "rs", "sc"], 3)])
+    timed(phases, "check_duplicates", verify.check_duplicates, stadiums, locations, teams)
+
+
+def benchmark(scale, repeat, seed, keep):
+    root = os.path.abspath(os.path.join(keep, "scale-{scale:g}".format(scale=scale))) if keep else tempfile.mkdtemp(prefix="benchmark-")
+    if keep and os.path.isdir(root):
+        shutil.rmtree(root)
+    started = time.perf_counter()
+    size = generate(root, scale, seed)
+    generated = time.perf_counter() - started
+
+    phases = {}
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        for _ in range(repeat):
+            run_phases(phases)
+    finally:
+        os.chdir(cwd)
+        verify.index_assets.cache_clear()
+        if not keep:
+            shutil.rmtree(root)
+    return {"size": size, "generated": generated, "phases": phases, "total": sum(phases.values())}
+
+
+def growth(results, phase, scales):
+    # The exponent of the time against the dataset size: 1 is linear, 2 quadratic.
+    exponents = []
+    for smaller, larger in zip(scales, scales[1:]):
+        a, b = results[smaller]["phases"][phase], results[larger]["phases"][phase]
+        ratio = float(larger) / float(smaller)
+        if a >= MINIMUM_TIME and ratio > 1:
+            exponents.append(math.log(b / a) / math.log(ratio))
+    return max(exponents) if exponents else None
+
+
+def print_results(results, scales):
+    print("\n{phase:<30}".format(phase="phase") + "".join("{scale:>12}".format(scale="x{scale}".format(scale=scale)) for scale in scales) + "  growth")
+    for phase in results[scales[0]]["phases"]:
+        exponent = growth(results, phase, scales)
+        print("{phase:<30}".format(phase=phase) + "".join("{time:>10.1f}ms".format(time=results[scale]["phases"][phase] * 1000) for scale in scales) + ("  n^{exponent:.2f}{warning}".format(exponent=exponent, warning=" superlinear" if exponent > SUPERLINEAR else "") if exponent is not None else "  -"))
+    print("{phase:<30}".format(phase="total") + "".join("{time:>10.1f}ms".format(time=results[scale]["total"] * 1000) for scale in scales))
+
+
+def compare(results, baseline, tolerance):
+    regressions = 0
+    for scale, result in results.items():
+        if not scale in baseline["scales"]:
+            continue
+        previous = baseline["scales"][scale]
+        if previous["size"] != result["size"]:
+            print("Skipping x{scale}, the generated dataset changed since the baseline".format(scale=scale))
+            continue
+        for phase, elapsed in result["phases"].items():
+            before = previous["phases"].get(phase)
+            if before is not None and elapsed >= MINIMUM_TIME and elapsed > before * tolerance:
+                print("Regression on x{scale} {phase}: {before:.1f}ms -> {after:.1f}ms".format(scale=scale, phase=phase, before=before * 1000, after=elapsed * 1000))
+                regressions += 1
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every verify phase on synthetic datasets scaled from the current one")
+    parser.add_argument("-s", "--scales", default="1,10,100", help="comma separated multiples of the current dataset size")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs per scale, the fastest time of each phase is kept")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the generated coordinates and capacities")
+    parser.add_argument("--keep", metavar="DIR", help="generate the datasets into DIR and keep them")
+    parser.add_argument("-o", "--output", default=BENCHMARK_FILE, help="json file to write the results into")
+    parser.add_argument("--compare", metavar="FILE", help="previous results to compare with, exits with an error on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="slowdown ratio over the baseline reported as a regression")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            verify.exit_with_error("Error: invalid benchmark file", args.compare, e)
+
+    scales = [str(float(scale)).removesuffix(".0") for scale in args.scales.split(",")]
+    results = {}
+    for scale in scales:
+        result = benchmark(float(scale), args.repeat, args.seed, args.keep)
+        print("x{scale}: {teams} teams, {cities} cities, {stadiums} stadiums, {competitions} competitions, generated in {generated:.1f}s, verified in {total:.2f}s".format(scale=scale, generated=result["generated"], total=result["total"], **result["size"]))
+        results[scale] = result
+    print_results(results, scales)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as output_file:
+        json.dump({"seed": args.seed, "repeat": args.repeat, "scales": results}, output_file, indent=1)
+
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
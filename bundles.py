@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Per-language bundles of the localized strings.
+#
+# Every bundle holds the strings of one language, with the fallback chain already
+# applied: "strings" is the interned string table, "fields" the localized fields of
+# each entity type and "entities" maps every slug to the string index of each of its
+# fields, or null when no language of the chain has it. Cities, regions and countries
+# are keyed by their path under the world, e.g. conmebol/brazil/sp/santos.
+
+import argparse
+import json
+import os
+
+import verify
+
+
+BUNDLES_DIR = "{build}/bundles".format(build=verify.BUILD_DIR)
+FALLBACKS = {
+    "en": ["pt", "es"],
+    "es": ["pt", "en"],
+    "pt": ["es", "en"],
+}
+BUNDLE_FIELDS = {
+    "world": ["name", "nickname"],
+    "confederations": ["name", "nickname"],
+    "countries": ["name"],
+    "regions": ["name"],
+    "cities": ["name"],
+    "stadiums": ["name", "nickname"],
+    "teams": ["name", "nickname", "acronym"],
+    "competitions": ["name", "nickname"],
+}
+
+
+class BundleWriter:
+    def __init__(self, language, chain):
+        self.language = language
+        self.chain = [language] + chain
+        self.strings = {}
+        self.entities = {kind: {} for kind in BUNDLE_FIELDS}
+
+    def string(self, localized):
+        for language in self.chain:
+            value = localized.get(language)
+            if value:
+                if not value in self.strings:
+                    self.strings[value] = len(self.strings)
+                return self.strings[value]
+        return None
+
+    def add(self, kind, key, value):
+        self.entities[kind][key] = [self.string(getattr(value, field)) for field in BUNDLE_FIELDS[kind]]
+
+    def to_json(self):
+        return {
+            "language": self.language,
+            "fallbacks": self.chain[1:],
+            "strings": list(self.strings),
+            "fields": BUNDLE_FIELDS,
+            "entities": self.entities,
+        }
+
+
+def build_bundle(language, chain, locations, stadiums, teams, competitions):
+    writer = BundleWriter(language, chain)
+    writer.add("world", "world", locations)
+    confs = locations.confederations
+    for conf in sorted(confs):
+        writer.add("confederations", conf, confs[conf])
+        countries = confs[conf].countries
+        for country in sorted(countries):
+            writer.add("countries", "{conf}/{country}".format(conf=conf, country=country), countries[country])
+            regions = countries[country].regions
+            for region in sorted(regions):
+                writer.add("regions", "{conf}/{country}/{region}".format(conf=conf, country=country, region=region), regions[region])
+                cities = regions[region].cities
+                for city in sorted(cities):
+                    writer.add("cities", "{conf}/{country}/{region}/{city}".format(conf=conf, country=country, region=region, city=city), cities[city])
+    for stadium in sorted(stadiums):
+        writer.add("stadiums", stadium, stadiums[stadium])
+    for team in sorted(teams):
+        writer.add("teams", team, teams[team])
+    for competition in sorted(competitions["competitions"]):
+        value = competitions["competitions"][competition]
+        if type(value) is verify.Competition:
+            writer.add("competitions", competition, value)
+    return writer
+
+
+def write_bundles(languages, fallbacks, locations, stadiums, teams, competitions, directory=BUNDLES_DIR):
+    written = {}
+    for language in languages:
+        writer = build_bundle(language, fallbacks[language], locations, stadiums, teams, competitions)
+        path = "{directory}/{language}.json".format(directory=directory, language=language)
+        verify.write_output(path, json.dumps(writer.to_json(), ensure_ascii=False, separators=(",", ":")))
+        written[language] = (path, writer)
+    return written
+
+
+class Bundle:
+    def __init__(self, path):
+        with open(path) as bundle_file:
+            data = json.load(bundle_file)
+        self.language = data["language"]
+        self.strings = data["strings"]
+        self.positions = {kind: {field: position for position, field in enumerate(fields)} for kind, fields in data["fields"].items()}
+        self.entities = data["entities"]
+
+    def get(self, kind, key, field):
+        index = self.entities[kind][key][self.positions[kind][field]]
+        return None if index is None else self.strings[index]
+
+
+def parse_fallbacks(values):
+    fallbacks = {language: list(chain) for language, chain in FALLBACKS.items()}
+    for value in values:
+        language, _, chain = value.partition("=")
+        chain = [item for item in chain.split(",") if item]
+        for item in [language] + chain:
+            if not item in verify.SUPPORTED_LANGUAGES:
+                verify.exit_with_error("Error: unknown language", item, "on fallback", value)
+        fallbacks[language] = chain
+    return fallbacks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export one bundle of localized strings per language, with the fallbacks applied")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("-o", "--output", default=BUNDLES_DIR, help="directory to write the bundles into")
+    parser.add_argument("--language", action="append", choices=verify.SUPPORTED_LANGUAGES, help="language to export, can be repeated, defaults to every supported language")
+    parser.add_argument("--fallback", action="append", default=[], metavar="LANGUAGE=CHAIN", help="languages tried in order when a string is missing, e.g. es=pt,en")
+    args = parser.parse_args()
+
+    fallbacks = parse_fallbacks(args.fallback)
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    print("\nBundles:")
+    for language, (path, writer) in write_bundles(args.language or verify.SUPPORTED_LANGUAGES, fallbacks, locations, stadiums, teams, competitions, args.output).items():
+        missing = sum(1 for entities in writer.entities.values() for indexes in entities.values() for index in indexes if index is None)
+        print("{language}: {strings} strings, {missing} missing, {size} bytes written to {path}".format(language=language, strings=len(writer.strings), missing=missing, size=os.path.getsize(path), path=path))
+
+
+if __name__ == "__main__":
+    main()
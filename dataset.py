@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import time
+from collections.abc import Mapping
+
+from entities import City, Competition, Confederations, Coord, Country, Location, Region, Stadium, Team, World
+
+
+# Loads an already verified tree: nothing is validated here, run verify.py for that.
+# Every mapping lists its directory on first use and reads an entity's data.json on
+# first access, so a process only pays for the subtrees it touches.
+
+
+class LazyMapping(Mapping):
+    __slots__ = ("path", "load", "names", "entities")
+
+    def __init__(self, path, load):
+        self.path = path
+        self.load = load
+        self.names = None
+        self.entities = {}
+
+    def keys_list(self):
+        if self.names is None:
+            with os.scandir(self.path) as entries:
+                self.names = sorted(entry.name for entry in entries if entry.is_dir())
+        return self.names
+
+    def __getitem__(self, key):
+        entity = self.entities.get(key)
+        if entity is None:
+            path = os.path.join(self.path, key)
+            if not os.path.isfile(os.path.join(path, "data.json")):
+                raise KeyError(key)
+            entity = self.entities[key] = self.load(path)
+        return entity
+
+    def __contains__(self, key):
+        return key in self.entities or os.path.isfile(os.path.join(self.path, key, "data.json"))
+
+    def __iter__(self):
+        return iter(self.keys_list())
+
+    def __len__(self):
+        return len(self.keys_list())
+
+    def loaded(self):
+        return len(self.entities)
+
+
+def read(path):
+    with open(os.path.join(path, "data.json")) as json_file:
+        return json.load(json_file)
+
+
+def coord(data):
+    return Coord(data["coord"]["lat"], data["coord"]["lon"])
+
+
+def load_stadium(path):
+    data = read(path)
+    return Stadium(data["name"], data["nickname"], data["capacity"], coord(data))
+
+
+def load_city(path):
+    data = read(path)
+    return City(data["name"], coord(data))
+
+
+def load_region(path):
+    return Region(read(path)["name"], LazyMapping(path, load_city))
+
+
+def load_country(path):
+    return Country(read(path)["name"], LazyMapping(path, load_region))
+
+
+def load_confederation(path):
+    data = read(path)
+    return Confederations(data["name"], data["nickname"], LazyMapping(path, load_country))
+
+
+def load_world(path):
+    data = read(path)
+    return World(data["name"], data["nickname"], LazyMapping(path, load_confederation))
+
+
+def load_team(path):
+    data = read(path)
+    world = data["world"]
+    return Team(data["name"], data["nickname"], data["acronym"], data["stadium"], Location(world["continent"], world["country"], world["region"], world["city"]))
+
+
+def load_competition(path):
+    data = read(path)
+    teams_source = data.get("teams_source")
+    return Competition(data["name"], data["nickname"], data["mechanics"], data.get("relegation"), data.get("promotion"), [] if teams_source != None else data["teams"], teams_source)
+
+
+class Dataset:
+    __slots__ = ("root", "stadiums", "teams", "competitions", "loaded_world", "loaded_calendar")
+
+    def __init__(self, root):
+        self.root = root
+        self.stadiums = LazyMapping(os.path.join(root, "stadium"), load_stadium)
+        self.teams = LazyMapping(os.path.join(root, "teams"), load_team)
+        self.competitions = LazyMapping(os.path.join(root, "competitions"), load_competition)
+        self.loaded_world = None
+        self.loaded_calendar = None
+
+    @property
+    def world(self):
+        if self.loaded_world is None:
+            self.loaded_world = load_world(os.path.join(self.root, "world"))
+        return self.loaded_world
+
+    @property
+    def calendar(self):
+        # Dates in file order, each with the competitions played on it.
+        if self.loaded_calendar is None:
+            self.loaded_calendar = read(os.path.join(self.root, "competitions"))
+        return self.loaded_calendar
+
+    def city(self, location):
+        return self.world.confederations[location.continent].countries[location.country].regions[location.region].cities[location.city]
+
+
+def load_dataset(root="."):
+    return Dataset(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load single entities of the dataset lazily, reading only the files they need")
+    parser.add_argument("--root", default=".", help="dataset root directory")
+    parser.add_argument("--team", action="append", default=[], help="team to load with its stadium and city, can be repeated")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = load_dataset(args.root)
+    for slug in args.team:
+        if not slug in dataset.teams:
+            print("Error: the team", slug, "is missing on teams list")
+            exit(1)
+        team = dataset.teams[slug]
+        stadium = dataset.stadiums[team.stadium]
+        city = dataset.city(team.world)
+        print("{slug} plays at {stadium} ({capacity} seats) in {w.city}, {w.region}, {w.country} ({lat}, {lon})".format(slug=slug, stadium=team.stadium, capacity=stadium.capacity, w=team.world, lat=city.coord.lat, lon=city.coord.lon))
+    print("{teams} teams, {stadiums} stadiums loaded in {elapsed:.4f}s".format(teams=dataset.teams.loaded(), stadiums=dataset.stadiums.loaded(), elapsed=time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import ast
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import geo
+import verify
+
+
+MATRIX_FILE = "{build}/stadium_distances.npy".format(build=verify.BUILD_DIR)
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+NPY_DESCR = "<f4" if sys.byteorder == "little" else ">f4"
+
+
+def matrix_index_file(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def write_npy(path, values, size):
+    header = "{{'descr': '{descr}', 'fortran_order': False, 'shape': ({size}, {size}), }}".format(descr=NPY_DESCR, size=size)
+    header += " " * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + "\n"
+    with open(path + ".tmp", "wb") as npy_file:
+        npy_file.write(NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1"))
+        values.tofile(npy_file)
+    os.replace(path + ".tmp", path)
+
+
+class DistanceMatrix:
+    def __init__(self, path=MATRIX_FILE):
+        with open(matrix_index_file(path)) as index_file:
+            index = json.load(index_file)
+        self.stadiums = index["stadiums"]
+        self.coords = index["coords"]
+        self.positions = {stadium: position for position, stadium in enumerate(self.stadiums)}
+        with open(path, "rb") as npy_file:
+            self.data = mmap.mmap(npy_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self.data[:len(NPY_MAGIC)] != NPY_MAGIC:
+                raise ValueError("{path} is not a version 1.0 npy file".format(path=path))
+            header_size = struct.unpack_from("<H", self.data, len(NPY_MAGIC))[0]
+            start = len(NPY_MAGIC) + 2
+            header = ast.literal_eval(self.data[start:start + header_size].decode("latin1"))
+            if header["descr"] != NPY_DESCR or header["shape"] != (len(self.stadiums), len(self.stadiums)):
+                raise ValueError("{path} does not match {index}".format(path=path, index=matrix_index_file(path)))
+            self.values = memoryview(self.data)[start + header_size:].cast("f")
+        except Exception:
+            self.data.close()
+            raise
+
+    def __len__(self):
+        return len(self.stadiums)
+
+    def close(self):
+        self.values.release()
+        self.data.close()
+
+    def distance(self, a, b):
+        return self.values[self.positions[a] * len(self.stadiums) + self.positions[b]]
+
+    def row(self, stadium):
+        start = self.positions[stadium] * len(self.stadiums)
+        return dict(zip(self.stadiums, self.values[start:start + len(self.stadiums)]))
+
+
+def build_distance_matrix(stadiums, path=MATRIX_FILE, previous=None):
+    names = sorted(stadiums)
+    coords = [[stadiums[stadium].coord.lat, stadiums[stadium].coord.lon] for stadium in names]
+    size = len(names)
+
+    # Rows and columns of stadiums whose coordinates did not change are copied from the previous matrix.
+    reused = {}
+    if previous is not None:
+        for position, stadium in enumerate(names):
+            old = previous.positions.get(stadium)
+            if old is not None and previous.coords[old] == coords[position]:
+                reused[position] = old
+
+    # Both matrices are sorted by slug, so reused columns come in runs that are consecutive in
+    # both, and each reused row is copied as one slice per run.
+    runs = []
+    for position in sorted(reused):
+        if runs and runs[-1][0] + runs[-1][2] == position and runs[-1][1] + runs[-1][2] == reused[position]:
+            runs[-1][2] += 1
+        else:
+            runs.append([position, reused[position], 1])
+    values = array("f", bytes(4 * size * size))
+    target = memoryview(values)
+    for i, old in reused.items():
+        for j, old_j, length in runs:
+            start = old * len(previous) + old_j
+            target[i * size + j:i * size + j + length] = previous.values[start:start + length]
+    target.release()
+
+    computed = 0
+    for i in range(size):
+        if i in reused:
+            continue
+        for j in range(size):
+            if j == i or (not j in reused and j < i):
+                continue
+            distance = geo.haversine(stadiums[names[i]].coord, stadiums[names[j]].coord)
+            values[i * size + j] = distance
+            values[j * size + i] = distance
+            computed += 1
+
+    if previous is not None:
+        previous.close()
+    write_npy(path, values, size)
+    with open(matrix_index_file(path) + ".tmp", "w") as index_file:
+        json.dump({"stadiums": names, "coords": coords}, index_file)
+    os.replace(matrix_index_file(path) + ".tmp", matrix_index_file(path))
+    return computed
+
+
+def load_previous(path):
+    if not os.path.isfile(path) or not os.path.isfile(matrix_index_file(path)):
+        return None
+    try:
+        return DistanceMatrix(path)
+    except (ValueError, KeyError, OSError) as e:
+        print("Ignoring previous distance matrix", path, e)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the stadium to stadium great circle distance matrix")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("-o", "--output", default=MATRIX_FILE, help="npy file to write, the slug table is written next to it as .json")
+    parser.add_argument("--full", action="store_true", help="recompute every distance instead of reusing the previous matrix")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    previous = None if args.full else load_previous(args.output)
+    computed = build_distance_matrix(stadiums, args.output, previous)
+    print("\nDistance matrix:")
+    print(len(stadiums), "stadiums")
+    print(computed, "distances computed")
+    print("written to", args.output, "and", matrix_index_file(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import math
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+import geo
+
+
+NGRAM = 3
+KM_PER_DEGREE = 111.32
+SIMILARITY = 0.8
+STADIUM_RADIUS = 0.2
+CITY_RADIUS = 0.5
+# Clubs and stadiums share names all over the country, similar names only count nearby.
+NAME_RADIUS = 30.0
+# Words every club or stadium name carries, they only make unrelated names look alike.
+STOPWORDS = {
+    "a", "ac", "associacao", "arena", "atletica", "club", "clube", "da", "das", "de", "do", "dos", "e",
+    "ec", "esporte", "esportivo", "estadio", "fc", "futebol", "municipal", "sc", "sociedade", "sport",
+}
+WORD_REGEX = re.compile(r"[a-z0-9]+")
+
+
+class Duplicate:
+    def __init__(self, kind, first, second, distance=None, similarity=None):
+        self.kind = kind
+        self.first = first
+        self.second = second
+        self.distance = distance
+        self.similarity = similarity
+
+
+def normalize(name, stopwords=STOPWORDS):
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    return " ".join(word for word in WORD_REGEX.findall(text) if not word in stopwords)
+
+
+def shingles(name):
+    padded = " {name} ".format(name=name)
+    return frozenset(zlib.crc32(padded[i:i + NGRAM].encode()) for i in range(len(padded) - NGRAM + 1))
+
+
+def similarity(a, b):
+    return len(a & b) / len(a | b)
+
+
+def name_similarity(a, b):
+    # Names are (stripped, whole) gram sets. Stripped names alike while the whole names are not,
+    # like Esporte Clube Sao Bernardo and Sao Bernardo Futebol Clube, meet half way, and the
+    # score never goes over the stripped similarity the index filters on.
+    stripped = similarity(a[0], b[0])
+    return min(stripped, (stripped + similarity(a[1], b[1])) / 2)
+
+
+class Grid:
+    # Square cells of a fixed size in degrees. Longitude degrees shrink towards the poles,
+    # so a search spans more longitude cells the further from the equator it is.
+    def __init__(self, size):
+        self.size = size
+        self.step = size / KM_PER_DEGREE
+
+    def cell(self, coord):
+        return math.floor(coord.lat / self.step), math.floor(coord.lon / self.step)
+
+    def around(self, coord, radius):
+        lat, lon = self.cell(coord)
+        lat_span = math.ceil(radius / self.size)
+        lon_span = math.ceil(radius / (self.size * max(math.cos(math.radians(coord.lat)), 0.01)))
+        for i in range(lat - lat_span, lat + lat_span + 1):
+            for j in range(lon - lon_span, lon + lon_span + 1):
+                yield i, j
+
+
+class NameIndex:
+    # Prefix filtering: with the grams of every name sorted rarest first, two names at least
+    # threshold alike always share one of their first grams. Only those are indexed, per grid
+    # cell, so only similar names of nearby entities are ever compared.
+    def __init__(self, names, coords, threshold=SIMILARITY):
+        self.names = {key: [(shingles(normalize(name)), shingles(normalize(name, ()))) for name in set(values) if normalize(name)] for key, values in names.items()}
+        self.coords = coords
+        self.threshold = threshold
+        self.grid = Grid(NAME_RADIUS)
+        frequency = Counter(gram for grams in self.names.values() for name, _ in grams for gram in name)
+        self.prefixes = {}
+        self.buckets = {}
+        for key, grams in self.names.items():
+            prefixes = set()
+            for name, _ in grams:
+                ordered = sorted(name, key=lambda gram: (frequency[gram], gram))
+                prefixes.update(ordered[:len(ordered) - math.ceil(threshold * len(ordered) - 1e-9) + 1])
+            self.prefixes[key] = prefixes
+            cell = self.grid.cell(coords[key])
+            for gram in prefixes:
+                self.buckets.setdefault((gram, cell), []).append(key)
+
+    def similar(self):
+        pairs = {}
+        for key, prefixes in self.prefixes.items():
+            for cell in self.grid.around(self.coords[key], NAME_RADIUS):
+                for gram in prefixes:
+                    for other in self.buckets.get((gram, cell), ()):
+                        if key < other and not (key, other) in pairs:
+                            pairs[(key, other)] = max(name_similarity(a, b) for a in self.names[key] for b in self.names[other])
+        return {pair: value for pair, value in pairs.items() if value >= self.threshold and geo.haversine(self.coords[pair[0]], self.coords[pair[1]]) <= NAME_RADIUS}
+
+
+def close_pairs(coords, radius):
+    grid = Grid(radius)
+    cells = {}
+    for key, coord in coords.items():
+        cells.setdefault(grid.cell(coord), []).append(key)
+    pairs = {}
+    for key, coord in coords.items():
+        for cell in grid.around(coord, radius):
+            for other in cells.get(cell, ()):
+                if key < other:
+                    distance = geo.haversine(coord, coords[other])
+                    if distance <= radius:
+                        pairs[(key, other)] = distance
+    return pairs
+
+
+def find_duplicates_of(kind, names, coords, radius=None):
+    # Without a radius only names are compared: teams of the same city share its coordinates.
+    similar = NameIndex({key: list(localized.values()) for key, localized in names.items()}, coords).similar()
+    close = close_pairs(coords, radius) if radius is not None else {}
+    return [Duplicate(kind, pair[0], pair[1], close.get(pair), similar.get(pair)) for pair in sorted(set(similar) | set(close))]
+
+
+def find_duplicates(stadiums, locations, teams):
+    cities = geo.cities_of(locations)
+    return (
+        find_duplicates_of("stadium", {key: stadium.name for key, stadium in stadiums.items()}, {key: stadium.coord for key, stadium in stadiums.items()}, STADIUM_RADIUS)
+        + find_duplicates_of("city", {key: city.name for key, city in cities.items()}, {key: city.coord for key, city in cities.items()}, CITY_RADIUS)
+        + find_duplicates_of("team", {key: team.name for key, team in teams.items()}, {key: cities[geo.city_path(team.world)].coord for key, team in teams.items()})
+    )
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# Entities of the dataset, shared by verify and the lazy dataset loader. Slots keep
+# every instance small when the whole tree is loaded.
+
+
+class Coord:
+    __slots__ = ("lat", "lon")
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+
+class City:
+    __slots__ = ("name", "coord")
+
+    def __init__(self, name, coord):
+        self.name = name
+        self.coord = coord
+
+
+class Stadium:
+    __slots__ = ("name", "nickname", "capacity", "coord")
+
+    def __init__(self, name, nickname, capacity, coord):
+        self.name = name
+        self.nickname = nickname
+        self.capacity = capacity
+        self.coord = coord
+
+
+class Region:
+    __slots__ = ("name", "cities")
+
+    def __init__(self, name, cities):
+        self.name = name
+        self.cities = cities
+
+
+class Country:
+    __slots__ = ("name", "regions")
+
+    def __init__(self, name, regions):
+        self.name = name
+        self.regions = regions
+
+
+class Confederations:
+    __slots__ = ("name", "nickname", "countries")
+
+    def __init__(self, name, nickname, countries):
+        self.name = name
+        self.nickname = nickname
+        self.countries = countries
+
+
+class World:
+    __slots__ = ("name", "nickname", "confederations")
+
+    def __init__(self, name, nickname, confederations):
+        self.name = name
+        self.nickname = nickname
+        self.confederations = confederations
+
+
+class Location:
+    __slots__ = ("continent", "country", "region", "city")
+
+    def __init__(self, continent, country, region, city):
+        self.continent = continent
+        self.country = country
+        self.region = region
+        self.city = city
+
+
+class Team:
+    __slots__ = ("name", "nickname", "acronym", "stadium", "world")
+
+    def __init__(self, name, nickname, acronym, stadium, world):
+        self.name = name
+        self.nickname = nickname
+        self.acronym = acronym
+        self.stadium = stadium
+        self.world = world
+
+
+class Competition:
+    __slots__ = ("name", "nickname", "mechanics", "relegation", "promotion", "teams", "teams_source")
+
+    def __init__(self, name, nickname, mechanics, relegation, promotion, teams, teams_source):
+        self.name = name
+        self.nickname = nickname
+        self.mechanics = mechanics
+        self.relegation = relegation
+        self.promotion = promotion
+        self.teams = teams
+        self.teams_source = teams_source
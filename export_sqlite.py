@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import sqlite3
+
+import verify
+
+
+DATABASE_FILE = "{build}/dataset.sqlite".format(build=verify.BUILD_DIR)
+SEARCH_TOKEN_REGEX = re.compile(r"\w+")
+SEARCH_ENTITIES = ["confederations", "countries", "regions", "cities", "stadiums", "teams", "competitions"]
+
+SCHEMA = """
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS confederations (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS countries (
+    id INTEGER PRIMARY KEY,
+    confederation_id INTEGER NOT NULL REFERENCES confederations(id),
+    slug TEXT NOT NULL,
+    UNIQUE (confederation_id, slug)
+);
+
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER PRIMARY KEY,
+    country_id INTEGER NOT NULL REFERENCES countries(id),
+    slug TEXT NOT NULL,
+    UNIQUE (country_id, slug)
+);
+
+CREATE TABLE IF NOT EXISTS cities (
+    id INTEGER PRIMARY KEY,
+    region_id INTEGER NOT NULL REFERENCES regions(id),
+    slug TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    UNIQUE (region_id, slug)
+);
+
+CREATE TABLE IF NOT EXISTS stadiums (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    capacity INTEGER NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS teams (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    stadium_id INTEGER NOT NULL REFERENCES stadiums(id),
+    city_id INTEGER NOT NULL REFERENCES cities(id)
+);
+
+CREATE TABLE IF NOT EXISTS competitions (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    mechanics TEXT NOT NULL,
+    relegation_id INTEGER REFERENCES competitions(id),
+    promotion_id INTEGER REFERENCES competitions(id)
+);
+
+CREATE TABLE IF NOT EXISTS competition_teams (
+    id INTEGER PRIMARY KEY,
+    competition_id INTEGER NOT NULL REFERENCES competitions(id),
+    position INTEGER NOT NULL,
+    team_id INTEGER NOT NULL REFERENCES teams(id),
+    UNIQUE (competition_id, position)
+);
+CREATE INDEX IF NOT EXISTS competition_teams_team ON competition_teams(team_id);
+
+CREATE TABLE IF NOT EXISTS competition_dates (
+    id INTEGER PRIMARY KEY,
+    competition_id INTEGER NOT NULL REFERENCES competitions(id),
+    date TEXT NOT NULL,
+    UNIQUE (competition_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS names (
+    id INTEGER PRIMARY KEY,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    language TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (entity, entity_id, field, language)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    value,
+    entity UNINDEXED,
+    entity_id UNINDEXED,
+    field UNINDEXED,
+    language UNINDEXED,
+    content = 'names',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS names_insert AFTER INSERT ON names BEGIN
+    INSERT INTO search(rowid, value, entity, entity_id, field, language) VALUES (new.id, new.value, new.entity, new.entity_id, new.field, new.language);
+END;
+CREATE TRIGGER IF NOT EXISTS names_delete AFTER DELETE ON names BEGIN
+    INSERT INTO search(search, rowid, value, entity, entity_id, field, language) VALUES ('delete', old.id, old.value, old.entity, old.entity_id, old.field, old.language);
+END;
+CREATE TRIGGER IF NOT EXISTS names_update AFTER UPDATE ON names BEGIN
+    INSERT INTO search(search, rowid, value, entity, entity_id, field, language) VALUES ('delete', old.id, old.value, old.entity, old.entity_id, old.field, old.language);
+    INSERT INTO search(rowid, value, entity, entity_id, field, language) VALUES (new.id, new.value, new.entity, new.entity_id, new.field, new.language);
+END;
+"""
+
+
+class Changes:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.created = set()
+        self.stale = []
+
+
+def sync_rows(db, table, keys, columns, rows, changes):
+    selected = keys + columns
+    existing = {}
+    for row in db.execute("SELECT id, {columns} FROM {table}".format(columns=", ".join(selected), table=table)):
+        existing[tuple(row[1:len(keys) + 1])] = (row[0], tuple(row[len(keys) + 1:]))
+
+    ids = {}
+    for key, values in rows.items():
+        values = tuple(values)
+        if key in existing:
+            ids[key], current = existing.pop(key)
+            if current != values:
+                db.execute("UPDATE {table} SET {assignments} WHERE id = ?".format(table=table, assignments=", ".join(column + " = ?" for column in columns)), values + (ids[key],))
+                changes.updated += 1
+        else:
+            cursor = db.execute("INSERT INTO {table} ({columns}) VALUES ({values})".format(table=table, columns=", ".join(selected), values=", ".join("?" * len(selected))), key + values)
+            ids[key] = cursor.lastrowid
+            changes.inserted += 1
+            changes.created.add((table, ids[key]))
+
+    # Stale rows are removed once every table is synced, children first, so foreign keys stay valid.
+    changes.stale.append((table, [entry[0] for entry in existing.values()]))
+    return ids
+
+
+def localized_rows(rows, entity, entity_id, **fields):
+    for field, values in fields.items():
+        for language, value in values.items():
+            rows[(entity, entity_id, field, language)] = (value,)
+
+
+def export_sqlite(locations, stadiums, teams, competitions, index, path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    changes = Changes()
+    names = {}
+
+    with db:
+        confs = locations.confederations
+        conf_ids = sync_rows(db, "confederations", ["slug"], [], {(conf,): () for conf in confs}, changes)
+        localized_rows(names, "world", 0, name=locations.name, nickname=locations.nickname)
+
+        country_rows = {}
+        for conf in confs:
+            localized_rows(names, "confederations", conf_ids[(conf,)], name=confs[conf].name, nickname=confs[conf].nickname)
+            for country in confs[conf].countries:
+                country_rows[(conf_ids[(conf,)], country)] = ()
+        country_ids = sync_rows(db, "countries", ["confederation_id", "slug"], [], country_rows, changes)
+
+        region_rows = {}
+        for conf in confs:
+            for country, value in confs[conf].countries.items():
+                country_id = country_ids[(conf_ids[(conf,)], country)]
+                localized_rows(names, "countries", country_id, name=value.name)
+                for region in value.regions:
+                    region_rows[(country_id, region)] = ()
+        region_ids = sync_rows(db, "regions", ["country_id", "slug"], [], region_rows, changes)
+
+        city_rows = {}
+        city_keys = {}
+        for conf in confs:
+            for country, country_value in confs[conf].countries.items():
+                country_id = country_ids[(conf_ids[(conf,)], country)]
+                for region, value in country_value.regions.items():
+                    region_id = region_ids[(country_id, region)]
+                    localized_rows(names, "regions", region_id, name=value.name)
+                    for city, city_value in value.cities.items():
+                        city_rows[(region_id, city)] = (city_value.coord.lat, city_value.coord.lon)
+                        city_keys[(conf, country, region, city)] = (region_id, city)
+        city_ids = sync_rows(db, "cities", ["region_id", "slug"], ["lat", "lon"], city_rows, changes)
+        for location, key in city_keys.items():
+            localized_rows(names, "cities", city_ids[key], name=confs[location[0]].countries[location[1]].regions[location[2]].cities[location[3]].name)
+
+        stadium_ids = sync_rows(db, "stadiums", ["slug"], ["capacity", "lat", "lon"], {(stadium,): (value.capacity, value.coord.lat, value.coord.lon) for stadium, value in stadiums.items()}, changes)
+        for stadium, value in stadiums.items():
+            localized_rows(names, "stadiums", stadium_ids[(stadium,)], name=value.name, nickname=value.nickname)
+
+        team_rows = {}
+        for team, value in teams.items():
+            city = city_ids[city_keys[(value.world.continent, value.world.country, value.world.region, value.world.city)]]
+            team_rows[(team,)] = (stadium_ids[(value.stadium,)], city)
+        team_ids = sync_rows(db, "teams", ["slug"], ["stadium_id", "city_id"], team_rows, changes)
+        for team, value in teams.items():
+            localized_rows(names, "teams", team_ids[(team,)], name=value.name, nickname=value.nickname, acronym=value.acronym)
+
+        entries = {competition: value for competition, value in competitions["competitions"].items() if type(value) is verify.Competition}
+        competition_ids = sync_rows(db, "competitions", ["slug"], ["mechanics"], {(competition,): (value.mechanics,) for competition, value in entries.items()}, changes)
+        member_rows = {}
+        date_rows = {}
+        for competition, value in entries.items():
+            competition_id = competition_ids[(competition,)]
+            relegation = competition_ids.get((value.relegation,))
+            promotion = competition_ids.get((value.promotion,))
+            if db.execute("SELECT relegation_id, promotion_id FROM competitions WHERE id = ?", (competition_id,)).fetchone() != (relegation, promotion):
+                db.execute("UPDATE competitions SET relegation_id = ?, promotion_id = ? WHERE id = ?", (relegation, promotion, competition_id))
+                # Links of a competition inserted by this export are part of its insert, not an update.
+                if ("competitions", competition_id) not in changes.created:
+                    changes.updated += 1
+            localized_rows(names, "competitions", competition_id, name=value.name, nickname=value.nickname)
+            members = index.teams[competition] if competition in index.teams else value.teams or []
+            for position, team in enumerate(members):
+                member_rows[(competition_id, position)] = (team_ids[(team,)],)
+            for date in competitions["dates"][competition]:
+                date_rows[(competition_id, date)] = ()
+        sync_rows(db, "competition_teams", ["competition_id", "position"], ["team_id"], member_rows, changes)
+        sync_rows(db, "competition_dates", ["competition_id", "date"], [], date_rows, changes)
+        sync_rows(db, "names", ["entity", "entity_id", "field", "language"], ["value"], names, changes)
+
+        for table, stale in changes.stale:
+            if table == "competitions":
+                db.executemany("UPDATE competitions SET relegation_id = NULL, promotion_id = NULL WHERE id = ?", [(row,) for row in stale])
+        for table, stale in reversed(changes.stale):
+            db.executemany("DELETE FROM {table} WHERE id = ?".format(table=table), [(row,) for row in stale])
+            changes.deleted += len(stale)
+
+    db.execute("INSERT INTO search(search) VALUES ('optimize')")
+    db.commit()
+    return db, changes
+
+
+def search(db, text, entities=None, limit=20):
+    tokens = SEARCH_TOKEN_REGEX.findall(text)
+    if not tokens:
+        return []
+    query = " ".join('"{token}"*'.format(token=token) for token in tokens)
+    slugs = ", ".join("{entity}.slug".format(entity=entity) for entity in SEARCH_ENTITIES)
+    joins = "".join(" LEFT JOIN {entity} ON search.entity = '{entity}' AND {entity}.id = search.entity_id".format(entity=entity) for entity in SEARCH_ENTITIES)
+    sql = "SELECT DISTINCT search.entity, COALESCE({slugs}, 'world'), search.field, search.language, search.value FROM search{joins} WHERE search MATCH ?".format(slugs=slugs, joins=joins)
+    parameters = [query]
+    if entities:
+        sql += " AND search.entity IN ({entities})".format(entities=", ".join("?" * len(entities)))
+        parameters.extend(entities)
+    sql += " ORDER BY rank LIMIT ?"
+    parameters.append(limit)
+    return db.execute(sql, parameters).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the verified dataset to a SQLite database with a full text index over the localized names")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("-o", "--output", default=DATABASE_FILE, help="database file to create or update")
+    parser.add_argument("-s", "--search", help="after exporting, print the entities matching this text")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    db, changes = export_sqlite(locations, stadiums, teams, competitions, index, args.output)
+    print("\nSQLite export:")
+    print(changes.inserted, "rows inserted")
+    print(changes.updated, "rows updated")
+    print(changes.deleted, "rows deleted")
+    print("written to", args.output)
+
+    if args.search:
+        print("\nSearch:", args.search)
+        for entity, slug, field, language, value in search(db, args.search):
+            print(" ", entity, slug, field, language, value)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
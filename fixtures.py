@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import string
+import time
+
+import grouping
+import verify
+
+
+FIXTURES_DIR = "{build}/fixtures".format(build=verify.BUILD_DIR)
+
+
+class Slot:
+    def __init__(self, kind, key=None, position=None):
+        self.kind = kind
+        self.key = key
+        self.position = position
+
+    def __str__(self):
+        if self.kind == "rank":
+            return "{position}º{group}".format(position=self.position, group=self.key or "")
+        if self.kind == "winner":
+            return "winner of {key}".format(key=self.key)
+        return "{key} seed {position}".format(key=self.key, position=self.position)
+
+
+class Fixture:
+    def __init__(self, date, stage, home, away, tie=None, leg=None, neutral=False):
+        self.date = date
+        self.stage = stage
+        self.home = home
+        self.away = away
+        self.tie = tie
+        self.leg = leg
+        self.neutral = neutral
+
+
+class Placement:
+    def __init__(self, champion, promoted, relegated):
+        self.champion = champion
+        self.promoted = promoted
+        self.relegated = relegated
+
+
+class Schedule:
+    def __init__(self, competition, mechanics, ranking):
+        self.competition = competition
+        self.mechanics = mechanics
+        self.ranking = ranking
+        self.groups = {}
+        self.fixtures = []
+        self.ties = {}
+        self.seedings = {}
+
+    def to_json(self):
+        return {
+            "competition": self.competition,
+            "mechanics": self.mechanics,
+            "groups": self.groups,
+            "seedings": {stage: [str(slot) for slot in slots] for stage, slots in self.seedings.items()},
+            "fixtures": [{
+                "date": fixture.date,
+                "stage": fixture.stage,
+                "home": str(fixture.home),
+                "away": str(fixture.away),
+                "tie": fixture.tie,
+                "leg": fixture.leg,
+                "neutral": fixture.neutral,
+            } for fixture in self.fixtures],
+        }
+
+
+def round_robin(count):
+    # Circle method: position count - 1 stays fixed while the others rotate. Alternating the
+    # orientation of each pair gives half the positions one extra home game and the minimum
+    # number of consecutive home or away games.
+    fixed = count - 1
+    rounds = []
+    for current in range(count - 1):
+        pairs = [(current, fixed) if current % 2 == 0 else (fixed, current)]
+        for offset in range(1, count // 2):
+            a = (current + offset) % (count - 1)
+            b = (current - offset) % (count - 1)
+            pairs.append((a, b) if offset % 2 == 1 else (b, a))
+        rounds.append(pairs)
+    return rounds
+
+
+def add_round_robin(schedule, group, teams, dates, double=False):
+    if len(teams) % 2 != 0:
+        verify.exit_with_error("  Error found on competition:", schedule.competition, "round robin needs an even number of teams, got", len(teams))
+    rounds = round_robin(len(teams))
+    homes = [0] * len(teams)
+    for pairs in rounds:
+        for home, away in pairs:
+            homes[home] += 1
+    # Upper ranked teams take the positions with fewer home games, as the mechanics describe.
+    positions = sorted(range(len(teams)), key=lambda position: (homes[position], position))
+    team_at = {position: teams[rank] for rank, position in enumerate(positions)}
+    stage = "group {group}".format(group=group) if group else "round robin"
+    legs = [False, True] if double else [False]
+    for leg, swapped in enumerate(legs):
+        for number, pairs in enumerate(rounds):
+            date = dates[leg * len(rounds) + number]
+            for home, away in pairs:
+                if swapped:
+                    home, away = away, home
+                schedule.fixtures.append(Fixture(date, "{stage} round {round}".format(stage=stage, round=leg * len(rounds) + number + 1), team_at[home], team_at[away]))
+    return len(rounds) * len(legs)
+
+
+def add_tie(schedule, stage, number, home, away, dates, legs=1, neutral=False):
+    # Two legged ties play the second game at home's stadium.
+    key = "{stage} {number}".format(stage=stage, number=number) if number else stage
+    fixtures = []
+    if legs == 2:
+        fixtures.append(Fixture(dates[0], stage, away, home, key, 1))
+        fixtures.append(Fixture(dates[1], stage, home, away, key, 2))
+    else:
+        fixtures.append(Fixture(dates[0], stage, home, away, key, neutral=neutral))
+    schedule.fixtures.extend(fixtures)
+    schedule.ties[key] = fixtures
+    return Slot("winner", key)
+
+
+def seed(schedule, stage, slots):
+    schedule.seedings[stage] = slots
+    return [Slot("seed", stage, position + 1) for position in range(len(slots))]
+
+
+def rank(position, group=None):
+    return Slot("rank", group, position)
+
+
+def serpentine_groups(teams, count):
+    groups = [[] for _ in range(count)]
+    for position, team in enumerate(teams):
+        lap, offset = divmod(position, count)
+        groups[offset if lap % 2 == 0 else count - 1 - offset].append(team)
+    return groups
+
+
+def add_groups(schedule, groups, dates, double=False):
+    used = 0
+    for letter, teams in zip(string.ascii_uppercase, groups):
+        schedule.groups[letter] = teams
+        used = add_round_robin(schedule, letter, teams, dates, double)
+    return used
+
+
+def regional_a(schedule, teams, dates, context):
+    schedule.groups[""] = teams
+    used = add_round_robin(schedule, None, teams, dates)
+    quarter = [
+        add_tie(schedule, "quarter-final", 1, rank(3), rank(6), dates[used:]),
+        add_tie(schedule, "quarter-final", 2, rank(4), rank(5), dates[used:]),
+    ]
+    a, b = seed(schedule, "semi-final", quarter)
+    semi = [
+        add_tie(schedule, "semi-final", 1, rank(1), b, dates[used + 1:]),
+        add_tie(schedule, "semi-final", 2, rank(2), a, dates[used + 1:]),
+    ]
+    add_tie(schedule, "final", None, semi[0], semi[1], dates[used + 2:], neutral=True)
+
+
+def regional_b(schedule, teams, dates, context):
+    groups = serpentine_groups(teams, 2)
+    used = add_groups(schedule, groups, dates)
+    add_tie(schedule, "final", None, rank(1, "A"), rank(1, "B"), dates[used:], neutral=True)
+
+
+def regional_c(schedule, teams, dates, context):
+    # Teams are ranked by their order; the 18 best wait for the 46 play-off winners.
+    direct = 18
+    playoff = teams[direct:]
+    winners = []
+    for number in range(len(playoff) // 2):
+        better, worse = playoff[number], playoff[len(playoff) - 1 - number]
+        winners.append(add_tie(schedule, "play-off", number + 1, worse, better, dates))
+    entrants = [rank(position + 1) for position in range(direct)] + winners
+    for day, stage in enumerate(["round of 64", "round of 32", "round of 16", "quarter-final", "semi-final", "final"]):
+        seeds = seed(schedule, stage, entrants)
+        entrants = []
+        for number in range(len(seeds) // 2):
+            entrants.append(add_tie(schedule, stage, number + 1 if len(seeds) > 2 else None, seeds[len(seeds) - 1 - number], seeds[number], dates[day + 1:]))
+
+
+def regional_d(schedule, teams, dates, context):
+    schedule.groups[""] = teams
+    add_round_robin(schedule, None, teams, dates)
+
+
+def regional_e(schedule, teams, dates, context):
+    used = add_groups(schedule, serpentine_groups(teams, 2), dates)
+    semi = [
+        add_tie(schedule, "semi-final", 1, rank(1, "A"), rank(2, "B"), dates[used:], legs=2),
+        add_tie(schedule, "semi-final", 2, rank(1, "B"), rank(2, "A"), dates[used:], legs=2),
+    ]
+    best, other = seed(schedule, "final", semi)
+    add_tie(schedule, "final", None, best, other, dates[used + 2:], legs=2)
+
+
+def regional_f(schedule, teams, dates, context):
+    schedule.groups[""] = teams
+    used = add_round_robin(schedule, None, teams, dates)
+    semi = add_tie(schedule, "semi-final", None, rank(2), rank(3), dates[used:])
+    add_tie(schedule, "final", None, rank(1), semi, dates[used + 1:])
+
+
+def national_a(schedule, teams, dates, context):
+    schedule.groups[""] = teams
+    add_round_robin(schedule, None, teams, dates, double=True)
+
+
+def geo_groups(schedule, teams, count, context):
+    stadiums, team_data = context
+    groups = grouping.balanced_groups(teams, [stadiums[team_data[team].stadium].coord for team in teams], count).groups
+    # Keep the competition ranking inside every group.
+    return [[team for team in teams if team in group] for group in groups]
+
+
+def national_b(schedule, teams, dates, context):
+    used = add_groups(schedule, geo_groups(schedule, teams, 2, context), dates, double=True)
+    semi = [
+        add_tie(schedule, "semi-final", 1, rank(1, "A"), rank(2, "B"), dates[used:], legs=2),
+        add_tie(schedule, "semi-final", 2, rank(1, "B"), rank(2, "A"), dates[used:], legs=2),
+    ]
+    best, other = seed(schedule, "final", semi)
+    add_tie(schedule, "final", None, best, other, dates[used + 2:], legs=2)
+
+
+def national_c(schedule, teams, dates, context):
+    used = add_groups(schedule, geo_groups(schedule, teams, 4, context), dates, double=True)
+    quarter = [
+        add_tie(schedule, "quarter-final", 1, rank(1, "A"), rank(2, "D"), dates[used:]),
+        add_tie(schedule, "quarter-final", 2, rank(1, "B"), rank(2, "C"), dates[used:]),
+        add_tie(schedule, "quarter-final", 3, rank(1, "C"), rank(2, "B"), dates[used:]),
+        add_tie(schedule, "quarter-final", 4, rank(1, "D"), rank(2, "A"), dates[used:]),
+    ]
+    a, b, c, d = seed(schedule, "semi-final", quarter)
+    semi = [
+        add_tie(schedule, "semi-final", 1, a, d, dates[used + 1:]),
+        add_tie(schedule, "semi-final", 2, b, c, dates[used + 1:]),
+    ]
+    best, other = seed(schedule, "final", semi)
+    add_tie(schedule, "final", None, best, other, dates[used + 2:], legs=2)
+
+
+FORMATS = {
+    "regional-a": regional_a,
+    "regional-b": regional_b,
+    "regional-c": regional_c,
+    "regional-d": regional_d,
+    "regional-e": regional_e,
+    "regional-f": regional_f,
+    "national-a": national_a,
+    "national-b": national_b,
+    "national-c": national_c,
+}
+
+# Positions apply to every group table; "final" and "finalists" come from the final tie.
+PLACEMENTS = {
+    "regional-a": Placement("final", "finalists", [15, 16]),
+    "regional-b": Placement("final", "finalists", []),
+    "regional-c": Placement("final", None, []),
+    "regional-d": Placement("table", [1, 2], [11, 12]),
+    "regional-e": Placement("final", "finalists", [8]),
+    "regional-f": Placement("final", "finalists", [9, 10]),
+    "national-a": Placement("table", [1, 2, 3, 4], [17, 18, 19, 20]),
+    "national-b": Placement("final", [1, 2], [15, 16, 17, 18]),
+    "national-c": Placement("final", [1, 2], [15, 16, 17, 18]),
+}
+
+
+def generate_fixtures(competition, competitions, index, stadiums, teams):
+    comp = competitions["competitions"][competition]
+    if not comp.mechanics in FORMATS:
+        return None
+    schedule = Schedule(competition, comp.mechanics, list(index.teams[competition]))
+    FORMATS[comp.mechanics](schedule, schedule.ranking, competitions["dates"][competition], (stadiums, teams))
+    return schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the match schedule of every competition from its mechanics and dates")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("competitions", nargs="*", help="competitions to schedule, defaults to every competition")
+    parser.add_argument("-o", "--output", help="directory to write one <competition>.json schedule into, e.g. " + FIXTURES_DIR)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every fixture")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    print("\nFixtures:")
+    started = time.perf_counter()
+    for competition in args.competitions or list(index.teams):
+        if not competition in index.teams:
+            verify.exit_with_error("  Error found on competition:", competition, "the competition is not in the list of competitions")
+        schedule = generate_fixtures(competition, competitions, index, stadiums, teams)
+        if schedule is None:
+            print(" ", competition, "skipped, the", competitions["competitions"][competition].mechanics, "mechanics has no defined format yet")
+            continue
+        print(" ", competition, len(schedule.fixtures), "fixtures on", len(set(fixture.date for fixture in schedule.fixtures)), "dates")
+        if args.verbose:
+            for fixture in schedule.fixtures:
+                print("    {date}: {home} x {away} ({stage}{neutral})".format(date=fixture.date, home=fixture.home, away=fixture.away, stage=fixture.stage, neutral=", neutral" if fixture.neutral else ""))
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            with open("{output}/{competition}.json".format(output=args.output, competition=competition), "w") as schedule_file:
+                json.dump(schedule.to_json(), schedule_file, ensure_ascii=False, indent=1)
+    print("generated in {elapsed:.3f}s".format(elapsed=time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
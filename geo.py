@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import argparse
+import heapq
+import math
+from array import array
+
+import verify
+
+
+EARTH_RADIUS = 6371.0088
+
+
+def haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a.lat, a.lon, b.lat, b.lon))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def to_unit(coord):
+    lat, lon = math.radians(coord.lat), math.radians(coord.lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord(distance):
+    return 2 * math.sin(min(distance / EARTH_RADIUS, math.pi) / 2)
+
+
+def arc(chord_length):
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, chord_length / 2))
+
+
+class GeoIndex:
+    # Implicit k-d tree over unit vectors: the node of a slice is its middle
+    # element and the split axis cycles with the depth. Straight line (chord)
+    # distances between unit vectors grow with the great circle distance, so
+    # pruning on chords gives exact haversine answers.
+    def __init__(self, keys, coords):
+        self.keys = list(keys)
+        self.lat = array("d", (coord.lat for coord in coords))
+        self.lon = array("d", (coord.lon for coord in coords))
+        points = [to_unit(coord) for coord in coords]
+        self.order = array("l", range(len(points)))
+        self.xyz = array("d")
+        for point in points:
+            self.xyz.extend(point)
+        self.build(0, len(self.order), 0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def build(self, low, high, axis):
+        if high - low <= 1:
+            return
+        middle = (low + high) // 2
+        xyz = self.xyz
+        self.order[low:high] = array("l", sorted(self.order[low:high], key=lambda point: xyz[3 * point + axis]))
+        self.build(low, middle, (axis + 1) % 3)
+        self.build(middle + 1, high, (axis + 1) % 3)
+
+    def coord(self, position):
+        return verify.Coord(self.lat[position], self.lon[position])
+
+    def search(self, target, visit, bound):
+        xyz = self.xyz
+        order = self.order
+        stack = [(0, len(order), 0)]
+        while stack:
+            low, high, axis = stack.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            point = order[middle]
+            dx = xyz[3 * point] - target[0]
+            dy = xyz[3 * point + 1] - target[1]
+            dz = xyz[3 * point + 2] - target[2]
+            visit(point, math.sqrt(dx * dx + dy * dy + dz * dz))
+            difference = target[axis] - xyz[3 * point + axis]
+            near, far = ((low, middle), (middle + 1, high)) if difference < 0 else ((middle + 1, high), (low, middle))
+            if abs(difference) <= bound():
+                stack.append((far[0], far[1], (axis + 1) % 3))
+            stack.append((near[0], near[1], (axis + 1) % 3))
+
+    def nearest(self, coord, count=1):
+        # The search bound reads the farthest kept point, so there must be room for one.
+        if count <= 0:
+            return []
+        heap = []
+
+        def visit(point, distance):
+            if len(heap) < count:
+                heapq.heappush(heap, (-distance, point))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, point))
+
+        self.search(to_unit(coord), visit, lambda: -heap[0][0] if len(heap) >= count else math.inf)
+        return [(arc(-distance), self.keys[point]) for distance, point in sorted(heap, reverse=True)]
+
+    def within(self, coord, radius):
+        limit = chord(radius)
+        found = []
+
+        def visit(point, distance):
+            if distance <= limit:
+                found.append((arc(distance), self.keys[point]))
+
+        self.search(to_unit(coord), visit, lambda: limit)
+        return sorted(found)
+
+    def nearest_batch(self, coords, count=1):
+        return [self.nearest(coord, count) for coord in coords]
+
+    def within_batch(self, coords, radius):
+        return [self.within(coord, radius) for coord in coords]
+
+
+def city_path(world):
+    return "{w.continent}/{w.country}/{w.region}/{w.city}".format(w=world)
+
+
+def cities_of(locations):
+    cities = {}
+    for conf, conf_value in locations.confederations.items():
+        for country, country_value in conf_value.countries.items():
+            for region, region_value in country_value.regions.items():
+                for city, value in region_value.cities.items():
+                    cities["{conf}/{country}/{region}/{city}".format(conf=conf, country=country, region=region, city=city)] = value
+    return cities
+
+
+def stadium_index(stadiums):
+    return GeoIndex(stadiums.keys(), [stadium.coord for stadium in stadiums.values()])
+
+
+def city_index(locations):
+    cities = cities_of(locations)
+    return GeoIndex(cities.keys(), [city.coord for city in cities.values()])
+
+
+def nearest_stadiums_to_teams(teams, locations, stadiums_index, count=1):
+    cities = cities_of(locations)
+    names = list(teams)
+    return dict(zip(names, stadiums_index.nearest_batch([cities[city_path(teams[team].world)].coord for team in names], count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query stadiums and cities by distance")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("--city", help="city as continent/country/region/city, e.g. conmebol/brazil/sp/santos")
+    parser.add_argument("--radius", type=float, help="list the stadiums within this many kilometers of --city")
+    parser.add_argument("--count", type=int, default=5, help="number of nearest stadiums to list for --city")
+    parser.add_argument("--teams", action="store_true", help="list the nearest stadium to the city of every team")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+    stadiums_index = stadium_index(stadiums)
+
+    if args.city:
+        cities = cities_of(locations)
+        if not args.city in cities:
+            verify.exit_with_error("Error: the city", args.city, "is missing on locations list")
+        coord = cities[args.city].coord
+        if args.radius is not None:
+            print("\nStadiums within", args.radius, "km of", args.city)
+            found = stadiums_index.within(coord, args.radius)
+        else:
+            print("\nNearest stadiums to", args.city)
+            found = stadiums_index.nearest(coord, args.count)
+        for distance, stadium in found:
+            print("  {stadium} {distance:.1f} km".format(stadium=stadium, distance=distance))
+
+    if args.teams:
+        print("\nNearest stadium to each team city:")
+        for team, found in sorted(nearest_stadiums_to_teams(teams, locations, stadiums_index).items()):
+            distance, stadium = found[0]
+            print("  {team} {stadium} {distance:.1f} km{home}".format(team=team, stadium=stadium, distance=distance, home="" if stadium == teams[team].stadium else " (plays at " + teams[team].stadium + ")"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import argparse
+import string
+import time
+
+import geo
+import verify
+
+
+GEO_GROUPED_MECHANICS = ["national-b", "national-c"]
+
+
+class Grouping:
+    def __init__(self, groups, costs):
+        self.groups = groups
+        self.costs = costs
+
+    @property
+    def cost(self):
+        return sum(self.costs)
+
+
+def distance_table(coords):
+    size = len(coords)
+    table = [[0.0] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            table[i][j] = table[j][i] = geo.haversine(coords[i], coords[j])
+    return table
+
+
+def seed_groups(table, groups):
+    # Spread the seeds: start from the most remote point, then keep picking the point farthest from every seed.
+    size = len(table)
+    seeds = [max(range(size), key=lambda point: sum(table[point]))]
+    closest = list(table[seeds[0]])
+    while len(seeds) < groups:
+        seed = max(range(size), key=lambda point: closest[point])
+        seeds.append(seed)
+        closest = [min(closest[point], table[seed][point]) for point in range(size)]
+    return seeds
+
+
+def assign_groups(table, seeds, capacity):
+    size = len(table)
+    assignment = [None] * size
+    filled = [0] * len(seeds)
+
+    # Points with the most to lose if they miss their closest seed are placed first.
+    def regret(point):
+        distances = sorted(table[point][seed] for seed in seeds)
+        return distances[1] - distances[0] if len(distances) > 1 else 0.0
+
+    for point in sorted(range(size), key=regret, reverse=True):
+        for group in sorted(range(len(seeds)), key=lambda group: table[point][seeds[group]]):
+            if filled[group] < capacity:
+                assignment[point] = group
+                filled[group] += 1
+                break
+    return assignment
+
+
+def refine_groups(table, assignment, groups):
+    size = len(table)
+    # totals[point][group] is the distance from the point to every member of the group.
+    totals = [[0.0] * groups for _ in range(size)]
+    for point in range(size):
+        row = table[point]
+        for other in range(size):
+            totals[point][assignment[other]] += row[other]
+
+    improved = True
+    while improved:
+        improved = False
+        for a in range(size):
+            for b in range(a + 1, size):
+                group_a, group_b = assignment[a], assignment[b]
+                if group_a == group_b:
+                    continue
+                distance = table[a][b]
+                delta = (totals[b][group_a] - distance - totals[a][group_a]) + (totals[a][group_b] - distance - totals[b][group_b])
+                if delta < -1e-9:
+                    for point in range(size):
+                        change = table[point][b] - table[point][a]
+                        totals[point][group_a] += change
+                        totals[point][group_b] -= change
+                    assignment[a], assignment[b] = group_b, group_a
+                    improved = True
+    return assignment
+
+
+def balanced_groups(keys, coords, groups):
+    keys = list(keys)
+    if groups < 1 or len(keys) % groups != 0:
+        raise ValueError("{count} teams can not be split into {groups} equal groups".format(count=len(keys), groups=groups))
+    table = distance_table(coords)
+    assignment = refine_groups(table, assign_groups(table, seed_groups(table, groups), len(keys) // groups), groups)
+
+    members = [[] for _ in range(groups)]
+    for point, group in enumerate(assignment):
+        members[group].append(point)
+    # Every pair of a double round robin group travels the distance twice, once per home game.
+    costs = [2 * sum(table[a][b] for i, a in enumerate(group) for b in group[i + 1:]) for group in members]
+    order = sorted(range(groups), key=lambda group: sorted(keys[point] for point in members[group]))
+    return Grouping([sorted(keys[point] for point in members[group]) for group in order], [costs[group] for group in order])
+
+
+def group_competition(competition, stadiums, teams, competitions, index, groups=None):
+    members = index.teams[competition]
+    groups = groups or verify.SUPPORTED_MECHANICS[competitions["competitions"][competition].mechanics].groups
+    return balanced_groups(members, [stadiums[teams[team].stadium].coord for team in members], groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split competitions into equal size groups with the least intra group travel")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("competitions", nargs="*", help="competitions to group, defaults to every competition whose mechanics group by geo location")
+    parser.add_argument("-g", "--groups", type=int, help="number of groups, defaults to the competition mechanics")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    selected = args.competitions or [competition for competition in index.teams if competitions["competitions"][competition].mechanics in GEO_GROUPED_MECHANICS]
+    for competition in selected:
+        if not competition in index.teams:
+            verify.exit_with_error("  Error found on competition:", competition, "the competition is not in the list of competitions")
+        started = time.perf_counter()
+        try:
+            grouping = group_competition(competition, stadiums, teams, competitions, index, args.groups)
+        except ValueError as e:
+            verify.exit_with_error("  Error found on competition:", competition, e)
+        elapsed = time.perf_counter() - started
+
+        print("\nGroups for", competition, "in {elapsed:.3f}s:".format(elapsed=elapsed))
+        for letter, group, cost in zip(string.ascii_uppercase, grouping.groups, grouping.costs):
+            print("  {letter}: {travel:.0f} km".format(letter=letter, travel=cost), " ".join(group))
+        print("  total travel: {travel:.0f} km".format(travel=grouping.cost))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import verify
+
+
+IMPORT_KINDS = ["stadium", "city", "team"]
+IMAGES = {"city": "flag", "team": "shield"}
+# Slugs become directory names, so they are checked whole before any path is built.
+SLUG_REGEX = re.compile(r"[a-z][a-z0-9-]*")
+
+
+class Imported:
+    def __init__(self, kind, slug, path, data, image, value=None, joins=(), replaces=None):
+        self.kind = kind
+        self.slug = slug
+        self.path = path
+        self.data = data
+        self.image = image
+        self.value = value
+        self.joins = joins
+        self.replaces = replaces
+
+
+def read_rows(path):
+    # CSV headers name the fields, localized ones with a language suffix like name.pt.
+    # JSON Lines rows may also use the nested shape of a data.json file.
+    rows = []
+    with open(path, newline="") as rows_file:
+        if path.endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(rows_file)):
+                rows.append(("{path}:{line}".format(path=path, line=number + 2), {key: value for key, value in row.items() if value is not None}))
+        else:
+            for number, line in enumerate(rows_file):
+                if line.strip():
+                    rows.append(("{path}:{line}".format(path=path, line=number + 1), json.loads(line)))
+    return rows
+
+
+def number(value, kind):
+    try:
+        return kind(value) if type(value) is str else value
+    except ValueError:
+        return value
+
+
+def row_data(kind, row, language):
+    data = {}
+    for field in verify.SCHEMAS[kind].fields:
+        if field.rule == "localized":
+            localized = row.get(field.key)
+            localized = dict(localized) if type(localized) is dict else {language: localized} if localized else {}
+            for key, value in row.items():
+                if key.startswith(field.key + ".") and value:
+                    localized[key[len(field.key) + 1:]] = value
+            if localized:
+                data[field.key] = localized
+        elif field.rule == "positive_integer" and field.key in row:
+            data[field.key] = number(row[field.key], int)
+        elif field.rule == "coordinate":
+            coord = row.get(field.key) or {part: row[part] for part in ["lat", "lon"] if part in row}
+            data[field.key] = {part: number(value, float) for part, value in coord.items()}
+        elif field.rule == "location":
+            data[field.key] = row.get(field.key) or {part: row[part] for part in ["continent", "country", "region", "city"] if part in row}
+        elif field.key in row:
+            data[field.key] = row[field.key]
+    return data
+
+
+def row_list(value):
+    if value is None:
+        return []
+    return list(value) if type(value) is list else value.replace(";", " ").split()
+
+
+def row_error(*error, field=None, path=None):
+    verify.field_error(field, *error, path=path)
+
+
+def check_image(kind, slug, row):
+    image = IMAGES[kind]
+    source = row.get(image)
+    if not source:
+        row_error("  Error found on {kind}:".format(kind=kind), slug, "the", image, "image is missing", field=image)
+    if not os.path.isfile(source) or not source.rpartition(".")[2] in verify.IMAGE_KINDS:
+        row_error("  Error found on {kind}:".format(kind=kind), slug, "the", image, "image", source, "is not a readable image", field=image, path=source)
+    return source
+
+
+def check_joins(slug, row, competitions):
+    joins = row_list(row.get("competitions"))
+    replaces = row.get("replaces") or None
+    if not joins:
+        row_error("  Error found on team:", slug, "the competitions are missing, a new team joins at least one", field="competitions")
+    for competition in joins:
+        comp = competitions["competitions"].get(competition)
+        if type(comp) is not verify.Competition:
+            row_error("  Error found on team:", slug, "the competition", competition, "is not in the list of competitions", field="competitions")
+        if comp.teams_source is not None:
+            row_error("  Error found on team:", slug, "the competition", competition, "takes its teams from", ", ".join(comp.teams_source), field="competitions")
+        if replaces is not None and not replaces in comp.teams:
+            row_error("  Error found on team:", slug, "the team", replaces, "it replaces is not in", competition, field="replaces")
+    return joins, replaces
+
+
+def check_row(kind, row, language, stadiums, locations, competitions, batch):
+    # Like the schemas, every field is checked before the row fails, so a row lists all its
+    # problems at once. Without a valid slug there is no path, but the other fields still count.
+    slug = row.get("slug", "")
+    parents = [row.get(part, "") for part in ["continent", "country", "region"]] if kind == "city" else []
+    valid = all(type(part) is str and SLUG_REGEX.fullmatch(part) for part in parents + [slug])
+    if not valid:
+        path = None
+    elif kind == "city":
+        path = "world/{continent}/{country}/{region}/{city}".format(continent=parents[0], country=parents[1], region=parents[2], city=slug)
+    else:
+        path = "{root}/{slug}".format(root="stadium" if kind == "stadium" else "teams", slug=slug)
+    with verify.checking(path):
+        fields_failed = 0
+        image = None
+        joins, replaces = (), None
+        region = None
+        try:
+            if not valid:
+                row_error("  Error found on {kind}:".format(kind=kind), repr(slug), "the slug or its location is invalid, only lowercase letters, digits and dashes are allowed", field="slug")
+            if kind == "team":
+                verify.check_team_name(slug, row_error)
+            if os.path.exists(path) or path in batch:
+                row_error("  Error found on {kind}:".format(kind=kind), slug, "already exists at", path, field="slug")
+        except verify.FieldError:
+            fields_failed += 1
+        if kind in IMAGES:
+            try:
+                image = check_image(kind, slug, row)
+            except verify.FieldError:
+                fields_failed += 1
+        if kind == "city":
+            region = locations.confederations.get(row.get("continent"))
+            region = region and region.countries.get(row.get("country"))
+            region = region and region.regions.get(row.get("region"))
+            if region is None:
+                try:
+                    row_error("  Error found on city:", slug, "the region", "/".join(str(part) for part in parents), "is missing on locations list", field="region")
+                except verify.FieldError:
+                    fields_failed += 1
+        if kind == "team":
+            try:
+                joins, replaces = check_joins(slug, row, competitions)
+            except verify.FieldError:
+                fields_failed += 1
+        data = row_data(kind, row, language)
+
+        # The validators report their own fields and exit when any failed.
+        if kind == "stadium":
+            value = verify.Stadium(*verify.VALIDATORS["stadium"](slug, data))
+        elif kind == "city":
+            value = verify.City(*verify.VALIDATORS["city"](slug, data))
+        else:
+            value = verify.Team(*verify.VALIDATORS["team"](slug, data, stadiums=stadiums, locations=locations))
+        if fields_failed:
+            exit(1)
+        if kind == "stadium":
+            stadiums[slug] = value
+        elif kind == "city":
+            region.cities[slug] = value
+        batch[path] = Imported(kind, slug, path, data, image, value if kind == "team" else None, joins, replaces)
+        return batch[path]
+
+
+def join_competitions(entities, competitions):
+    # New teams take their place in the rosters, in the place of the team they replace.
+    rosters = {}
+    for entity in entities:
+        for competition in entity.joins:
+            roster = rosters.setdefault(competition, set(competitions["competitions"][competition].teams))
+            if entity.replaces is not None:
+                roster.discard(entity.replaces)
+            roster.add(entity.slug)
+    updated = dict(competitions["competitions"])
+    for competition, roster in rosters.items():
+        comp = updated[competition]
+        updated[competition] = verify.Competition(comp.name, comp.nickname, comp.mechanics, comp.relegation, comp.promotion, sorted(roster), comp.teams_source)
+    return dict(competitions, competitions=updated), {competition: sorted(roster) for competition, roster in rosters.items()}
+
+
+def check_competitions(competitions, teams):
+    # The same checks verify runs on the competitions, over the rosters as they will be written.
+    with verify.checking(None):
+        index = verify.index_competitions(competitions)
+        verify.check_teams_has_competitions(teams, index)
+        verify.check_mechanics(competitions, index)
+        verify.check_calendar(verify.index_calendar(competitions, index), index)
+
+
+def check_batch(files, language, stadiums, locations, competitions):
+    # Stadiums and cities come first so teams can point to the ones of the same batch.
+    batch = {}
+    for kind in IMPORT_KINDS:
+        for path in files.get(kind, []):
+            try:
+                rows = read_rows(path)
+            except (OSError, ValueError) as e:
+                verify.continue_with_error("Error: invalid", kind, "file", path, e)
+                continue
+            for source, row in rows:
+                if check_row(kind, row, language, stadiums, locations, competitions, batch) is None:
+                    print("    at", source)
+    return list(batch.values())
+
+
+def write_batch(entities, rosters):
+    # Every entity directory and roster is staged complete, then moved into place. A failed
+    # move puts back what was already moved, so the tree gets the whole batch or nothing.
+    os.makedirs(verify.BUILD_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix="import-", dir=verify.BUILD_DIR)
+    try:
+        moves = []
+        for position, entity in enumerate(entities):
+            directory = os.path.join(staging, str(position))
+            os.makedirs(directory)
+            with open(directory + "/data.json", "w") as json_file:
+                json.dump(entity.data, json_file, indent=4, ensure_ascii=False)
+            if entity.image is not None:
+                shutil.copyfile(entity.image, "{directory}/{image}.{kind}".format(directory=directory, image=IMAGES[entity.kind], kind=entity.image.rpartition(".")[2]))
+            moves.append((directory, entity.path))
+        for competition, roster in rosters.items():
+            path = "competitions/{competition}/data.json".format(competition=competition)
+            with open(path) as json_file:
+                data = json.load(json_file)
+            data["teams"] = roster
+            staged = os.path.join(staging, "competition-" + competition)
+            with open(staged, "w") as json_file:
+                json.dump(data, json_file, indent=4, ensure_ascii=False)
+            moves.append((staged, path))
+        moved = []
+        try:
+            for staged, target in moves:
+                previous = staged + ".previous" if os.path.exists(target) else None
+                if previous is not None:
+                    os.rename(target, previous)
+                moved.append((staged, target, previous))
+                os.rename(staged, target)
+        except OSError:
+            for staged, target, previous in reversed(moved):
+                if not os.path.exists(staged):
+                    os.rename(target, staged)
+                if previous is not None:
+                    os.rename(previous, target)
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import stadiums, cities and teams from CSV or JSON Lines files, writing all of them or none")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("--stadiums", action="append", default=[], help="file of stadiums: slug, name, nickname, capacity, lat, lon")
+    parser.add_argument("--cities", action="append", default=[], help="file of cities: continent, country, region, slug, name, lat, lon, flag (image file)")
+    parser.add_argument("--teams", action="append", default=[], help="file of teams: slug, name, nickname, acronym, stadium, continent, country, region, city, shield (image file), competitions (separated by ;) and the team it replaces in them, if any")
+    parser.add_argument("--language", default="pt", choices=verify.SUPPORTED_LANGUAGES, help="language of the localized columns without a language suffix")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only validate the rows")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    print("\nChecking the import:")
+    verify.REPORT = verify.Report()
+    entities = check_batch({"stadium": args.stadiums, "city": args.cities, "team": args.teams}, args.language, dict(stadiums), locations, competitions)
+    rosters = {}
+    if not verify.REPORT.problems:
+        competitions, rosters = join_competitions(entities, competitions)
+        check_competitions(competitions, dict(teams, **{entity.slug: entity.value for entity in entities if entity.kind == "team"}))
+    if verify.REPORT.problems:
+        verify.write_report(args.report)
+        print("Nothing imported")
+        exit(1)
+    verify.REPORT = None
+
+    counts = ", ".join("{count} {kind}".format(count=sum(1 for entity in entities if entity.kind == kind), kind=kind) for kind in IMPORT_KINDS)
+    if args.dry_run:
+        print(counts, "rows are valid,", len(rosters), "competitions to update")
+        return
+    write_batch(entities, rosters)
+    print(counts, "rows imported,", len(rosters), "competitions updated")
+
+
+if __name__ == "__main__":
+    main()
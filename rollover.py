@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import random
+import shutil
+
+import fixtures
+import simulate
+import verify
+
+
+class Level:
+    def __init__(self, competition, upper, lower):
+        self.competition = competition
+        self.upper = upper
+        self.lower = lower
+
+
+def pyramid(competitions, index):
+    # An edge exists when either end declares it: a relegation link or the promotion link
+    # of the competition below.
+    leagues = {competition: competitions["competitions"][competition] for competition in index.teams if competitions["competitions"][competition].teams_source is None}
+    uppers = {competition: set() for competition in leagues}
+    lowers = {competition: set() for competition in leagues}
+    for competition, comp in leagues.items():
+        if comp.relegation in leagues:
+            lowers[competition].add(comp.relegation)
+            uppers[comp.relegation].add(competition)
+        if comp.promotion in leagues:
+            uppers[competition].add(comp.promotion)
+            lowers[comp.promotion].add(competition)
+
+    levels = {}
+    for competition in leagues:
+        if len(uppers[competition]) > 1 or len(lowers[competition]) > 1:
+            verify.exit_with_error("  Error found on competition:", competition, "the promotion and relegation links are ambiguous, up to", sorted(uppers[competition]), "down to", sorted(lowers[competition]))
+        upper = next(iter(uppers[competition]), None)
+        lower = next(iter(lowers[competition]), None)
+        if upper is not None or lower is not None:
+            levels[competition] = Level(competition, upper, lower)
+    return levels
+
+
+def topological_order(levels):
+    order = [competition for competition, level in levels.items() if level.upper is None]
+    for competition in order:
+        lower = levels[competition].lower
+        if lower is not None and not lower in order:
+            order.append(lower)
+    if len(order) != len(levels):
+        verify.exit_with_error("  Error found on competitions: the promotion and relegation links have a cycle:", " ".join(sorted(set(levels) - set(order))))
+    return order
+
+
+def standings_placements(competition, mechanics, entry):
+    # Explicit promoted and relegated lists win, otherwise the mechanics placements are read
+    # from the final table, one list per group, and the finalists.
+    if "promoted" in entry or "relegated" in entry:
+        return list(entry.get("promoted", [])), list(entry.get("relegated", []))
+    if not mechanics in fixtures.PLACEMENTS:
+        verify.exit_with_error("  Error found on standings:", competition, "the", mechanics, "mechanics has no placements, give its promoted and relegated teams")
+    placement = fixtures.PLACEMENTS[mechanics]
+    tables = entry.get("table", {})
+    if type(tables) is list:
+        tables = {"": tables}
+
+    def take(positions):
+        teams = []
+        for group, table in tables.items():
+            for position in positions:
+                if position > len(table):
+                    verify.exit_with_error("  Error found on standings:", competition, "the table" + (" of group " + group if group else ""), "has no position", position)
+                teams.append(table[position - 1])
+        return teams
+
+    if placement.promoted == "finalists":
+        promoted = list(entry.get("finalists", []))
+        if len(promoted) != 2:
+            verify.exit_with_error("  Error found on standings:", competition, "the finalists are missing")
+    else:
+        promoted = take(placement.promoted or [])
+    return promoted, take(placement.relegated)
+
+
+def simulated_placements(competition, competitions, index, stadiums, teams, rng):
+    schedule = fixtures.generate_fixtures(competition, competitions, index, stadiums, teams)
+    if schedule is None:
+        verify.exit_with_error("  Error found on standings:", competition, "the", competitions["competitions"][competition].mechanics, "mechanics has no defined format to simulate, give its promoted and relegated teams")
+    model = simulate.Model(schedule.ranking)
+    totals, games = simulate.play_round_robins(schedule, model, rng, 1)
+    champion, promoted, relegated = simulate.Season(schedule, model, rng, totals, games, 0).play_knockouts().placements()
+    return promoted, relegated
+
+
+def rollover(levels, competitions, placements):
+    # Teams only move along existing edges: the top level keeps its promoted teams and the
+    # bottom level keeps its relegated ones.
+    order = topological_order(levels)
+    moves = {competition: ([], []) for competition in order}
+    for competition in order:
+        level = levels[competition]
+        members = set(competitions["competitions"][competition].teams)
+        promoted, relegated = placements[competition]
+        for team in promoted + relegated:
+            if not team in members:
+                verify.exit_with_error("  Error found on standings:", competition, "the team", team, "is not in the competition")
+        if set(promoted) & set(relegated) or len(set(promoted + relegated)) != len(promoted + relegated):
+            verify.exit_with_error("  Error found on standings:", competition, "a team is promoted or relegated twice")
+        if level.upper is not None:
+            moves[competition][0].extend(promoted)
+            moves[level.upper][1].extend(promoted)
+        if level.lower is not None:
+            moves[competition][0].extend(relegated)
+            moves[level.lower][1].extend(relegated)
+
+    rosters = {}
+    for competition in order:
+        comp = competitions["competitions"][competition]
+        leaving, arriving = moves[competition]
+        roster = sorted((set(comp.teams) - set(leaving)) | set(arriving))
+        expected = verify.SUPPORTED_MECHANICS[comp.mechanics].teams
+        if len(roster) != expected:
+            verify.exit_with_error("  Error found on rollover:", competition, "would have", len(roster), "teams but the", comp.mechanics, "mechanics needs", expected, "(", len(leaving), "leaving", len(arriving), "arriving )")
+        rosters[competition] = (roster, leaving, arriving)
+    return order, rosters
+
+
+def write_rosters(rosters):
+    # Every roster is written to a temporary and every original copied aside before the
+    # first replace. A failed replace puts the replaced originals back, so the dataset gets
+    # every roster or none, and no temporary is ever left behind.
+    paths = []
+    temporaries = []
+    replaced = []
+    try:
+        for competition, (roster, leaving, arriving) in rosters.items():
+            path = "competitions/{competition}/data.json".format(competition=competition)
+            with open(path) as json_file:
+                data = json.load(json_file)
+            if data["teams"] == roster:
+                continue
+            data["teams"] = roster
+            temporaries.append(path + ".tmp")
+            with open(path + ".tmp", "w") as json_file:
+                json.dump(data, json_file, indent=4, ensure_ascii=False)
+            paths.append(path)
+        for path in paths:
+            temporaries.append(path + ".previous")
+            shutil.copy2(path, path + ".previous")
+        try:
+            for path in paths:
+                os.replace(path + ".tmp", path)
+                replaced.append(path)
+        except OSError:
+            for path in reversed(replaced):
+                os.replace(path + ".previous", path)
+            raise
+    finally:
+        for temporary in temporaries:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll every competition over to the next season along the promotion and relegation links")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("standings", nargs="?", help="json object of final standings per competition, with a table (a list or one list per group) and the finalists, or the promoted and relegated teams")
+    parser.add_argument("--simulate", type=int, metavar="SEED", help="simulate the competitions missing from the standings with this seed")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="print the next season rosters without writing them")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    standings = {}
+    if args.standings:
+        try:
+            with open(args.standings) as standings_file:
+                standings = json.load(standings_file)
+        except (OSError, ValueError) as e:
+            verify.exit_with_error("Error: invalid standings file", args.standings, e)
+
+    levels = pyramid(competitions, index)
+    for competition in standings:
+        if not competition in levels:
+            verify.exit_with_error("  Error found on standings:", competition, "the competition has no promotion or relegation")
+    rng = random.Random(args.simulate)
+    placements = {}
+    for competition in levels:
+        if competition in standings:
+            placements[competition] = standings_placements(competition, competitions["competitions"][competition].mechanics, standings[competition])
+        elif args.simulate is not None:
+            placements[competition] = simulated_placements(competition, competitions, index, stadiums, teams, rng)
+        else:
+            verify.exit_with_error("  Error found on standings:", competition, "the final standings are missing")
+
+    order, rosters = rollover(levels, competitions, placements)
+
+    print("\nRollover:")
+    for competition in order:
+        roster, leaving, arriving = rosters[competition]
+        print(" ", competition, len(roster), "teams")
+        if leaving:
+            print("    out:", " ".join(leaving))
+        if arriving:
+            print("    in: ", " ".join(arriving))
+    if args.dry_run:
+        return
+    try:
+        written = write_rosters(rosters)
+    except OSError as e:
+        verify.exit_with_error("Error: could not write the rosters, none was changed,", e)
+    print(len(written), "data.json files written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import time
+from bisect import bisect
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, repeat
+from operator import add
+
+import fixtures
+import standings
+import verify
+
+
+FORECAST_FILE = "{build}/forecast.json".format(build=verify.BUILD_DIR)
+MAX_GOALS = 10
+HOME_GOALS = 1.4
+AWAY_GOALS = 1.1
+STRENGTH = 0.6
+# Season totals are packed in one integer per team: points, wins, goals made and conceded.
+TOTAL_BITS = 16
+TOTAL_MASK = (1 << TOTAL_BITS) - 1
+
+
+class Model:
+    # The dataset has no ratings, so every team is level unless ratings are given: they
+    # are scaled so the best rated team is +1 and the worst -1. Goals are independent
+    # Poisson draws.
+    def __init__(self, ranking, ratings=None):
+        ratings = ratings or {team: 0 for team in ranking}
+        low = min((ratings[team] for team in ranking), default=0)
+        spread = max((ratings[team] for team in ranking), default=0) - low
+        self.strength = {team: 2 * (ratings[team] - low) / spread - 1 if spread else 0 for team in ranking}
+        self.ranking = {team: position for position, team in enumerate(ranking)}
+        self.distributions = {}
+
+    def distribution(self, home, away, neutral):
+        # Pairings with the same strength difference share a distribution, all of them when teams are level.
+        key = (self.strength[home] - self.strength[away], neutral)
+        if not key in self.distributions:
+            difference = STRENGTH * key[0]
+            home_rate = (AWAY_GOALS if neutral else HOME_GOALS) * math.exp(difference / 2)
+            away_rate = AWAY_GOALS * math.exp(-difference / 2)
+            home_goals = poisson(home_rate)
+            away_goals = poisson(away_rate)
+            total = 0.0
+            cumulative = []
+            scores = []
+            for a, p in enumerate(home_goals):
+                for b, q in enumerate(away_goals):
+                    total += p * q
+                    cumulative.append(total)
+                    scores.append((a, b))
+            self.distributions[key] = ([value / total for value in cumulative], scores)
+        return self.distributions[key]
+
+    def play(self, home, away, neutral, rng):
+        cumulative, scores = self.distribution(home, away, neutral)
+        return scores[min(bisect(cumulative, rng.random()), len(scores) - 1)]
+
+    def shootout(self, a, b, rng):
+        # Extra time and penalties slightly favour the stronger team.
+        return a if rng.random() < 0.5 + 0.1 * (self.strength[a] - self.strength[b]) / 2 else b
+
+
+def poisson(rate):
+    values = [math.exp(-rate)]
+    for goals in range(1, MAX_GOALS + 1):
+        values.append(values[-1] * rate / goals)
+    return values
+
+
+def ratings_of_results(results):
+    # Points per game of the results played so far.
+    table = standings.Standings(sorted({team for result in results for team in (result.home, result.away)}))
+    for result in results:
+        table.add(result)
+    return {record.team: record.points / record.played for record in table.table()}
+
+
+def pack(points, wins, goals, conceded):
+    return points | wins << TOTAL_BITS | goals << 2 * TOTAL_BITS | conceded << 3 * TOTAL_BITS
+
+
+def play_round_robins(schedule, model, rng, simulations):
+    # Every round robin game is drawn for all the simulations of the shard at once: one
+    # getrandbits call gives a 32 bit number per simulation, bisected into the score
+    # distribution with map, and the packed outcome of each score is added to the packed
+    # totals of both teams with map too, so no Python code runs per simulation. The
+    # draws are kept, one byte per simulation, for the direct confrontations.
+    teams = [team for group in schedule.groups.values() for team in group]
+    totals = {team: [0] * simulations for team in teams}
+    games = {}
+    for fixture in schedule.fixtures:
+        if fixture.tie is not None:
+            continue
+        cumulative, scores = model.distribution(fixture.home, fixture.away, fixture.neutral)
+        thresholds = [round(value * (1 << 32)) for value in cumulative[:-1]]
+        numbers = memoryview(rng.getrandbits(32 * simulations).to_bytes(4 * simulations, "little")).cast("I")
+        drawn = bytes(map(bisect, repeat(thresholds, simulations), numbers))
+        points = [(3 if a > b else 1 if a == b else 0, 3 if b > a else 1 if a == b else 0) for a, b in scores]
+        home = [pack(home_points, home_points // 3, a, b) for (home_points, _), (a, b) in zip(points, scores)]
+        away = [pack(away_points, away_points // 3, b, a) for (_, away_points), (a, b) in zip(points, scores)]
+        totals[fixture.home][:] = map(add, totals[fixture.home], map(home.__getitem__, drawn))
+        totals[fixture.away][:] = map(add, totals[fixture.away], map(away.__getitem__, drawn))
+        games.setdefault(frozenset((fixture.home, fixture.away)), []).append((fixture.home, fixture.away, points, drawn))
+    return totals, games
+
+
+class Season:
+    def __init__(self, schedule, model, rng, totals, games, simulation):
+        self.schedule = schedule
+        self.model = model
+        self.rng = rng
+        self.totals = totals
+        self.games = games
+        self.simulation = simulation
+        self.records = {}
+        self.tables = None
+        self.seeds = {}
+        self.winners = {}
+        self.aggregate = {}
+        self.finalists = []
+
+    def record(self, team):
+        if not team in self.records:
+            record = standings.Record(team, self.model.ranking[team])
+            total = self.totals[team][self.simulation]
+            record.points = total & TOTAL_MASK
+            record.wins = total >> TOTAL_BITS & TOTAL_MASK
+            record.goals = total >> 2 * TOTAL_BITS & TOTAL_MASK
+            record.conceded = total >> 3 * TOTAL_BITS
+            self.records[team] = record
+        return self.records[team]
+
+    def meeting(self, a, b):
+        points = {a: 0, b: 0}
+        for home, away, outcomes, drawn in self.games.get(frozenset((a, b)), []):
+            home_points, away_points = outcomes[drawn[self.simulation]]
+            points[home] += home_points
+            points[away] += away_points
+        return points
+
+    def campaign(self, team):
+        # Seeded teams come from different tables, so only the tiebreakers after direct confrontation apply.
+        if not self.totals:
+            return (self.model.ranking[team],)
+        record = self.record(team)
+        return (-record.points,) + record.tiebreak()
+
+    def order(self, teams):
+        table = []
+        for _, tied in groupby(sorted(teams, key=lambda team: (-self.record(team).points, self.model.ranking[team])), key=lambda team: self.record(team).points):
+            tied = list(tied)
+            table.extend(standings.tiebreak(tied, self.records, self.meeting) if len(tied) > 1 else tied)
+        return table
+
+    def table(self, group):
+        if self.tables is None:
+            self.tables = {name: self.order(teams) for name, teams in self.schedule.groups.items()}
+        return self.tables[group]
+
+    def resolve(self, slot):
+        if type(slot) is str:
+            return slot
+        if slot.kind == "rank":
+            if not self.schedule.groups:
+                return self.schedule.ranking[slot.position - 1]
+            return self.table(slot.key or "")[slot.position - 1]
+        if slot.kind == "winner":
+            return self.winners[slot.key]
+        if not slot.key in self.seeds:
+            self.seeds[slot.key] = sorted((self.resolve(entrant) for entrant in self.schedule.seedings[slot.key]), key=self.campaign)
+        return self.seeds[slot.key][slot.position - 1]
+
+    def play_knockouts(self):
+        for fixture in self.schedule.fixtures:
+            if fixture.tie is None:
+                continue
+            home, away = self.resolve(fixture.home), self.resolve(fixture.away)
+            home_goals, away_goals = self.model.play(home, away, fixture.neutral, self.rng)
+            if fixture.tie == "final":
+                self.finalists = [home, away]
+            totals = self.aggregate.setdefault(fixture.tie, Counter())
+            totals[home] += home_goals
+            totals[away] += away_goals
+            if fixture is self.schedule.ties[fixture.tie][-1]:
+                if totals[home] != totals[away]:
+                    self.winners[fixture.tie] = home if totals[home] > totals[away] else away
+                else:
+                    self.winners[fixture.tie] = self.model.shootout(home, away, self.rng)
+        return self
+
+    def placements(self):
+        placement = fixtures.PLACEMENTS[self.schedule.mechanics]
+        if placement.champion == "final":
+            champion = self.winners["final"]
+        else:
+            champion = self.table("")[0]
+        if placement.promoted == "finalists":
+            promoted = list(self.finalists)
+        else:
+            promoted = [self.table(group)[position - 1] for group in self.schedule.groups for position in placement.promoted or []]
+        relegated = [self.table(group)[position - 1] for group in self.schedule.groups for position in placement.relegated]
+        return champion, promoted, relegated
+
+
+def simulate_shard(schedule, simulations, seed, ratings=None):
+    rng = random.Random(seed)
+    model = Model(schedule.ranking, ratings)
+    titles = Counter()
+    promotions = Counter()
+    relegations = Counter()
+    totals, games = play_round_robins(schedule, model, rng, simulations)
+    for simulation in range(simulations):
+        champion, promoted, relegated = Season(schedule, model, rng, totals, games, simulation).play_knockouts().placements()
+        titles[champion] += 1
+        promotions.update(promoted)
+        relegations.update(relegated)
+    return titles, promotions, relegations
+
+
+def shards(simulations, count):
+    size, extra = divmod(simulations, count)
+    return [size + (1 if shard < extra else 0) for shard in range(count)]
+
+
+def simulate(schedule, simulations, seed=0, pool=None, jobs=1, ratings=None):
+    titles = Counter()
+    promotions = Counter()
+    relegations = Counter()
+    sizes = [size for size in shards(simulations, jobs) if size > 0]
+    seeds = [seed * 1000003 + shard for shard in range(len(sizes))]
+    if pool is None:
+        results = map(simulate_shard, [schedule] * len(sizes), sizes, seeds, [ratings] * len(sizes))
+    else:
+        results = pool.map(simulate_shard, [schedule] * len(sizes), sizes, seeds, [ratings] * len(sizes))
+    for shard_titles, shard_promotions, shard_relegations in results:
+        titles.update(shard_titles)
+        promotions.update(shard_promotions)
+        relegations.update(shard_relegations)
+    return titles, promotions, relegations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast title, promotion and relegation chances by simulating whole seasons")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("competitions", nargs="*", help="competitions to simulate, defaults to every competition")
+    parser.add_argument("-n", "--simulations", type=int, default=10000, help="number of seasons simulated per competition")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, the same seed and jobs give the same forecast")
+    strengths = parser.add_mutually_exclusive_group()
+    strengths.add_argument("--ratings", help="json object with a rating per team, higher is stronger, every team is level without it")
+    strengths.add_argument("--results", help="json list of results played so far, as read by standings.py, rating teams by points per game")
+    parser.add_argument("-o", "--output", help="json file to write the forecast into, e.g. " + FORECAST_FILE)
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    ratings = None
+    try:
+        if args.ratings:
+            with open(args.ratings) as ratings_file:
+                ratings = json.load(ratings_file)
+            if type(ratings) is not dict or not all(type(rating) in [int, float] for rating in ratings.values()):
+                raise ValueError("expected an object with a number per team")
+        elif args.results:
+            ratings = ratings_of_results(standings.load_results(args.results))
+    except (OSError, ValueError, KeyError) as e:
+        verify.exit_with_error("Error: invalid ratings file", args.ratings or args.results, e)
+
+    forecast = {}
+    with ProcessPoolExecutor(jobs) if jobs > 1 else contextlib.nullcontext() as pool:
+        for competition in args.competitions or list(index.teams):
+            if not competition in index.teams:
+                verify.exit_with_error("  Error found on competition:", competition, "the competition is not in the list of competitions")
+            comp = competitions["competitions"][competition]
+            schedule = fixtures.generate_fixtures(competition, competitions, index, stadiums, teams)
+            if schedule is None:
+                print("\n" + competition, "skipped, the", comp.mechanics, "mechanics has no defined format yet")
+                continue
+            unrated = [team for team in schedule.ranking if ratings is not None and not team in ratings]
+            if unrated:
+                verify.exit_with_error("  Error found on competition:", competition, "the teams", ", ".join(unrated), "have no rating")
+
+            started = time.perf_counter()
+            titles, promotions, relegations = simulate(schedule, args.simulations, args.seed, pool, jobs, ratings)
+            elapsed = time.perf_counter() - started
+
+            # Promotion and relegation only mean something when the competition links to another one.
+            rows = []
+            for team in schedule.ranking:
+                rows.append({
+                    "team": team,
+                    "title": titles[team] / args.simulations,
+                    "promotion": promotions[team] / args.simulations if comp.promotion else None,
+                    "relegation": relegations[team] / args.simulations if comp.relegation else None,
+                })
+            rows.sort(key=lambda row: (-row["title"], -(row["promotion"] or 0), row["relegation"] or 0))
+            forecast[competition] = rows
+
+            print("\n" + competition, "{count} seasons in {elapsed:.2f}s".format(count=args.simulations, elapsed=elapsed))
+            print("  team   title  promo  releg")
+            for row in rows:
+                print("  {team:<5} {title:6.1%} {promotion:>6} {relegation:>6}".format(
+                    team=row["team"],
+                    title=row["title"],
+                    promotion="-" if row["promotion"] is None else "{value:.1%}".format(value=row["promotion"]),
+                    relegation="-" if row["relegation"] is None else "{value:.1%}".format(value=row["relegation"]),
+                ))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as forecast_file:
+            json.dump(forecast, forecast_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+# Packed dataset snapshot.
+#
+# The file starts with a header (magic, version, section count) followed by a
+# section directory of (name, offset, count) entries. The "strings" section is
+# an offset table of count + 1 u32 followed by the utf-8 blob of every interned
+# string, the "lists" section is a flat u32 array used by the range fields and
+# every other section is a table of fixed size records described by TABLES.
+# Records are sorted by slug inside their parent, so children ranges can be
+# searched by slug without loading anything else.
+
+import argparse
+import mmap
+import os
+import struct
+
+import verify
+
+
+MAGIC = b"FFDS"
+VERSION = 1
+NONE = 0xFFFFFFFF
+SNAPSHOT_FILE = "{build}/dataset.snapshot".format(build=verify.BUILD_DIR)
+
+HEADER = struct.Struct("<4sII")
+SECTION = struct.Struct("<16sII")
+FIELD_FORMATS = {
+    "string": "I",
+    "localized": "I" * len(verify.SUPPORTED_LANGUAGES),
+    "number": "I",
+    "coord": "dd",
+    "ref": "I",
+    "range": "II",
+    "list": "II",
+}
+TABLES = {
+    "world": [("name", "localized"), ("nickname", "localized"), ("confederations", "range", "confederations")],
+    "confederations": [("slug", "string"), ("name", "localized"), ("nickname", "localized"), ("countries", "range", "countries")],
+    "countries": [("slug", "string"), ("name", "localized"), ("confederation", "ref", "confederations"), ("regions", "range", "regions")],
+    "regions": [("slug", "string"), ("name", "localized"), ("country", "ref", "countries"), ("cities", "range", "cities")],
+    "cities": [("slug", "string"), ("name", "localized"), ("region", "ref", "regions"), ("coord", "coord")],
+    "stadiums": [("slug", "string"), ("name", "localized"), ("nickname", "localized"), ("capacity", "number"), ("coord", "coord")],
+    "teams": [("slug", "string"), ("name", "localized"), ("nickname", "localized"), ("acronym", "localized"), ("stadium", "ref", "stadiums"), ("city", "ref", "cities")],
+    "competitions": [("slug", "string"), ("name", "localized"), ("nickname", "localized"), ("mechanics", "string"), ("relegation", "ref", "competitions"), ("promotion", "ref", "competitions"), ("teams", "list", "teams"), ("dates", "list", "string")],
+}
+RECORDS = {table: struct.Struct("<" + "".join(FIELD_FORMATS[field[1]] for field in fields)) for table, fields in TABLES.items()}
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self.strings = {}
+        self.lists = []
+        self.tables = {table: [] for table in TABLES}
+
+    def string(self, value):
+        if value is None:
+            return NONE
+        if not value in self.strings:
+            self.strings[value] = len(self.strings)
+        return self.strings[value]
+
+    def localized(self, value):
+        return [self.string(value.get(language)) for language in verify.SUPPORTED_LANGUAGES]
+
+    def list(self, values):
+        first = len(self.lists)
+        self.lists.extend(values)
+        return [first, len(values)]
+
+    def add(self, table, *values):
+        record = []
+        for value in values:
+            if type(value) is list:
+                record.extend(value)
+            else:
+                record.append(value)
+        self.tables[table].append(record)
+        return len(self.tables[table]) - 1
+
+    def write(self, path):
+        blob = bytearray()
+        offsets = []
+        for value in self.strings:
+            offsets.append(len(blob))
+            blob.extend(value.encode("utf-8"))
+        offsets.append(len(blob))
+
+        sections = [("strings", len(self.strings), struct.pack("<{count}I".format(count=len(offsets)), *offsets) + bytes(blob))]
+        sections.append(("lists", len(self.lists), struct.pack("<{count}I".format(count=len(self.lists)), *self.lists)))
+        for table, records in self.tables.items():
+            sections.append((table, len(records), b"".join(RECORDS[table].pack(*record) for record in records)))
+
+        offset = HEADER.size + SECTION.size * len(sections)
+        directory = []
+        for name, count, data in sections:
+            offset += -offset % 8
+            directory.append((name, offset, count, data))
+            offset += len(data)
+
+        with open(path + ".tmp", "wb") as snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, VERSION, len(directory)))
+            for name, offset, count, data in directory:
+                snapshot_file.write(SECTION.pack(name.encode("ascii"), offset, count))
+            for name, offset, count, data in directory:
+                snapshot_file.write(b"\0" * (offset - snapshot_file.tell()))
+                snapshot_file.write(data)
+        os.replace(path + ".tmp", path)
+
+
+def build_snapshot(locations, stadiums, teams, competitions, index, path):
+    writer = SnapshotWriter()
+    cities = {}
+
+    # Parents are written before their children so every children range is contiguous and sorted by slug.
+    confs = locations.confederations
+    first_confederation = len(writer.tables["confederations"])
+    for conf in sorted(confs):
+        conf_id = writer.add("confederations", writer.string(conf), writer.localized(confs[conf].name), writer.localized(confs[conf].nickname), [0, 0])
+        countries = confs[conf].countries
+        first_country = len(writer.tables["countries"])
+        for country in sorted(countries):
+            country_id = writer.add("countries", writer.string(country), writer.localized(countries[country].name), conf_id, [0, 0])
+            regions = countries[country].regions
+            first_region = len(writer.tables["regions"])
+            for region in sorted(regions):
+                region_id = writer.add("regions", writer.string(region), writer.localized(regions[region].name), country_id, [0, 0])
+                first_city = len(writer.tables["cities"])
+                for city in sorted(regions[region].cities):
+                    value = regions[region].cities[city]
+                    cities[(conf, country, region, city)] = writer.add("cities", writer.string(city), writer.localized(value.name), region_id, value.coord.lat, value.coord.lon)
+                writer.tables["regions"][region_id][-2:] = [first_city, len(regions[region].cities)]
+            writer.tables["countries"][country_id][-2:] = [first_region, len(regions)]
+        writer.tables["confederations"][conf_id][-2:] = [first_country, len(countries)]
+    writer.add("world", writer.localized(locations.name), writer.localized(locations.nickname), [first_confederation, len(confs)])
+
+    stadium_ids = {}
+    for stadium in sorted(stadiums):
+        value = stadiums[stadium]
+        stadium_ids[stadium] = writer.add("stadiums", writer.string(stadium), writer.localized(value.name), writer.localized(value.nickname), value.capacity, value.coord.lat, value.coord.lon)
+
+    team_ids = {team: position for position, team in enumerate(sorted(teams))}
+    for team in sorted(teams):
+        value = teams[team]
+        city = cities[(value.world.continent, value.world.country, value.world.region, value.world.city)]
+        writer.add("teams", writer.string(team), writer.localized(value.name), writer.localized(value.nickname), writer.localized(value.acronym), stadium_ids[value.stadium], city)
+
+    entries = sorted(competition for competition, value in competitions["competitions"].items() if type(value) is verify.Competition)
+    competition_ids = {competition: position for position, competition in enumerate(entries)}
+    for competition in entries:
+        value = competitions["competitions"][competition]
+        members = index.teams[competition] if competition in index.teams else value.teams or []
+        writer.add(
+            "competitions",
+            writer.string(competition),
+            writer.localized(value.name),
+            writer.localized(value.nickname),
+            writer.string(value.mechanics),
+            competition_ids.get(value.relegation, NONE),
+            competition_ids.get(value.promotion, NONE),
+            writer.list([team_ids[team] for team in members]),
+            writer.list([writer.string(date) for date in competitions["dates"][competition]]),
+        )
+
+    writer.write(path)
+    return writer
+
+
+class Table:
+    def __init__(self, snapshot, table, first, count):
+        self.snapshot = snapshot
+        self.table = table
+        self.first = first
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for position in range(self.first, self.first + self.count):
+            yield Entity(self.snapshot, self.table, position)
+
+    def __contains__(self, slug):
+        return self.find(slug) is not None
+
+    def __getitem__(self, slug):
+        entity = self.find(slug)
+        if entity is None:
+            raise KeyError(slug)
+        return entity
+
+    def get(self, slug, default=None):
+        entity = self.find(slug)
+        return default if entity is None else entity
+
+    def keys(self):
+        return [entity.slug for entity in self]
+
+    def find(self, slug):
+        low, high = self.first, self.first + self.count
+        while low < high:
+            middle = (low + high) // 2
+            current = self.snapshot.string(self.snapshot.field(self.table, middle, 0))
+            if current == slug:
+                return Entity(self.snapshot, self.table, middle)
+            if current < slug:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+
+class Entity:
+    __slots__ = ("snapshot", "table", "position")
+
+    def __init__(self, snapshot, table, position):
+        self.snapshot = snapshot
+        self.table = table
+        self.position = position
+
+    def __getattr__(self, name):
+        return self.snapshot.value(self.table, self.position, name)
+
+    def __repr__(self):
+        return "<{table} {position}>".format(table=self.table, position=self.position)
+
+
+class Snapshot:
+    def __init__(self, path=SNAPSHOT_FILE):
+        with open(path, "rb") as snapshot_file:
+            self.data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{path} is not a version {version} snapshot".format(path=path, version=VERSION))
+            self.sections = {}
+            for position in range(count):
+                name, offset, size = SECTION.unpack_from(self.data, HEADER.size + position * SECTION.size)
+                self.sections[name.rstrip(b"\0").decode("ascii")] = (offset, size)
+        except Exception:
+            self.data.close()
+            raise
+        self.columns = {}
+        for table, fields in TABLES.items():
+            column = 0
+            for field in fields:
+                self.columns[(table, field[0])] = (column, field)
+                column += len(FIELD_FORMATS[field[1]])
+        self.world = Entity(self, "world", 0)
+        self.confederations = self.table("confederations")
+        self.stadiums = self.table("stadiums")
+        self.teams = self.table("teams")
+        self.competitions = self.table("competitions")
+
+    def close(self):
+        self.data.close()
+
+    def table(self, table):
+        return Table(self, table, 0, self.sections[table][1])
+
+    def record(self, table, position):
+        return RECORDS[table].unpack_from(self.data, self.sections[table][0] + position * RECORDS[table].size)
+
+    def field(self, table, position, column):
+        return self.record(table, position)[column]
+
+    def string(self, position):
+        if position == NONE:
+            return None
+        offset, count = self.sections["strings"]
+        start, end = struct.unpack_from("<II", self.data, offset + 4 * position)
+        blob = offset + 4 * (count + 1)
+        return self.data[blob + start:blob + end].decode("utf-8")
+
+    def list(self, first, count):
+        offset = self.sections["lists"][0] + 4 * first
+        return struct.unpack_from("<{count}I".format(count=count), self.data, offset)
+
+    def value(self, table, position, name):
+        if not (table, name) in self.columns:
+            raise AttributeError(name)
+        column, field = self.columns[(table, name)]
+        record = self.record(table, position)
+        kind = field[1]
+        if kind == "string":
+            return self.string(record[column])
+        if kind == "localized":
+            values = [self.string(value) for value in record[column:column + len(verify.SUPPORTED_LANGUAGES)]]
+            return {language: value for language, value in zip(verify.SUPPORTED_LANGUAGES, values) if value is not None}
+        if kind == "number":
+            return record[column]
+        if kind == "coord":
+            return verify.Coord(record[column], record[column + 1])
+        if kind == "ref":
+            return None if record[column] == NONE else Entity(self, field[2], record[column])
+        if kind == "range":
+            return Table(self, field[2], record[column], record[column + 1])
+        values = self.list(record[column], record[column + 1])
+        if field[2] == "string":
+            return [self.string(value) for value in values]
+        return [Entity(self, field[2], value) for value in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a packed, memory mappable snapshot of the verified dataset")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("-o", "--output", default=SNAPSHOT_FILE, help="snapshot file to write")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    writer = build_snapshot(locations, stadiums, teams, competitions, index, args.output)
+    print("\nSnapshot:")
+    for table, records in writer.tables.items():
+        print(len(records), table)
+    print(len(writer.strings), "strings")
+    print(os.path.getsize(args.output), "bytes written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
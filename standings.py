@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+from itertools import groupby
+
+import fixtures
+import verify
+
+
+WIN_POINTS = 3
+DRAW_POINTS = 1
+
+
+class Result:
+    def __init__(self, home, away, home_goals, away_goals, home_red=0, away_red=0, home_yellow=0, away_yellow=0):
+        self.home = home
+        self.away = away
+        self.home_goals = home_goals
+        self.away_goals = away_goals
+        self.home_red = home_red
+        self.away_red = away_red
+        self.home_yellow = home_yellow
+        self.away_yellow = away_yellow
+
+
+class Record:
+    def __init__(self, team, ranking):
+        self.team = team
+        self.ranking = ranking
+        self.points = 0
+        self.played = 0
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.goals = 0
+        self.conceded = 0
+        self.red = 0
+        self.yellow = 0
+
+    @property
+    def balance(self):
+        return self.goals - self.conceded
+
+    def add(self, made, conceded, red, yellow, sign=1):
+        self.played += sign
+        self.goals += sign * made
+        self.conceded += sign * conceded
+        self.red += sign * red
+        self.yellow += sign * yellow
+        if made > conceded:
+            self.wins += sign
+            self.points += sign * WIN_POINTS
+        elif made == conceded:
+            self.draws += sign
+            self.points += sign * DRAW_POINTS
+        else:
+            self.losses += sign
+
+    def tiebreak(self):
+        # Everything after direct confrontation: victories, goal balance, goals made,
+        # less red cards, less yellow cards and the lowest ranked.
+        return (-self.wins, -self.balance, -self.goals, self.red, self.yellow, self.ranking)
+
+
+class Standings:
+    # Teams are kept in buckets by points, with a Fenwick tree counting the teams of every
+    # number of points, so a result moves its two teams in O(log points) and a position is
+    # the count of teams above plus the place inside the bucket. Only buckets are ordered by
+    # the tiebreakers, when the table is read. A resolved bucket is reused until a result
+    # touches one of its teams.
+    def __init__(self, teams, ranking=None):
+        self.ranking = list(ranking or teams)
+        positions = {team: position for position, team in enumerate(self.ranking)}
+        self.records = {team: Record(team, positions[team]) for team in teams}
+        self.buckets = {0: set(teams)} if teams else {}
+        self.counts = [0] * 64
+        self.count(0, len(teams))
+        self.meetings = {}
+        self.clusters = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, team):
+        return team in self.records
+
+    def add(self, result):
+        self.apply(result, 1)
+
+    def remove(self, result):
+        self.apply(result, -1)
+
+    def replace(self, old, new):
+        # A live game updates its score by replacing the previous partial result.
+        self.remove(old)
+        self.add(new)
+
+    def count(self, points, teams):
+        index = points + 1
+        while index < len(self.counts):
+            self.counts[index] += teams
+            index += index & -index
+
+    def reserve(self, points):
+        # The tree doubles when a team reaches more points than it holds.
+        if points + 1 < len(self.counts):
+            return
+        size = len(self.counts)
+        while points + 1 >= size:
+            size *= 2
+        self.counts = [0] * size
+        for level, teams in self.buckets.items():
+            self.count(level, len(teams))
+
+    def above(self, points):
+        index = points + 1
+        level_or_below = 0
+        while index:
+            level_or_below += self.counts[index]
+            index -= index & -index
+        return len(self.records) - level_or_below
+
+    def apply(self, result, sign):
+        for team in (result.home, result.away):
+            if not team in self.records:
+                raise ValueError("{team} is not on this table".format(team=team))
+        if result.home == result.away:
+            raise ValueError("{team} can not play against itself".format(team=result.home))
+        sides = ((result.home, result.home_goals, result.away_goals), (result.away, result.away_goals, result.home_goals))
+        meeting = self.meetings.get(frozenset((result.home, result.away)), {})
+        if sign < 0 and any(meeting.get(team, 0) < points_of(made, conceded) or self.records[team].played == 0 for team, made, conceded in sides):
+            raise ValueError("{home} x {away} was never added to this table".format(home=result.home, away=result.away))
+
+        before = {team: self.records[team].points for team in (result.home, result.away)}
+        self.records[result.home].add(result.home_goals, result.away_goals, result.home_red, result.home_yellow, sign)
+        self.records[result.away].add(result.away_goals, result.home_goals, result.away_red, result.away_yellow, sign)
+        for team, points in before.items():
+            self.clusters.pop(points, None)
+            if self.records[team].points == points:
+                continue
+            self.reserve(self.records[team].points)
+            self.buckets[points].discard(team)
+            if not self.buckets[points]:
+                del self.buckets[points]
+            self.buckets.setdefault(self.records[team].points, set()).add(team)
+            self.clusters.pop(self.records[team].points, None)
+            self.count(points, -1)
+            self.count(self.records[team].points, 1)
+
+        meeting = self.meetings.setdefault(frozenset((result.home, result.away)), {result.home: 0, result.away: 0})
+        for team, made, conceded in sides:
+            meeting[team] += sign * points_of(made, conceded)
+
+    def cluster(self, points):
+        if not points in self.clusters:
+            teams = sorted(self.buckets[points], key=lambda team: self.records[team].ranking)
+            self.clusters[points] = tiebreak(teams, self.records, self.meeting) if len(teams) > 1 else teams
+        return self.above(points), self.clusters[points]
+
+    def meeting(self, a, b):
+        return self.meetings.get(frozenset((a, b)))
+
+    def position(self, team):
+        start, teams = self.cluster(self.records[team].points)
+        return start + teams.index(team) + 1
+
+    def table(self):
+        return [self.records[team] for points in sorted(self.buckets, reverse=True) for team in self.cluster(points)[1]]
+
+
+def points_of(made, conceded):
+    return WIN_POINTS if made > conceded else DRAW_POINTS if made == conceded else 0
+
+
+def tiebreak(teams, records, meeting):
+    # Orders teams level on points. Direct confrontation is the mini table of the games
+    # between the tied teams, meeting(a, b) gives the points each one took from the other.
+    # Teams it leaves level are ordered again by the games among themselves alone, and by
+    # the tiebreakers of their records once direct confrontation separates none of them.
+    direct = {team: 0 for team in teams}
+    for i, a in enumerate(teams):
+        for b in teams[i + 1:]:
+            points = meeting(a, b)
+            if points:
+                direct[a] += points[a]
+                direct[b] += points[b]
+    if len(set(direct.values())) == 1:
+        return sorted(teams, key=lambda team: records[team].tiebreak())
+    ordered = []
+    for _, level in groupby(sorted(teams, key=lambda team: -direct[team]), key=lambda team: -direct[team]):
+        level = list(level)
+        ordered.extend(tiebreak(level, records, meeting) if len(level) > 1 else level)
+    return ordered
+
+
+def competition_standings(schedule):
+    return {group: Standings(teams, [team for team in schedule.ranking if team in teams]) for group, teams in schedule.groups.items()}
+
+
+def group_of(standings, team):
+    for group, table in standings.items():
+        if team in table:
+            return group
+    return None
+
+
+def load_results(path):
+    with open(path) as results_file:
+        results = json.load(results_file)
+    return [Result(
+        result["home"],
+        result["away"],
+        result["home_goals"],
+        result["away_goals"],
+        result.get("home_red", 0),
+        result.get("away_red", 0),
+        result.get("home_yellow", 0),
+        result.get("away_yellow", 0),
+    ) for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the tables of a competition from its results, applying the tiebreakers")
+    verify.add_verify_arguments(parser)
+    parser.add_argument("competition", help="competition the results belong to")
+    parser.add_argument("results", help="json list of results with home, away, home_goals, away_goals and optional home_red, away_red, home_yellow, away_yellow")
+    args = parser.parse_args()
+
+    stadiums, locations, teams, competitions, index = verify.verify_with_arguments(args)
+    if not args.competition in index.teams:
+        verify.exit_with_error("  Error found on competition:", args.competition, "the competition is not in the list of competitions")
+    schedule = fixtures.generate_fixtures(args.competition, competitions, index, stadiums, teams)
+    if schedule is None or not schedule.groups:
+        verify.exit_with_error("  Error found on competition:", args.competition, "the competition has no round robin table")
+
+    standings = competition_standings(schedule)
+    try:
+        results = load_results(args.results)
+    except (OSError, ValueError, KeyError) as e:
+        verify.exit_with_error("Error: invalid results file", args.results, e)
+    for number, result in enumerate(results):
+        group = group_of(standings, result.home)
+        if group is None or group != group_of(standings, result.away):
+            verify.exit_with_error("  Error found on result:", number + 1, result.home, "x", result.away, "the teams are not on the same table of", args.competition)
+        try:
+            standings[group].add(result)
+        except ValueError as e:
+            verify.exit_with_error("  Error found on result:", number + 1, e)
+
+    for group, table in standings.items():
+        print("\n" + args.competition + (" group " + group if group else ""))
+        print("  pos team   pts  p  w  d  l  gf  ga  gb")
+        for position, record in enumerate(table.table()):
+            print("  {position:>3} {r.team:<5} {r.points:>4} {r.played:>2} {r.wins:>2} {r.draws:>2} {r.losses:>2} {r.goals:>3} {r.conceded:>3} {r.balance:>3}".format(position=position + 1, r=record))
+
+
+if __name__ == "__main__":
+    main()
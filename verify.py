@@ -1,126 +1,652 @@
 #!/usr/bin/env python3
 
+import argparse
+import atexit
+import contextlib
+import hashlib
+import io
 import json
 import math
 import os
+import pickle
 import re
-from unittest import skip
+import sys
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from entities import City, Competition, Confederations, Coord, Country, Location, Region, Stadium, Team, World
 
 
 NAME_REGEX = re.compile(r"^[a-z][^a-z0-9\-]")
 SUPPORTED_LANGUAGES = ["en", "pt", "es"]
+CACHE_FILE = ".verify_cache"
+BUILD_DIR = "build"
+# getrusage reports the peak resident memory in bytes on macOS and in kilobytes elsewhere.
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+IMAGE_KINDS = ["svg", "png", "jpg", "jpeg", "gif", "webp"]
+ASSET_ROOTS = ["world", "teams", "competitions"]
+
+
+# When collecting, errors are recorded on the report and only abort the entity being checked.
+REPORT = None
+METRICS = None
+CHECKING = None
+STDOUT = []
+ENTITY_KINDS = {"stadium": "stadium", "teams": "team", "competitions": "competition"}
+LOCATION_KINDS = ["world", "confederation", "country", "region", "city"]
+ERROR_PREFIX = re.compile(r"^\s*Error(?: found on [a-z]+)?:?\s*")
+METRIC_COUNTERS = {
+    "files": ("verify_files_opened_total", "counter", "Data files opened"),
+    "bytes": ("verify_bytes_read_total", "counter", "Bytes of data files read"),
+    "read_seconds": ("verify_read_seconds_total", "counter", "Time reading data files"),
+    "parse_seconds": ("verify_json_parse_seconds_total", "counter", "Time parsing data files"),
+    "image_stats": ("verify_image_stats_total", "counter", "Image files stat while indexing the assets"),
+    "cached": ("verify_cache_hits_total", "counter", "Entities taken from the cache without reading them"),
+}
 
 
-def exit_with_error(*error):
+class Problem:
+    def __init__(self, entity, slug, path, field, message):
+        self.entity = entity
+        self.slug = slug
+        self.path = path
+        self.field = field
+        self.message = message
+
+    def to_json(self):
+        return {"entity": self.entity, "slug": self.slug, "path": self.path, "field": self.field, "message": self.message}
+
+
+class Report:
+    def __init__(self, failed=()):
+        self.problems = []
+        # Paths of the entities left out after an error, references to them are not reported again.
+        self.failed = set(failed)
+
+    def to_json(self):
+        return {"count": len(self.problems), "problems": [problem.to_json() for problem in self.problems]}
+
+
+class Metrics:
+    def __init__(self):
+        self.phases = {}
+        self.entities = {}
+
+    def phase(self, phase, seconds):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT if resource is not None else None
+        self.phases[phase] = {"seconds": seconds, "peak_memory_bytes": peak}
+
+    def count(self, kind, **values):
+        counters = self.entities.setdefault(kind, dict.fromkeys(METRIC_COUNTERS, 0))
+        for key, value in values.items():
+            counters[key] += value
+
+    def merge(self, other):
+        for kind, counters in other.entities.items():
+            self.count(kind, **counters)
+
+    def to_json(self):
+        return {"phases": self.phases, "entities": self.entities}
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP verify_phase_seconds Wall time of each verify phase",
+            "# TYPE verify_phase_seconds gauge",
+        ]
+        lines.extend('verify_phase_seconds{{phase="{phase}"}} {value}'.format(phase=phase, value=values["seconds"]) for phase, values in self.phases.items())
+        lines.extend([
+            "# HELP verify_phase_peak_memory_bytes Peak resident memory of the process at the end of each phase",
+            "# TYPE verify_phase_peak_memory_bytes gauge",
+        ])
+        lines.extend('verify_phase_peak_memory_bytes{{phase="{phase}"}} {value}'.format(phase=phase, value=values["peak_memory_bytes"]) for phase, values in self.phases.items() if values["peak_memory_bytes"] is not None)
+        for counter, (name, kind, description) in METRIC_COUNTERS.items():
+            lines.append("# HELP {name} {description} per entity type".format(name=name, description=description))
+            lines.append("# TYPE {name} {kind}".format(name=name, kind=kind))
+            lines.extend('{name}{{entity="{entity}"}} {value}'.format(name=name, entity=entity, value=counters[counter]) for entity, counters in sorted(self.entities.items()))
+        return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def measuring(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if METRICS is not None:
+            METRICS.phase(phase, time.perf_counter() - started)
+
+
+def entity_kind(path):
+    parts = path.split("/") if path else []
+    if parts and parts[0] == "world":
+        return LOCATION_KINDS[len(parts) - 1]
+    if len(parts) == 1:
+        return parts[0]
+    if parts:
+        return ENTITY_KINDS.get(parts[0], parts[0])
+    return None
+
+
+def load_json(json_file):
+    if METRICS is None:
+        return json.load(json_file)
+    # Reading and parsing are timed apart to tell a slow filesystem from slow parsing.
+    started = time.perf_counter()
+    text = json_file.read()
+    read = time.perf_counter()
+    data = json.loads(text)
+    METRICS.count(entity_kind(os.path.dirname(json_file.name)), files=1, bytes=os.fstat(json_file.fileno()).st_size, read_seconds=read - started, parse_seconds=time.perf_counter() - read)
+    return data
+
+
+def problem_of(error, path, field=None, problem_path=None):
+    parts = path.split("/") if path else []
+    entity = entity_kind(path)
+    slug = parts[-1] if len(parts) > 1 else None
+
+    words = [str(word) for word in error]
+    if slug is not None and len(words) > 1 and words[0].rstrip().endswith(":") and words[1] == slug:
+        words = words[2:]
+    message = ERROR_PREFIX.sub("", " ".join(words))
+    return Problem(entity, slug, problem_path or path and path + "/data.json", field, message)
+
+
+def record_error(*error, field=None, path=None):
     print(*error)
-    exit(1)
-
-
-def verify_name(name):
-    return len(name) > 0 and not NAME_REGEX.search(name)
+    if REPORT is not None:
+        REPORT.problems.append(problem_of(error, CHECKING, field, path))
 
 
-def verify_image(image, path):
-    for kind in ["svg", "png", "jpg", "jpeg", "gif", "webp"]:
-        if os.path.isfile("{path}/{image}.{kind}".format(path=path, image=image, kind=kind)):
-            return True
-    return False
-
-
-class Coord:
-    def __init__(self, lat, lon):
-        self.lat = lat
-        self.lon = lon
-
-
-class City:
-    def __init__(self, name, coord):
-        self.name = name
-        self.coord = coord
-
-
-class Stadium:
-    def __init__(self, name, nickname, capacity, coord):
-        self.name = name
-        self.nickname = nickname
-        self.capacity = capacity
-        self.coord = coord
-
-
-class Region:
-    def __init__(self, name, cities):
-        self.name = name
-        self.cities = cities
+def exit_with_error(*error, field=None, path=None):
+    record_error(*error, field=field, path=path)
+    exit(1)
 
 
-class Country:
-    def __init__(self, name, regions):
-        self.name = name
-        self.regions = regions
+def continue_with_error(*error, field=None, path=None):
+    # For problems that leave the entity usable: when collecting, keep checking it.
+    record_error(*error, field=field, path=path)
+    if REPORT is None:
+        exit(1)
+
+
+class FieldError(Exception):
+    pass
 
 
-class Confederations:
-    def __init__(self, name, nickname, countries):
-        self.name = name
-        self.nickname = nickname
-        self.countries = countries
+def field_error(field, *error, path=None):
+    # When collecting, a field error only ends its field: the entity fails after the others are checked.
+    record_error(*error, field=field, path=path)
+    if REPORT is None:
+        exit(1)
+    raise FieldError()
+
+
+def field_warning(field, *error):
+    continue_with_error(*error, field=field)
+
+
+def failed(path):
+    return REPORT is not None and path in REPORT.failed
+
+
+def reference_error(field, path, *error):
+    # A reference to an entity that failed its own checks drops the field without a second report.
+    if not failed(path):
+        field_error(field, *error)
+    raise FieldError()
+
+
+@contextlib.contextmanager
+def checking(path):
+    global CHECKING
+    previous, CHECKING = CHECKING, path
+    try:
+        yield
+    except SystemExit:
+        if REPORT is None:
+            raise
+        if path is not None:
+            REPORT.failed.add(path)
+    finally:
+        CHECKING = previous
+
+
+def check_entity(check, path, item):
+    with checking(path):
+        return check(item)
+
+
+def run_check(failures, measure, check, *args):
+    global REPORT, METRICS
+    collect = failures is not None
+    REPORT = Report(failures) if collect else None
+    METRICS = Metrics() if measure else None
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            return check(*args), output.getvalue(), None, REPORT.problems if collect else [], METRICS
+        except SystemExit as e:
+            return None, output.getvalue(), e.code, [], None
+
+
+def map_checks(pool, check, items, paths):
+    if pool is None:
+        return [check_entity(check, path, item) for path, item in zip(paths, items)]
+    results = []
+    failures = frozenset(REPORT.failed) if REPORT is not None else None
+    for path, (result, output, code, problems, metrics) in zip(paths, pool.map(partial(run_check, failures, METRICS is not None, check_entity, check), paths, items, chunksize=8)):
+        print(output, end="")
+        if code is not None:
+            pool.shutdown(cancel_futures=True)
+            exit(code)
+        if REPORT is not None:
+            REPORT.problems.extend(problems)
+            if result is None:
+                REPORT.failed.add(path)
+        if metrics is not None:
+            METRICS.merge(metrics)
+        results.append(result)
+    return results
+
+
+def entity_stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns, os.stat(path + "/data.json").st_mtime_ns, os.stat(path + "/data.json").st_size
+    except OSError:
+        return None
+
+
+def pack_entity(value):
+    if hasattr(type(value), "__slots__"):
+        return type(value).__name__, tuple(pack_entity(getattr(value, key)) for key in type(value).__slots__)
+    return value
+
+
+def unpack_entity(value):
+    if type(value) is tuple:
+        entity = globals()[value[0]].__new__(globals()[value[0]])
+        for key, item in zip(entity.__slots__, value[1]):
+            setattr(entity, key, unpack_entity(item))
+        return entity
+    return value
+
+
+class Cache:
+    def __init__(self, path):
+        self.path = path
+        # The entities module is part of the version, the cache stores its slots.
+        version = hashlib.sha1()
+        for module in [__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "entities.py")]:
+            with open(module, "rb") as source:
+                version.update(source.read())
+        self.version = version.hexdigest()
+        self.entries = {}
+        self.stamps = {}
+        self.visited = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "rb") as cache_file:
+                    version, entries = pickle.load(cache_file)
+                if version == self.version:
+                    self.entries = entries
+            except Exception:
+                print("Ignoring unreadable cache", path)
+
+    def lookup(self, key, stamp):
+        self.stamps[key] = stamp
+        entry = self.entries.get(key)
+        if stamp is None or entry is None or entry[0] != stamp:
+            return None
+        for dependency, dependency_stamp in entry[1].items():
+            if self.stamps.get(dependency) != dependency_stamp:
+                return None
+        self.visited[key] = entry
+        return unpack_entity(entry[2])
+
+    def store(self, key, value, dependencies):
+        self.visited[key] = (self.stamps[key], {dependency: self.stamps.get(dependency) for dependency in dependencies}, pack_entity(value))
+
+    def save(self):
+        entries = {key: entry for key, entry in self.entries.items() if key not in self.visited and os.path.isdir(key)}
+        entries.update(self.visited)
+        with open(self.path + ".tmp", "wb") as cache_file:
+            pickle.dump((self.version, entries), cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def map_cached_checks(pool, cache, check, items, paths, dependencies=lambda value: []):
+    if cache is None:
+        return map_checks(pool, check, items, paths)
+    results = [None] * len(items)
+    missing = []
+    for index, path in enumerate(paths):
+        result = cache.lookup(path, entity_stamp(path))
+        if result is None:
+            missing.append(index)
+        else:
+            results[index] = result
+            if METRICS is not None:
+                METRICS.count(entity_kind(path), cached=1)
+    for index, result in zip(missing, map_checks(pool, check, [items[index] for index in missing], [paths[index] for index in missing])):
+        if result is not None:
+            cache.store(paths[index], result, dependencies(result))
+        results[index] = result
+    return results
 
 
-class World:
-    def __init__(self, name, nickname, confederations):
-        self.name = name
-        self.nickname = nickname
-        self.confederations = confederations
+def checked(keys, values):
+    return {key: value for key, value in zip(keys, values) if value is not None}
 
 
-class Location:
-    def __init__(self, continent, country, region, city):
-        self.continent = continent
-        self.country = country
-        self.region = region
-        self.city = city
+def verify_name(name):
+    return len(name) > 0 and not NAME_REGEX.search(name)
 
 
-class Team:
-    def __init__(self, name, nickname, acronym, stadium, world):
-        self.name = name
-        self.nickname = nickname
-        self.acronym = acronym
-        self.stadium = stadium
-        self.world = world
+class Asset:
+    def __init__(self, path, kind, size):
+        self.path = path
+        self.kind = kind
+        self.size = size
+
+
+@lru_cache(maxsize=None)
+def index_assets(root):
+    assets = {}
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.path)
+                    continue
+                image, _, kind = entry.name.rpartition(".")
+                if not kind in IMAGE_KINDS:
+                    continue
+                key = "{directory}/{image}".format(directory=directory, image=image)
+                if METRICS is not None:
+                    METRICS.count(entity_kind(directory), image_stats=1)
+                if key in assets and IMAGE_KINDS.index(assets[key].kind) < IMAGE_KINDS.index(kind):
+                    continue
+                assets[key] = Asset(entry.path, kind, entry.stat().st_size)
+    return assets
+
+
+def find_image(image, path):
+    return index_assets(path.split("/")[0]).get("{path}/{image}".format(path=path, image=image))
 
 
-class Competition:
-    def __init__(self, name, nickname, mechanics, relegation, promotion, teams, teams_source):
-        self.name = name
-        self.nickname = nickname
-        self.mechanics = mechanics
-        self.relegation = relegation
-        self.promotion = promotion
-        self.teams = teams
-        self.teams_source = teams_source
+def verify_image(image, path):
+    return find_image(image, path) is not None
 
 
 class Mechanics:
-    def __init__(self, teams, dates):
+    def __init__(self, teams, dates, groups=1):
         self.teams = teams
         self.dates = dates
+        self.groups = groups
 
 
 SUPPORTED_MECHANICS = {
     "regional-a": Mechanics(16, 18),
-    "regional-b": Mechanics(36, 18),
+    "regional-b": Mechanics(36, 18, 2),
     "regional-c": Mechanics(110, 7),
     "regional-d": Mechanics(12, 11),
-    "regional-e": Mechanics(16, 11),
+    "regional-e": Mechanics(16, 11, 2),
     "regional-f": Mechanics(10, 11),
     "national-a": Mechanics(20, 38),
-    "national-b": Mechanics(36, 38),
-    "national-c": Mechanics(72, 38),
+    "national-b": Mechanics(36, 38, 2),
+    "national-c": Mechanics(72, 38, 4),
     "national-d": Mechanics(129, 38)
 }
 
 
+class Field:
+    def __init__(self, key, rule, label=None, **options):
+        self.key = key
+        self.rule = rule
+        self.label = label or key
+        self.options = options
+
+
+class Schema:
+    def __init__(self, prefix, fields, slug=True):
+        self.prefix = prefix
+        self.fields = fields
+        self.slug = slug
+
+
+# One schema per entity type. compile_schema turns each into a validator
+# specialized for its fields, returning the field values in order.
+SCHEMAS = {
+    "stadium": Schema("  Error found on stadium:", [
+        Field("name", "localized"),
+        Field("nickname", "localized"),
+        Field("capacity", "positive_integer"),
+        Field("coord", "coordinate", "coords"),
+    ]),
+    "city": Schema("  Error found on city:", [
+        Field("name", "localized"),
+        Field("coord", "coordinate", "coords"),
+    ]),
+    "region": Schema("  Error found on region:", [
+        Field("name", "localized"),
+    ]),
+    "country": Schema("  Error found on country:", [
+        Field("name", "localized"),
+    ]),
+    "confederation": Schema("  Error found on confederation:", [
+        Field("name", "localized"),
+        Field("nickname", "localized"),
+    ]),
+    "world": Schema("  Error found on world", [
+        Field("name", "localized"),
+        Field("nickname", "localized"),
+    ], slug=False),
+    "team": Schema("  Error found on team:", [
+        Field("name", "localized"),
+        Field("nickname", "localized"),
+        Field("acronym", "localized", caps=True),
+        Field("stadium", "reference", source="stadiums", root="stadium", message="is missing on stadium list", empty=True),
+        Field("world", "location", source="locations"),
+    ]),
+    "competition": Schema("  Error found on competition:", [
+        Field("name", "localized"),
+        Field("nickname", "localized"),
+        Field("mechanics", "choice", choices="SUPPORTED_MECHANICS"),
+        Field("relegation", "reference", source="competitions", root="competitions", message="is not in the list of competitions", optional=True),
+        Field("promotion", "reference", source="competitions", root="competitions", message="is not in the list of competitions", optional=True),
+        Field("teams", "roster", "team", source="teams", root="teams", message="is not in the list of teams", unless="teams_source"),
+        Field("teams_source", "optional"),
+    ]),
+}
+
+
+def compile_localized(field):
+    code = textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {label} is missing")
+        {var} = data["{key}"]
+        if len({var}) == 0:
+            {error}"the {label} is empty")
+        for language, localized in {var}.items():
+            if language not in SUPPORTED_LANGUAGES:
+                {error}"unknown language:", language, "on {label}")
+            if len(localized) == 0:
+                {error}"the {label} is empty", localized)
+    """)
+    if field.options.get("caps"):
+        # The caps check belongs inside the language loop.
+        code += textwrap.indent(textwrap.dedent("""
+            if localized.upper() != localized:
+                {error}"the {label} is not all caps", localized)
+        """), "    ")
+    return code
+
+
+def compile_positive_integer(field):
+    return textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {label} is missing")
+        {var} = data["{key}"]
+        if type({var}) is not int or {var} <= 0:
+            {error}"the {label} is invalid")
+    """)
+
+
+def compile_coordinate(field):
+    return textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {label} is missing")
+        parts_failed = 0
+        for part in ["lat", "lon"]:
+            try:
+                if not part in data["{key}"]:
+                    {fail}part, {arguments}"the", part, "is missing")
+                value = data["{key}"][part]
+                if type(value) is not float or math.isnan(value) or value < -90 or value > 90 or value == 0.0:
+                    {fail}part, {arguments}"the", part, "is invalid")
+            except FieldError:
+                parts_failed += 1
+        if parts_failed:
+            raise FieldError()
+        {var} = Coord(data["{key}"]["lat"], data["{key}"]["lon"])
+    """)
+
+
+def compile_reference(field):
+    if field.options.get("optional"):
+        return textwrap.dedent("""
+            {var} = None
+            if "{key}" in data:
+                {var} = data["{key}"]
+                if not {var} in {source}:
+                    {reject}"{root}/" + {var}, {arguments}"the {label}", {var}, "{message}")
+        """)
+    code = textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {label} is missing")
+        {var} = data["{key}"]
+    """)
+    if field.options.get("empty"):
+        code += textwrap.dedent("""
+            if len({var}) == 0:
+                {error}"the {label} is empty")
+        """)
+    return code + textwrap.dedent("""
+        if not {var} in {source}:
+            {reject}"{root}/" + {var}, {arguments}"the {label}", {var}, "{message}")
+    """)
+
+
+def compile_location(field):
+    return textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {label} is missing")
+        for part in ["continent", "country", "region", "city"]:
+            if not part in data["{key}"]:
+                {error}"the", part, "is missing")
+        continent, country, region, city = (data["{key}"][part] for part in ["continent", "country", "region", "city"])
+        if not continent in {source}.confederations:
+            {reject}"/".join(["world", continent]), {arguments}"the continent", continent, "is missing on locations list")
+        if not country in {source}.confederations[continent].countries:
+            {reject}"/".join(["world", continent, country]), {arguments}"the country", country, "is missing on locations list")
+        if not region in {source}.confederations[continent].countries[country].regions:
+            {reject}"/".join(["world", continent, country, region]), {arguments}"the region", region, "is missing on locations list")
+        if not city in {source}.confederations[continent].countries[country].regions[region].cities:
+            {reject}"/".join(["world", continent, country, region, city]), {arguments}"the city", city, "is missing on locations list")
+        {var} = Location(continent, country, region, city)
+    """)
+
+
+def compile_choice(field):
+    return textwrap.dedent("""
+        if not "{key}" in data:
+            {error}"the {key} is missing")
+        {var} = data["{key}"]
+        if len({var}) == 0:
+            {error}"the {key} is empty")
+        if not {var} in {choices}:
+            {error}"the {key} is invalid")
+    """)
+
+
+def compile_roster(field):
+    # A roster copied from other competitions has no teams of its own.
+    return textwrap.dedent("""
+        if data.get("{unless}") != None:
+            {var} = []
+        else:
+            if not "{key}" in data:
+                {error}"the {key} is missing")
+            {var} = data["{key}"]
+            for item in {var}:
+                if not item in {source} and not failed("{root}/" + item):
+                    {warning}"the {label}", item, "{message}")
+    """)
+
+
+def compile_optional(field):
+    return textwrap.dedent("""
+        {var} = data["{key}"] if "{key}" in data else None
+    """)
+
+
+RULES = {
+    "localized": compile_localized,
+    "positive_integer": compile_positive_integer,
+    "coordinate": compile_coordinate,
+    "reference": compile_reference,
+    "location": compile_location,
+    "choice": compile_choice,
+    "roster": compile_roster,
+    "optional": compile_optional,
+}
+
+
+def compile_schema(kind, schema):
+    # Every field is checked on its own: when collecting, the errors of all fields are
+    # reported before the entity fails.
+    arguments = "{prefix!r}, slug, ".format(prefix=schema.prefix) if schema.slug else "{prefix!r}, ".format(prefix=schema.prefix)
+    sources = []
+    body = ["    fields_failed = 0"]
+    for field in schema.fields:
+        if "source" in field.options and not field.options["source"] in sources:
+            sources.append(field.options["source"])
+        code = RULES[field.rule](field).format(
+            key=field.key,
+            label=field.label,
+            var="value_" + field.key,
+            arguments=arguments,
+            error="field_error({key!r}, ".format(key=field.key) + arguments,
+            warning="field_warning({key!r}, ".format(key=field.key) + arguments,
+            fail="field_error(",
+            reject="reference_error({key!r}, ".format(key=field.key),
+            **field.options
+        )
+        body.append("    try:")
+        body.extend("        " + line for line in code.split("\n") if line.strip())
+        body.append("    except FieldError:")
+        body.append("        fields_failed += 1")
+    body.append("    if fields_failed:")
+    body.append("        exit(1)")
+    body.append("    return " + "".join("value_{key}, ".format(key=field.key) for field in schema.fields))
+    source = "def validate_{kind}(slug, data{sources}):\n".format(kind=kind, sources="".join(", " + name for name in sources)) + "\n".join(body)
+    namespace = {}
+    exec(compile(source, "<schema {kind}>".format(kind=kind), "exec"), globals(), namespace)
+    return namespace["validate_" + kind]
+
+
+VALIDATORS = {kind: compile_schema(kind, schema) for kind, schema in SCHEMAS.items()}
+
+
 def skip_competition(competition):
     if competition == "vacation":
         return True
@@ -130,510 +656,544 @@ def skip_competition(competition):
     return False
 
 
-def check_stadiums():
+def check_stadium(stadium):
+    if not verify_name(stadium):
+        exit_with_error("  Error found on stadium:", stadium, "the name is invalid", field="slug")
+    json_file = "stadium/{name}/data.json".format(name=stadium)
+    if (os.path.isfile(json_file)):
+        with open(json_file) as json_file:
+            try:
+                data = load_json(json_file)
+                return Stadium(*VALIDATORS["stadium"](stadium, data))
+            except Exception as e:
+                exit_with_error("  Error found on stadium:", stadium, "error parsing json data", e)
+    else:
+        exit_with_error("  Error found on stadium:", stadium, "the data.json file is missing")
+
+
+def check_stadiums(pool=None, cache=None):
     print("Checking stadiums:")
-    stadiums = {}
-    for stadium in os.listdir("stadium"):
-        if not verify_name(stadium):
-            exit_with_error("  Error found on stadium:", stadium, "the name is invalid")
-        json_file = "stadium/{name}/data.json".format(name=stadium)
-        if (os.path.isfile(json_file)):
-            with open(json_file) as json_file:
-                try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on stadium:", stadium, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on stadium:", stadium, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on stadium:", stadium, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on stadium:", stadium, "the name is empty", localizedName)
-
-                    nickname = data["nickname"] if "nickname" in data else exit_with_error("  Error found on stadium:", stadium, "the nickname is missing")
-                    if (len(nickname) == 0):
-                        exit_with_error("  Error found on stadium:", stadium, "the nickname is empty")
-                    for language, localizedNickname in nickname.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on stadium:", stadium, "unknown language:", language, "on nickname")
-                        if len(localizedNickname) == 0:
-                            exit_with_error("  Error found on stadium:", stadium, "the nickname is empty", localizedNickname)
-
-                    capacity = data["capacity"] if "capacity" in data else exit_with_error("  Error found on stadium:", stadium, "the capacity is missing")
-                    if type(capacity) is not int or capacity <= 0:
-                        exit_with_error("  Error found on stadium:", stadium, "the capacity is invalid")
-
-                    coord = data["coord"] if "coord" in data else exit_with_error("  Error found on stadium:", stadium, "the coords is missing")
-                    lat = coord["lat"] if "lat" in coord else exit_with_error("  Error found on stadium:", stadium, "the lat is missing")
-                    lon = coord["lon"] if "lon" in coord else exit_with_error("  Error found on stadium:", stadium, "the lon is missing")
-                    if type(lat) is not float or math.isnan(lat) or lat < -90 or lat > 90 or lat == 0.0:
-                        exit_with_error("  Error found on stadium:", stadium, "the lat is invalid")
-                    if type(lon) is not float or math.isnan(lon) or lon < -90 or lon > 90 or lon == 0.0:
-                        exit_with_error("  Error found on stadium:", stadium, "the lon is invalid")
-
-                    stadiums[stadium] = Stadium(name, nickname, capacity, Coord(lat, lon))
-                except Exception as e:
-                    exit_with_error("  Error found on stadium:", stadium, "error parsing json data", e)
-        else:
-            exit_with_error("  Error found on stadium:", stadium, "the data.json file is missing")
-    return stadiums
+    stadiums = os.listdir("stadium")
+    paths = ["stadium/{name}".format(name=stadium) for stadium in stadiums]
+    return checked(stadiums, map_cached_checks(pool, cache, check_stadium, stadiums, paths))
 
 
-def check_locations_cities(confederation, country, region, cities):
-    print("Checking locations: cities for region:", region, "in country:", country, "in confederation:", confederation)
-    result = {}
-    base_path = "world/{confederation}/{country}/{region}".format(confederation=confederation, country=country, region=region)
-    for city in os.listdir(base_path):
-        if not os.path.isdir(os.path.join(base_path, city)):
-            continue
-        if not city in cities:
-            exit_with_error("  Error found on city:", city, "the city is not in the list of cities")
-        if not verify_image("flag", "{base_path}/{city}".format(base_path=base_path, city=city)):
-            exit_with_error("Error: the city", city, "flag image is missing")
+def check_city(base_path, cities, city):
+    if not city in cities:
+        exit_with_error("  Error found on city:", city, "the city is not in the list of cities")
+    if not verify_image("flag", "{base_path}/{city}".format(base_path=base_path, city=city)):
+        exit_with_error("Error: the city", city, "flag image is missing", field="flag", path="{base_path}/{city}/flag".format(base_path=base_path, city=city))
 
-        json_file = "{base_path}/{city}/data.json".format(base_path=base_path, city=city)
-        if (os.path.isfile(json_file)):
-            with open(json_file) as json_file:
-                try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on city:", city, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on city:", city, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on city:", city, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on city:", city, "the name is empty", localizedName)
-
-                    coord = data["coord"] if "coord" in data else exit_with_error("  Error found on city:", city, "the coords is missing")
-                    lat = coord["lat"] if "lat" in coord else exit_with_error("  Error found on city:", city, "the lat is missing")
-                    lon = coord["lon"] if "lon" in coord else exit_with_error("  Error found on city:", city, "the lon is missing")
-                    if type(lat) is not float or math.isnan(lat) or lat < -90 or lat > 90 or lat == 0.0:
-                        exit_with_error("  Error found on city:", city, "the lat is invalid")
-                    if type(lon) is not float or math.isnan(lon) or lon < -90 or lon > 90 or lon == 0.0:
-                        exit_with_error("  Error found on city:", city, "the lon is invalid")
-
-                    result[city] = City(name, Coord(lat, lon))
-                except Exception as e:
-                    exit_with_error("  Error found on city:", city, "error parsing json data", e)
-        else:
-            exit_with_error("  Error found on city:", city, "the data.json file is missing")
+    json_file = "{base_path}/{city}/data.json".format(base_path=base_path, city=city)
+    if (os.path.isfile(json_file)):
+        with open(json_file) as json_file:
+            try:
+                data = load_json(json_file)
+                return City(*VALIDATORS["city"](city, data))
+            except Exception as e:
+                exit_with_error("  Error found on city:", city, "error parsing json data", e)
+    else:
+        exit_with_error("  Error found on city:", city, "the data.json file is missing")
 
-    return result
 
+def check_locations_cities(confederation, country, region, cities, pool=None, cache=None):
+    print("Checking locations: cities for region:", region, "in country:", country, "in confederation:", confederation)
+    base_path = "world/{confederation}/{country}/{region}".format(confederation=confederation, country=country, region=region)
+    found = [city for city in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, city))]
+    paths = ["{base_path}/{city}".format(base_path=base_path, city=city) for city in found]
+    return checked(found, map_cached_checks(pool, cache, partial(check_city, base_path, cities), found, paths))
 
-def check_locations_regions(confederation, country, regions):
+
+def check_locations_regions(confederation, country, regions, pool=None, cache=None):
     print("Checking locations: regions for country:", country, "in confederation:", confederation)
     result = {}
     base_path = "world/{confederation}/{country}".format(confederation=confederation, country=country)
     for region in os.listdir(base_path):
         if not os.path.isdir(os.path.join(base_path, region)):
             continue
-        if not region in regions:
-            exit_with_error("  Error found on region:", region, "the region is not in the list of regions")
-        if not verify_image("flag", "{base_path}/{region}".format(base_path=base_path, region=region)):
-            exit_with_error("Error: the region flag image is missing")
-
-        json_file = "{base_path}/{region}/data.json".format(base_path=base_path, region=region)
-        if (os.path.isfile(json_file)):
-            with open(json_file) as json_file:
-                try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on region:", region, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on region:", region, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on region:", region, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on region:", region, "the name is empty", localizedName)
-
-                    cities = os.listdir("{base_path}/{region}".format(base_path=base_path, region=region))
-
-                    result[region] = Region(name, check_locations_cities(confederation, country, region, cities))
-                except Exception as e:
-                    exit_with_error("  Error found on region:", region, "error parsing json data", e)
-        else:
-            exit_with_error("  Error found on region:", region, "the data.json file is missing")
+        with checking("{base_path}/{region}".format(base_path=base_path, region=region)):
+            if not region in regions:
+                exit_with_error("  Error found on region:", region, "the region is not in the list of regions")
+            if not verify_image("flag", "{base_path}/{region}".format(base_path=base_path, region=region)):
+                exit_with_error("Error: the region flag image is missing", field="flag", path="{base_path}/{region}/flag".format(base_path=base_path, region=region))
+
+            json_file = "{base_path}/{region}/data.json".format(base_path=base_path, region=region)
+            if (os.path.isfile(json_file)):
+                with open(json_file) as json_file:
+                    try:
+                        data = load_json(json_file)
+                        name, = VALIDATORS["region"](region, data)
+
+                        cities = os.listdir("{base_path}/{region}".format(base_path=base_path, region=region))
+
+                        result[region] = Region(name, check_locations_cities(confederation, country, region, cities, pool, cache))
+                    except Exception as e:
+                        exit_with_error("  Error found on region:", region, "error parsing json data", e)
+            else:
+                exit_with_error("  Error found on region:", region, "the data.json file is missing")
 
     return result
 
 
-def check_locations_countries(confederation, countries):
+def check_locations_countries(confederation, countries, pool=None, cache=None):
     print("Checking locations: countries for confederation:", confederation)
     result = {}
     base_path = "world/{confederation}".format(confederation=confederation)
     for country in os.listdir(base_path):
         if not os.path.isdir(os.path.join(base_path, country)):
             continue
-        if not country in countries:
-            exit_with_error("  Error found on country:", country, "the country is not in the list of countries")
-        if not verify_image("flag", "{base_path}/{country}".format(base_path=base_path, country=country)):
-            exit_with_error("Error: the country flag image is missing")
-
-        json_file = "{base_path}/{country}/data.json".format(base_path=base_path, country=country)
-        if (os.path.isfile(json_file)):
-            with open(json_file) as json_file:
-                try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on country:", country, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on country:", country, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on country:", country, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on country:", country, "the name is empty", localizedName)
-
-                    regions = os.listdir("{base_path}/{country}".format(base_path=base_path, country=country))
-
-                    result[country] = Country(name, check_locations_regions(confederation, country, regions))
-                except Exception as e:
-                    exit_with_error("  Error found on country:", country, "error parsing json data", e)
-        else:
-            exit_with_error("  Error found on country:", country, "the data.json file is missing")
+        with checking("{base_path}/{country}".format(base_path=base_path, country=country)):
+            if not country in countries:
+                exit_with_error("  Error found on country:", country, "the country is not in the list of countries")
+            if not verify_image("flag", "{base_path}/{country}".format(base_path=base_path, country=country)):
+                exit_with_error("Error: the country flag image is missing", field="flag", path="{base_path}/{country}/flag".format(base_path=base_path, country=country))
+
+            json_file = "{base_path}/{country}/data.json".format(base_path=base_path, country=country)
+            if (os.path.isfile(json_file)):
+                with open(json_file) as json_file:
+                    try:
+                        data = load_json(json_file)
+                        name, = VALIDATORS["country"](country, data)
+
+                        regions = os.listdir("{base_path}/{country}".format(base_path=base_path, country=country))
+
+                        result[country] = Country(name, check_locations_regions(confederation, country, regions, pool, cache))
+                    except Exception as e:
+                        exit_with_error("  Error found on country:", country, "error parsing json data", e)
+            else:
+                exit_with_error("  Error found on country:", country, "the data.json file is missing")
 
     return result
 
 
-def check_locations_confederations(confederations):
+def check_locations_confederations(confederations, pool=None, cache=None):
     print("Checking locations: confederations")
     result = {}
     for conf in os.listdir("world"):
         if not os.path.isdir(os.path.join("world", conf)):
             continue
-        if not conf in confederations:
-            exit_with_error("  Error found on confederation:", conf, "the confederation is not in the list of confederations")
-        if not verify_image("logo", "world/{conf}".format(conf=conf)):
-            exit_with_error("Error: the conf logo image is missing")
+        with checking("world/{conf}".format(conf=conf)):
+            if not conf in confederations:
+                exit_with_error("  Error found on confederation:", conf, "the confederation is not in the list of confederations")
+            if not verify_image("logo", "world/{conf}".format(conf=conf)):
+                exit_with_error("Error: the conf logo image is missing", field="logo", path="world/{conf}/logo".format(conf=conf))
+
+            json_file = "world/{conf}/data.json".format(conf=conf)
+            if (os.path.isfile(json_file)):
+                with open(json_file) as json_file:
+                    try:
+                        data = load_json(json_file)
+                        name, nickname = VALIDATORS["confederation"](conf, data)
+
+                        countries = os.listdir("world/{conf}".format(conf=conf))
+
+                        result[conf] = Confederations(name, nickname, check_locations_countries(conf, countries, pool, cache))
+                    except Exception as e:
+                        exit_with_error("  Error found on confederation:", conf, "error parsing json data", e)
+            else:
+                exit_with_error("  Error found on confederation:", conf, "the data.json file is missing")
+
+    return result
 
-        json_file = "world/{conf}/data.json".format(conf=conf)
+
+def check_locations(pool=None, cache=None):
+    print("Checking locations")
+    with checking("world"):
+        if not verify_image("logo", "world"):
+            exit_with_error("Error: the world logo image is missing", field="logo", path="world/logo")
+
+        json_file = "world/data.json"
         if (os.path.isfile(json_file)):
             with open(json_file) as json_file:
                 try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on confedetaion:", conf, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on confedetaion:", conf, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on confedetaion:", conf, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on confedetaion:", conf, "the name is empty", localizedName)
-
-                    nickname = data["nickname"] if "nickname" in data else exit_with_error("  Error found on confedetaion:", conf, "the nickname is missing")
-                    if (len(nickname) == 0):
-                        exit_with_error("  Error found on confedetaion:", conf, "the nickname is empty")
-                    for language, localizedNickname in nickname.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on confedetaion:", conf, "unknown language:", language, "on nickname")
-                        if len(localizedNickname) == 0:
-                            exit_with_error("  Error found on confedetaion:", conf, "the nickname is empty", localizedNickname)
-                    
-                    countries = os.listdir("world/{conf}".format(conf=conf))
-
-                    result[conf] = Confederations(name, nickname, check_locations_countries(conf, countries))
+                    data = load_json(json_file)
+                    name, nickname = VALIDATORS["world"](None, data)
+
+                    confederations = os.listdir("world")
+
+                    return World(name, nickname, check_locations_confederations(confederations, pool, cache))
                 except Exception as e:
-                    exit_with_error("  Error found on confedetaion:", conf, "error parsing json data", e)
+                    exit_with_error("  Error found on world: error parsing json data", e)
         else:
-            exit_with_error("  Error found on confedetaion:", conf, "the data.json file is missing")
+            exit_with_error("  Error found on world: the data.json file is missing")
 
-    return result
 
+def check_team_name(team, fail=exit_with_error):
+    if not verify_name(team):
+        fail("  Error found on team:", team, "the name is invalid", field="slug")
+    if len(team) < 2:
+        fail("  Error found on team:", team, "the name is too short", field="slug")
+    if len(team) > 4:
+        fail("  Error found on team:", team, "the name is too long", field="slug")
 
-def check_locations():
-    print("Checking locations")
-    if not verify_image("logo", "world"):
-        exit_with_error("Error: the world logo image is missing")
 
-    json_file = "world/data.json"
+def check_team(stadiums, locations, team):
+    check_team_name(team)
+    if not verify_image("shield", "teams/{team}".format(team=team)):
+        exit_with_error("Error: the team", team, "shield image is missing", field="shield", path="teams/{team}/shield".format(team=team))
+    json_file = "teams/{team}/data.json".format(team=team)
     if (os.path.isfile(json_file)):
         with open(json_file) as json_file:
             try:
-                data = json.load(json_file)
-
-                name = data["name"] if "name" in data else exit_with_error("  Error found on world the name is missing")
-                if (len(name) == 0):
-                    exit_with_error("  Error found on world the name is empty")
-                for language, localizedName in name.items():
-                    if (language not in SUPPORTED_LANGUAGES):
-                        exit_with_error("  Error found on world unknown language:", language, "on name")
-                    if len(localizedName) == 0:
-                        exit_with_error("  Error found on world the name is empty", localizedName)
-
-                nickname = data["nickname"] if "nickname" in data else exit_with_error("  Error found on world the nickname is missing")
-                if (len(nickname) == 0):
-                    exit_with_error("  Error found on world the nickname is empty")
-                for language, localizedNickname in nickname.items():
-                    if (language not in SUPPORTED_LANGUAGES):
-                        exit_with_error("  Error found on world unknown language:", language, "on nickname")
-                    if len(localizedNickname) == 0:
-                        exit_with_error("  Error found on world the nickname is empty", localizedNickname)
-                
-                confederations = os.listdir("world")
-
-                return World(name, nickname, check_locations_confederations(confederations))
+                data = load_json(json_file)
+                return Team(*VALIDATORS["team"](team, data, stadiums=stadiums, locations=locations))
             except Exception as e:
-                exit_with_error("  Error found on world: error parsing json data", e)
+                exit_with_error("  Error found on team:", team, "error parsing json data", e)
     else:
-        exit_with_error("  Error found on world: the data.json file is missing")
+        exit_with_error("  Error found on team:", team, "the data.json file is missing")
+
+
+def team_dependencies(team):
+    return [
+        "stadium/{stadium}".format(stadium=team.stadium),
+        "world/{w.continent}/{w.country}/{w.region}/{w.city}".format(w=team.world),
+    ]
 
 
-def check_teams(stadiums, locations):
+def check_teams(stadiums, locations, pool=None, cache=None):
     print("Checking teams")
-    teams = {}
-    for team in os.listdir("teams"):
-        if not verify_name(team):
-            exit_with_error("  Error found on team:", team, "the name is invalid")
-        if len(team) < 2:
-            exit_with_error("  Error found on team:", team, "the name is too short")
-        if len(team) > 4:
-            exit_with_error("  Error found on team:", team, "the name is too long")
-        if not verify_image("shield", "teams/{team}".format(team=team)):
-            exit_with_error("Error: the team", team, "shield image is missing")
-        json_file = "teams/{team}/data.json".format(team=team)
+    teams = os.listdir("teams")
+    paths = ["teams/{team}".format(team=team) for team in teams]
+    return checked(teams, map_cached_checks(pool, cache, partial(check_team, stadiums, locations), teams, paths, team_dependencies))
+
+
+def check_competitions_dates():
+    with checking("competitions"):
+        result = {
+            "calendar": [],
+            "dates": {},
+            "competitions": {}
+        }
+
+        json_file = "competitions/data.json"
         if (os.path.isfile(json_file)):
             with open(json_file) as json_file:
                 try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on team:", team, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on team:", team, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on team:", team, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on team:", team, "the name is empty", localizedName)
-
-                    nickname = data["nickname"] if "nickname" in data else exit_with_error("  Error found on team:", team, "the nickname is missing")
-                    if (len(nickname) == 0):
-                        exit_with_error("  Error found on team:", team, "the nickname is empty")
-                    for language, localizedNickname in nickname.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on team:", team, "unknown language:", language, "on nickname")
-                        if len(localizedNickname) == 0:
-                            exit_with_error("  Error found on team:", team, "the nickname is empty", localizedNickname)
-
-                    acronym = data["acronym"] if "acronym" in data else exit_with_error("  Error found on team:", team, "the acronym is missing")
-                    if (len(acronym) == 0):
-                        exit_with_error("  Error found on team:", team, "the acronym is empty")
-                    for language, localizedAcronym in acronym.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on team:", team, "unknown language:", language, "on acronym")
-                        if len(localizedAcronym) == 0:
-                            exit_with_error("  Error found on team:", team, "the acronym is empty", localizedAcronym)
-                        if localizedAcronym.upper() != localizedAcronym:
-                            exit_with_error("  Error found on team:", team, "the acronym is not all caps", localizedAcronym)
-
-                    stadium = data["stadium"] if "stadium" in data else exit_with_error("  Error found on team:", team, "the stadium is missing")
-                    if (len(stadium) == 0):
-                        exit_with_error("  Error found on team:", team, "the stadium is empty")
-                    if not stadium in stadiums:
-                        exit_with_error("  Error found on team:", team, "the stadium", stadium, "is missing on stadium list")
-
-                    world = data["world"] if "world" in data else exit_with_error("  Error found on team:", team, "the world is missing")
-                    continent = world["continent"] if "continent" in world else exit_with_error("  Error found on team:", team, "the continent is missing")
-                    country = world["country"] if "country" in world else exit_with_error("  Error found on team:", team, "the country is missing")
-                    region = world["region"] if "region" in world else exit_with_error("  Error found on team:", team, "the region is missing")
-                    city = world["city"] if "city" in world else exit_with_error("  Error found on team:", team, "the city is missing")
-
-                    if not continent in locations.confederations:
-                        exit_with_error("  Error found on team:", team, "the continent", continent, "is missing on locations list")
-                    if not country in locations.confederations[continent].countries:
-                        exit_with_error("  Error found on team:", team, "the country", country, "is missing on locations list")
-                    if not region in locations.confederations[continent].countries[country].regions:
-                        exit_with_error("  Error found on team:", team, "the region", region, "is missing on locations list")
-                    if not city in locations.confederations[continent].countries[country].regions[region].cities:
-                        exit_with_error("  Error found on team:", team, "the city", city, "is missing on locations list")
-
-                    teams[team] = Team(name, nickname, acronym, stadium, Location(continent, country, region, city))
+                    data = load_json(json_file)
+
+                    for date, competitions in data.items():
+                        result["calendar"].append(date)
+                        for competition in competitions:
+                            if competition in result["dates"]:
+                                result["dates"][competition].append(date)
+                            else:
+                                result["dates"][competition] = [date]
+                            if not competition in result["competitions"]:
+                                result["competitions"][competition] = {}
                 except Exception as e:
-                    exit_with_error("  Error found on team:", team, "error parsing json data", e)
+                    exit_with_error("  Error found on competitions: error parsing json data", e)
         else:
-            exit_with_error("  Error found on team:", team, "the data.json file is missing")
-    return teams
+            exit_with_error("  Error found on competitions: the data.json file is missing")
+        return result
 
 
 def check_competitions(teams):
     print("Checking competitions")
-    result = {
-        "dates": {},
-        "competitions": {}
-    }
-
-    json_file = "competitions/data.json"
-    if (os.path.isfile(json_file)):
-        with open(json_file) as json_file:
-            try:
-                data = json.load(json_file)
-
-                for date, competitions in data.items():
-                    for competition in competitions:
-                        if competition in result["dates"]:
-                            result["dates"][competition].append(date)
-                        else:
-                            result["dates"][competition] = [date]
-                        if not competition in result["competitions"]:
-                            result["competitions"][competition] = {}
-            except Exception as e:
-                exit_with_error("  Error found on competitions: error parsing json data", e)
-    else:
-        exit_with_error("  Error found on competitions: the data.json file is missing")
+    result = check_competitions_dates()
+    if result is None:
+        return None
 
     for competition in os.listdir("competitions"):
         if not os.path.isdir(os.path.join("competitions", competition)):
             continue
-        if not competition in result["competitions"]:
-            exit_with_error("  Error found on competition:", competition, "the competition is not in the list of competitions")
-        if not verify_image("logo", "competitions/{competition}".format(competition=competition)):
-            exit_with_error("  Error found on competition:", competition, "the logo is missing")
-
-        json_file = "competitions/{competition}/data.json".format(competition=competition)
-        if (os.path.isfile(json_file)):
-            with open(json_file) as json_file:
-                try:
-                    data = json.load(json_file)
-
-                    name = data["name"] if "name" in data else exit_with_error("  Error found on competition:", competition, "the name is missing")
-                    if (len(name) == 0):
-                        exit_with_error("  Error found on competition:", competition, "the name is empty")
-                    for language, localizedName in name.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on competition:", competition, "unknown language:", language, "on name")
-                        if len(localizedName) == 0:
-                            exit_with_error("  Error found on competition:", competition, "the name is empty", localizedName)
-
-                    nickname = data["nickname"] if "nickname" in data else exit_with_error("  Error found on competition:", competition, "the nickname is missing")
-                    if (len(nickname) == 0):
-                        exit_with_error("  Error found on competition:", competition, "the nickname is empty")
-                    for language, localizedNickname in nickname.items():
-                        if (language not in SUPPORTED_LANGUAGES):
-                            exit_with_error("  Error found on competition:", competition, "unknown language:", language, "on nickname")
-                        if len(localizedNickname) == 0:
-                            exit_with_error("  Error found on competition:", competition, "the nickname is empty", localizedNickname)
-
-                    mechanics = data["mechanics"] if "mechanics" in data else exit_with_error("  Error found on competition:", competition, "the mechanics is missing")
-                    if (len(mechanics) == 0):
-                        exit_with_error("  Error found on competition:", competition, "the mechanics is empty")
-                    if not mechanics in SUPPORTED_MECHANICS:
-                        exit_with_error("  Error found on competition:", competition, "the mechanics is invalid")
-
-                    relegation = None
-                    if "relegation" in data:
-                        relegation = data["relegation"]
-                        if not relegation in result["competitions"]:
-                            exit_with_error("  Error found on competition:", competition, "the relegation", relegation, "is not in the list of competitions")
-
-                    promotion = None
-                    if "promotion" in data:
-                        promotion = data["promotion"]
-                        if not promotion in result["competitions"]:
-                            exit_with_error("  Error found on competition:", competition, "the promotion", promotion, "is not in the list of competitions")
-
-                    teams_source = data["teams_source"] if "teams_source" in data else None
-                    if teams_source != None:
-                        competition_teams = []
-                    else:
-                        competition_teams = data["teams"] if "teams" in data else exit_with_error("  Error found on competition:", competition, "the teams is missing")
-                        for team in competition_teams:
-                            if not team in teams:
-                                exit_with_error("  Error found on competition:", competition, "the team", team, "is not in the list of teams")
-
-                    result["competitions"][competition] = Competition(name, nickname, mechanics, relegation, promotion, competition_teams, teams_source)
-                except Exception as e:
-                    exit_with_error("  Error found on competition:", competition, "error parsing json data", e)
-        else:
-            exit_with_error("  Error found on competition:", competition, "the data.json file is missing")
+        with checking("competitions/{competition}".format(competition=competition)):
+            if not competition in result["competitions"]:
+                exit_with_error("  Error found on competition:", competition, "the competition is not in the list of competitions")
+            if not verify_image("logo", "competitions/{competition}".format(competition=competition)):
+                exit_with_error("  Error found on competition:", competition, "the logo is missing", field="logo", path="competitions/{competition}/logo".format(competition=competition))
+
+            json_file = "competitions/{competition}/data.json".format(competition=competition)
+            if (os.path.isfile(json_file)):
+                with open(json_file) as json_file:
+                    try:
+                        data = load_json(json_file)
+                        result["competitions"][competition] = Competition(*VALIDATORS["competition"](competition, data, competitions=result["competitions"], teams=teams))
+                    except Exception as e:
+                        exit_with_error("  Error found on competition:", competition, "error parsing json data", e)
+            else:
+                exit_with_error("  Error found on competition:", competition, "the data.json file is missing")
+        if type(result["competitions"].get(competition)) is not Competition:
+            # Only reachable while collecting, a broken competition stays out of the later checks.
+            result["competitions"].pop(competition, None)
 
     return result
 
 
-def check_teams_has_competitions(teams, competitions):
-    for team in teams:
-        found = False
-        for name, competition in competitions["competitions"].items():
-            if skip_competition(name):
-                continue
-            if team in competition_teams(competitions, competition):
-                found = True
-                break
-        if not found:
-            exit_with_error("  Error found on team:", team, "the team is not in the list of competitions")
-    return True
-
-
-def check_mechanics(competitions):
-    print("Checking mechanics")
-    for competition in competitions["competitions"]:
-        if skip_competition(competition):
-            continue
-        comp = competitions["competitions"][competition]
-        dates = competitions["dates"][competition]
-        mechanics = SUPPORTED_MECHANICS[comp.mechanics]
-        if len(competition_teams(competitions, comp)) != mechanics.teams:
-            exit_with_error("  Error found on competition:", competition, "the number of teams is invalid, expected", mechanics.teams, "got", len(competition_teams(competitions, comp)))
-        if len(dates) != mechanics.dates:
-            exit_with_error("  Error found on competition:", competition, "the number of dates is invalid, expected", mechanics.dates, "got", len(dates))
+class CompetitionIndex:
+    def __init__(self, teams, members, entries):
+        self.teams = teams
+        self.members = members
+        self.entries = entries
 
 
-def competition_teams(competitions, competition):
-    if type(competition) is not Competition:
-        comp = competitions["competitions"][competition]
-    else:
-        comp = competition
+def expand_competition_teams(competitions, competition, expanded, path):
+    if competition in expanded:
+        return expanded[competition]
+    if competition in path:
+        exit_with_error("  Error found on competition:", path[0], "the teams source has a cycle:", " -> ".join(path[path.index(competition):] + [competition]), field="teams_source")
+    comp = competitions["competitions"][competition]
     if comp.teams_source != None:
         teams = []
         for source in comp.teams_source:
-            teams.extend(competition_teams(competitions, source))
-        return teams
+            if type(competitions["competitions"].get(source)) is not Competition:
+                exit_with_error("  Error found on competition:", competition, "the teams source", source, "is not in the list of competitions", field="teams_source")
+            teams.extend(expand_competition_teams(competitions, source, expanded, path + [competition]))
+        expanded[competition] = tuple(teams)
     elif comp.teams != None:
-        return comp.teams
+        expanded[competition] = tuple(comp.teams)
     else:
-        return []
+        expanded[competition] = ()
+    return expanded[competition]
 
 
-def check_regions(teams, competitions, regions, number):
-    regional_teams = {}
-    for team in teams:
-        if teams[team].world.region in regions:
-            regional_teams[team] = 0
+def index_competitions(competitions):
+    expanded = {}
+    teams = {}
+    entries = {}
     for competition in competitions["competitions"]:
         if skip_competition(competition):
             continue
+        with checking("competitions/{competition}".format(competition=competition)):
+            teams[competition] = expand_competition_teams(competitions, competition, expanded, [])
+            for team in teams[competition]:
+                entries.setdefault(team, set()).add(competition)
+    members = {competition: frozenset(competition_teams) for competition, competition_teams in teams.items()}
+    return CompetitionIndex(teams, members, {team: frozenset(entry) for team, entry in entries.items()})
+
+
+def check_teams_has_competitions(teams, index):
+    for team in teams:
+        with checking("teams/{team}".format(team=team)):
+            if not team in index.entries:
+                exit_with_error("  Error found on team:", team, "the team is not in the list of competitions")
+    return True
+
+
+def check_mechanics(competitions, index):
+    print("Checking mechanics")
+    for competition, competition_teams in index.teams.items():
         comp = competitions["competitions"][competition]
-        for competition_team in competition_teams(competitions, comp):
-            if competition_team in regional_teams:
-                regional_teams[competition_team] += 1
-    for team, count in regional_teams.items():
-        if count != number:
-            print("team", team, "has", count, "competitions, expected", number)
-
-
-stadiums = check_stadiums()
-locations = check_locations()
-teams = check_teams(stadiums, locations)
-competitions = check_competitions(teams)
-check_teams_has_competitions(teams, competitions)
-check_mechanics(competitions)
-
-print("Regional checks:")
-check_regions(teams, competitions, ["sp"], 2)
-check_regions(teams, competitions, ["pr", "rs", "sc"], 3)
-
-print("\nReport:")
-
-confs = locations.confederations
-print(len(confs), "continents")
-print(sum([len(confs[conf].countries) for conf in confs]), "countries")
-print(sum([sum([len(confs[conf].countries[country].regions) for country in confs[conf].countries]) for conf in confs]), "regions")
-print(sum([sum([sum([len(confs[conf].countries[country].regions[region].cities) for region in confs[conf].countries[country].regions]) for country in confs[conf].countries]) for conf in confs]), "cities")
-print(len(teams), "teams")
-print(len(competitions["competitions"]) -1, "competitions") # -1 because of vacation
-
-print("\nAll done, everything looks good!")
+        dates = competitions["dates"][competition]
+        mechanics = SUPPORTED_MECHANICS[comp.mechanics]
+        with checking("competitions/{competition}".format(competition=competition)):
+            if len(competition_teams) != mechanics.teams:
+                exit_with_error("  Error found on competition:", competition, "the number of teams is invalid, expected", mechanics.teams, "got", len(competition_teams), field="teams")
+        with checking("competitions/{competition}".format(competition=competition)):
+            if len(dates) != mechanics.dates:
+                exit_with_error("  Error found on competition:", competition, "the number of dates is invalid, expected", mechanics.dates, "got", len(dates), field="dates")
+
+
+class Calendar:
+    def __init__(self, dates, competitions, teams, conflicts, free):
+        self.dates = dates
+        self.competitions = competitions
+        self.teams = teams
+        self.conflicts = conflicts
+        self.free = free
+
+    def dates_of(self, bits):
+        return [date for position, date in enumerate(self.dates) if bits >> position & 1]
+
+    def free_dates(self, team):
+        return self.free & ~self.teams.get(team, 0)
+
+
+def index_calendar(competitions, index):
+    dates = competitions["calendar"]
+    positions = {date: position for position, date in enumerate(dates)}
+
+    def bits_of(competition):
+        bits = 0
+        for date in competitions["dates"].get(competition, []):
+            bits |= 1 << positions[date]
+        return bits
+
+    competition_bits = {competition: bits_of(competition) for competition in index.teams}
+    team_bits = {}
+    conflicts = {}
+    for team, entries in index.entries.items():
+        busy = 0
+        twice = 0
+        for competition in entries:
+            twice |= busy & competition_bits[competition]
+            busy |= competition_bits[competition]
+        team_bits[team] = busy
+        if twice:
+            conflicts[team] = twice
+    free = ((1 << len(dates)) - 1) & ~bits_of("vacation")
+    return Calendar(dates, competition_bits, team_bits, conflicts, free)
+
+
+def check_calendar(calendar, index):
+    print("Checking calendar")
+    for team, overbooked in calendar.conflicts.items():
+        for date in calendar.dates_of(overbooked):
+            booked = [competition for competition in sorted(index.entries[team]) if calendar.competitions[competition] >> calendar.dates.index(date) & 1]
+            with checking("teams/{team}".format(team=team)):
+                record_error("  Error found on team:", team, "the date", date, "is booked by", ", ".join(booked), field="date")
+    if calendar.conflicts:
+        with checking("competitions"):
+            exit_with_error("  Error found on calendar:", len(calendar.conflicts), "teams have more than one match on the same date")
+
+
+def check_regions(teams, index, regions, number):
+    for team in teams:
+        if teams[team].world.region in regions:
+            count = len(index.entries.get(team, ()))
+            if count != number:
+                print("team", team, "has", count, "competitions, expected", number)
+
+
+def check_duplicates(stadiums, locations, teams):
+    # Imported here: the detector builds on geo, which imports this module.
+    import duplicates
+    for duplicate in duplicates.find_duplicates(stadiums, locations, teams):
+        reasons = []
+        if duplicate.distance is not None:
+            reasons.append("{distance:.2f} km apart".format(distance=duplicate.distance))
+        if duplicate.similarity is not None:
+            reasons.append("names {similarity:.0%} alike".format(similarity=duplicate.similarity))
+        print(duplicate.kind, duplicate.first, "and", duplicate.second, "may be the same,", ", ".join(reasons))
+
+
+def verify_competitions(teams):
+    with measuring("competitions"):
+        competitions = check_competitions(teams)
+    if competitions is None:
+        exit(1)
+    with measuring("index_competitions"):
+        index = index_competitions(competitions)
+    with measuring("teams_has_competitions"):
+        check_teams_has_competitions(teams, index)
+    with measuring("mechanics"):
+        check_mechanics(competitions, index)
+    with measuring("calendar"):
+        calendar = index_calendar(competitions, index)
+        check_calendar(calendar, index)
+    return competitions, index
+
+
+def verify(pool=None, cache=None, duplicates=False):
+    with measuring("index_assets"):
+        for root in ASSET_ROOTS:
+            index_assets(root)
+    with measuring("stadiums"):
+        stadiums = check_stadiums(pool, cache)
+    with measuring("locations"):
+        locations = check_locations(pool, cache)
+    # Nothing after can be checked without the world or the competitions file.
+    if locations is None:
+        exit(1)
+    with measuring("teams"):
+        teams = check_teams(stadiums, locations, pool, cache)
+    competitions, index = verify_competitions(teams)
+
+    print("Regional checks:")
+    if REPORT is None or not REPORT.problems:
+        with measuring("regions"):
+            check_regions(teams, index, ["sp"], 2)
+            check_regions(teams, index, ["pr", "rs", "sc"], 3)
+    if duplicates:
+        print("Duplicate checks:")
+        with measuring("duplicates"):
+            check_duplicates(stadiums, locations, teams)
+    return stadiums, locations, teams, competitions, index
+
+
+def report(locations, teams, competitions):
+    print("\nReport:")
+
+    confs = locations.confederations
+    print(len(confs), "continents")
+    print(sum([len(confs[conf].countries) for conf in confs]), "countries")
+    print(sum([sum([len(confs[conf].countries[country].regions) for country in confs[conf].countries]) for conf in confs]), "regions")
+    print(sum([sum([sum([len(confs[conf].countries[country].regions[region].cities) for region in confs[conf].countries[country].regions]) for country in confs[conf].countries]) for conf in confs]), "cities")
+    print(len(teams), "teams")
+    print(len(competitions["competitions"]) -1, "competitions") # -1 because of vacation
+    if METRICS is not None:
+        for phase, values in METRICS.phases.items():
+            print("{seconds:.3f}s {phase}".format(seconds=values["seconds"], phase=phase))
+
+
+def add_verify_arguments(parser):
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes checking stadiums, cities and teams, 0 uses every core")
+    parser.add_argument("--cache", default=CACHE_FILE, help="file keeping the stadiums, cities and teams already validated")
+    parser.add_argument("--no-cache", action="store_true", help="validate every file from scratch, ignoring and not updating the cache")
+    parser.add_argument("-k", "--keep-going", action="store_true", help="keep validating after an error and list every problem found")
+    parser.add_argument("--report", help="json file to write every problem found into, implies --keep-going, - writes to the standard output")
+    parser.add_argument("--duplicates", action="store_true", help="also look for stadiums, cities and teams added twice under different slugs")
+    parser.add_argument("--metrics", help="json file to write the time, memory and reads of every phase into, - writes to the standard output")
+    parser.add_argument("--prometheus", help="file to write the same metrics into in the Prometheus text format, - writes to the standard output")
+
+
+def print_stdout():
+    for text in STDOUT:
+        print(text, end="")
+
+
+def write_output(path, text):
+    # The standard output only gets its texts at exit, in the order they were written, after
+    # everything the tool prints.
+    if path == "-":
+        if not STDOUT:
+            atexit.register(print_stdout)
+        STDOUT.append(text)
+    elif path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as output_file:
+            output_file.write(text)
+        os.replace(path + ".tmp", path)
+
+
+def write_report(path):
+    print("\n{count} problems found".format(count=len(REPORT.problems)))
+    write_output(path, json.dumps(REPORT.to_json(), indent=1) + "\n")
+
+
+def verify_with_arguments(args):
+    global REPORT, METRICS
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    cache = None if args.no_cache else Cache(args.cache)
+    REPORT = Report() if args.keep_going or args.report else None
+    METRICS = Metrics() if args.metrics or args.prometheus else None
+    result = None
+    with ProcessPoolExecutor(jobs) if jobs > 1 else contextlib.nullcontext() as pool:
+        try:
+            with checking(None):
+                result = verify(pool, cache, args.duplicates)
+        finally:
+            if cache is not None:
+                cache.save()
+            # Written even when verify fails, a slow failing run is worth measuring too.
+            if METRICS is not None:
+                write_output(args.metrics, json.dumps(METRICS.to_json(), indent=1) + "\n")
+                write_output(args.prometheus, METRICS.to_prometheus())
+    if REPORT is not None:
+        write_report(args.report)
+        failed = len(REPORT.problems) > 0
+        REPORT = None
+        if failed:
+            exit(1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the dataset integrity")
+    add_verify_arguments(parser)
+    parser.add_argument("--watch", action="store_true", help="keep the dataset in memory and revalidate the files changed until interrupted")
+    parser.add_argument("--poll", action="store_true", help="watch by polling the files instead of inotify")
+    args = parser.parse_args()
+
+    if args.watch:
+        import watch
+        watch.watch(args)
+        return
+
+    stadiums, locations, teams, competitions, index = verify_with_arguments(args)
+
+    report(locations, teams, competitions)
+    print("\nAll done, everything looks good!")
+
+
+if __name__ == "__main__":
+    main()
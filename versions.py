@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# Content hashed dataset versions and the deltas between them.
+#
+# A version is a Merkle tree over DATASET_ROOTS: a file hashes its content and a
+# directory hashes the sorted "kind hash name" lines of its children, so the root
+# hash names the whole dataset. Every built version keeps its manifest (the tree of
+# hashes) and the content of its files in a content addressed object store, so a
+# delta can be made between any two of them. Comparing two manifests only descends
+# into directories whose hashes differ.
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+
+import verify
+
+
+DATASET_ROOTS = ["world", "stadium", "teams", "competitions"]
+VERSIONS_DIR = "{build}/versions".format(build=verify.BUILD_DIR)
+DELTAS_DIR = "{build}/deltas".format(build=verify.BUILD_DIR)
+VERSION_FILE = ".dataset-version"
+EMPTY = "empty"
+
+
+def object_path(digest, directory=VERSIONS_DIR):
+    return "{directory}/objects/{prefix}/{rest}".format(directory=directory, prefix=digest[:2], rest=digest[2:])
+
+
+def tree_hash(children):
+    lines = "".join("{kind} {hash} {name}\n".format(kind="tree" if "children" in node else "blob", hash=node["hash"], name=name) for name, node in sorted(children.items()))
+    return hashlib.sha1(lines.encode("utf-8")).hexdigest()
+
+
+def hash_tree(path, previous, stored, directory=VERSIONS_DIR):
+    # A file keeps the hash of the previous version while its size and mtime match.
+    children = {}
+    previous_children = previous.get("children", {}) if previous is not None else {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            old = previous_children.get(entry.name)
+            if entry.is_dir():
+                children[entry.name] = hash_tree(entry.path, old, stored, directory)
+                continue
+            stat = entry.stat()
+            if old is not None and not "children" in old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+                children[entry.name] = old
+                continue
+            with open(entry.path, "rb") as data_file:
+                data = data_file.read()
+            digest = hashlib.sha1(data).hexdigest()
+            target = object_path(digest, directory)
+            if not os.path.isfile(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target + ".tmp", "wb") as object_file:
+                    object_file.write(data)
+                os.replace(target + ".tmp", target)
+                stored.append(digest)
+            children[entry.name] = {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    return {"hash": tree_hash(children), "children": children}
+
+
+def load_manifest(version, directory=VERSIONS_DIR):
+    if version == EMPTY:
+        return {"hash": EMPTY, "children": {}}
+    path = "{directory}/{version}.json".format(directory=directory, version=version)
+    if not os.path.isfile(path):
+        verify.exit_with_error("Error: the version", version, "is not in", directory)
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def latest_version(directory=VERSIONS_DIR):
+    path = "{directory}/latest".format(directory=directory)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as latest_file:
+        return latest_file.read().strip()
+
+
+def build_version(directory=VERSIONS_DIR):
+    latest = latest_version(directory)
+    previous = load_manifest(latest, directory) if latest is not None else None
+    stored = []
+    children = {}
+    for root in DATASET_ROOTS:
+        children[root] = hash_tree(root, previous["children"].get(root) if previous is not None else None, stored, directory)
+    manifest = {"hash": tree_hash(children), "children": children}
+    verify.write_output("{directory}/{version}.json".format(directory=directory, version=manifest["hash"]), json.dumps(manifest, separators=(",", ":")))
+    verify.write_output("{directory}/latest".format(directory=directory), manifest["hash"] + "\n")
+    return manifest, stored
+
+
+class Delta:
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        self.removed = []
+        self.files = {}
+
+
+def diff_trees(old, new, path, delta):
+    if old is not None and new is not None and old["hash"] == new["hash"]:
+        return
+    if new is None:
+        delta.removed.append(path)
+        return
+    if old is not None and ("children" in old) != ("children" in new):
+        # A file replaced by a directory or the other way around.
+        delta.removed.append(path)
+        old = None
+    if not "children" in new:
+        delta.files[path] = new["hash"]
+        return
+    old_children = old["children"] if old is not None else {}
+    for name in sorted(set(old_children) | set(new["children"])):
+        diff_trees(old_children.get(name), new["children"].get(name), path + "/" + name if path else name, delta)
+
+
+def diff_versions(source, target, directory=VERSIONS_DIR):
+    delta = Delta(source, target)
+    diff_trees(load_manifest(source, directory), load_manifest(target, directory), "", delta)
+    return delta
+
+
+def write_delta(delta, path, directory=VERSIONS_DIR):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with zipfile.ZipFile(path + ".tmp", "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("delta.json", json.dumps({"from": delta.source, "to": delta.target, "removed": delta.removed, "files": delta.files}, separators=(",", ":")))
+        for file_path, digest in delta.files.items():
+            archive.write(object_path(digest, directory), "files/" + file_path)
+    os.replace(path + ".tmp", path)
+
+
+def delta_target(root, path):
+    # Bundle paths are relative to the dataset root and must stay under it.
+    parts = path.split("/")
+    if os.path.isabs(path) or "\\" in path or any(part == "" or part.startswith(".") for part in parts):
+        verify.exit_with_error("Error: the delta path", repr(path), "is not a path inside the dataset")
+    target = os.path.join(root, *parts)
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([real_root, os.path.realpath(target)]) != real_root:
+        verify.exit_with_error("Error: the delta path", repr(path), "leads outside", root)
+    return target
+
+
+def apply_delta(bundle, root):
+    # Every path and file is checked before anything changes. The new files are staged
+    # inside the root first, so the removals and moves only start once all of them exist.
+    version_file = os.path.join(root, VERSION_FILE)
+    current = EMPTY
+    if os.path.isfile(version_file):
+        with open(version_file) as version:
+            current = version.read().strip()
+    with zipfile.ZipFile(bundle) as archive:
+        delta = json.loads(archive.read("delta.json"))
+        if delta["from"] != current:
+            verify.exit_with_error("Error: the delta goes from version", delta["from"], "but", root, "is at", current)
+        removed = [delta_target(root, path) for path in delta["removed"]]
+        files = {}
+        for path, digest in delta["files"].items():
+            target = delta_target(root, path)
+            data = archive.read("files/" + path)
+            if hashlib.sha1(data).hexdigest() != digest:
+                verify.exit_with_error("Error: the delta file", path, "does not match its hash")
+            files[target] = data
+
+    staging = os.path.join(root, ".delta-staging")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        staged = []
+        for position, (target, data) in enumerate(files.items()):
+            with open(os.path.join(staging, str(position)), "wb") as data_file:
+                data_file.write(data)
+            staged.append((os.path.join(staging, str(position)), target))
+        for target in removed:
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            elif os.path.lexists(target):
+                os.remove(target)
+        for source, target in staged:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    with open(version_file + ".tmp", "w") as version:
+        version.write(delta["to"] + "\n")
+    os.replace(version_file + ".tmp", version_file)
+    return delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Version the dataset by content hash and make delta bundles between versions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="verify the dataset and record it as a version")
+    verify.add_verify_arguments(build)
+    delta = commands.add_parser("delta", help="write the bundle updating a version into another")
+    delta.add_argument("source", nargs="?", default=EMPTY, help="version the clients have, defaults to none for a full bundle")
+    delta.add_argument("target", nargs="?", help="version to update to, defaults to the latest built")
+    delta.add_argument("-o", "--output", help="bundle file to write, defaults to " + DELTAS_DIR + "/SOURCE-TARGET.zip")
+    apply = commands.add_parser("apply", help="apply a delta bundle to a copy of the dataset")
+    apply.add_argument("bundle", help="delta bundle to apply")
+    apply.add_argument("root", help="dataset directory to update, created when missing")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        verify.verify_with_arguments(args)
+        manifest, stored = build_version()
+        print("\nVersion", manifest["hash"], "with", len(stored), "new files stored")
+    elif args.command == "delta":
+        target = args.target or latest_version()
+        if target is None:
+            verify.exit_with_error("Error: no version built yet, run versions.py build first")
+        delta = diff_versions(args.source, target)
+        output = args.output or "{directory}/{source}-{target}.zip".format(directory=DELTAS_DIR, source=args.source[:12], target=target[:12])
+        write_delta(delta, output)
+        print(len(delta.files), "files changed,", len(delta.removed), "removed,", os.path.getsize(output), "bytes written to", output)
+    else:
+        os.makedirs(args.root, exist_ok=True)
+        delta = apply_delta(args.bundle, args.root)
+        print(args.root, "updated to version", delta["to"], "with", len(delta["files"]), "files changed and", len(delta["removed"]), "removed")
+
+
+if __name__ == "__main__":
+    main()
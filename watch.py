@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import os
+import select
+import struct
+import time
+import traceback
+from functools import partial
+
+import verify
+
+
+WATCHED_ROOTS = ["stadium", "teams", "world", "competitions"]
+POLL_INTERVAL = 0.25
+DEBOUNCE = 0.02
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct("iIII")
+
+
+class Change:
+    def __init__(self, path, directory):
+        self.path = path
+        self.directory = directory
+
+
+class InotifyWatcher:
+    # inotify is not recursive: every directory gets its own watch, and directories
+    # created later are added as their events arrive.
+    def __init__(self, roots):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+        try:
+            for root in roots:
+                self.add_tree(root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_tree(self, root):
+        for directory, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed on " + directory)
+            self.paths[wd] = directory
+
+    def read(self):
+        changes = []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changes
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0"))
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                changes.append(Change(None, True))
+                continue
+            if not wd in self.paths:
+                continue
+            path = os.path.join(self.paths[wd], name) if name else self.paths[wd]
+            directory = mask & IN_ISDIR != 0
+            if directory and mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):
+                self.add_tree(path)
+            changes.append(Change(path, directory))
+        return changes
+
+    def wait(self):
+        select.select([self.fd], [], [])
+        # Editors save through temporary files and renames: gather the whole burst.
+        changes = self.read()
+        while select.select([self.fd], [], [], DEBOUNCE)[0]:
+            changes.extend(self.read())
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, roots):
+        self.roots = roots
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        directories = list(self.roots)
+        while directories:
+            directory = directories.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        stat = entry.stat(follow_symlinks=False)
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size, is_dir)
+                        if is_dir:
+                            directories.append(entry.path)
+            except OSError:
+                continue
+        return snapshot
+
+    def wait(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            snapshot = self.scan()
+            changes = [Change(path, stamp[2]) for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp]
+            changes.extend(Change(path, stamp[2]) for path, stamp in self.snapshot.items() if not path in snapshot)
+            self.snapshot = snapshot
+            if changes:
+                return changes
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots, poll=False):
+    if not poll:
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            print("inotify is not available ({error}), polling every {interval}s instead".format(error=e, interval=POLL_INTERVAL))
+    return PollingWatcher(roots)
+
+
+def within(path, scope):
+    for prefix in scope:
+        if prefix is None or path is not None and (path == prefix or path.startswith(prefix + "/")):
+            return True
+    return False
+
+
+class Workspace:
+    # Keeps the validated graph in memory. A change rechecks the entities it touches and
+    # the teams pointing to them; problems are kept per check so fixing a file clears
+    # only the problems it caused.
+    def __init__(self, cache):
+        self.cache = cache
+        self.problems = {}
+        self.failed = {}
+        self.found = []
+        self.stadiums = {}
+        self.locations = None
+        self.teams = {}
+        self.competitions = None
+        self.index = None
+
+    def run(self, phase, scope, check, *args):
+        # Entities failed in other checks stay failed, so references to them are not reported.
+        others = set().union(*(paths for key, paths in self.failed.items() if key != phase))
+        kept = {path for path in self.failed.get(phase, ()) if not within(path, scope)}
+        verify.REPORT = verify.Report(kept | others)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), verify.checking(None):
+                return check(*args)
+        finally:
+            problems = verify.REPORT.problems
+            self.failed[phase] = verify.REPORT.failed - others
+            verify.REPORT = None
+            for key in [key for key in self.problems if key[0] == phase and within(key[1], scope)]:
+                del self.problems[key]
+            for problem in problems:
+                self.problems.setdefault((phase, problem.path), []).append(problem)
+            self.found.extend(problems)
+
+    def load(self):
+        verify.index_assets.cache_clear()
+        self.stadiums = self.run("entities", ["stadium"], verify.check_stadiums, None, self.cache) or {}
+        self.locations = self.run("entities", ["world"], verify.check_locations, None, self.cache)
+        if self.locations is None:
+            self.run("entities", ["teams"], lambda: None)
+            self.teams = {}
+        else:
+            self.teams = self.run("entities", ["teams"], verify.check_teams, self.stadiums, self.locations, None, self.cache) or {}
+        self.check_competitions()
+
+    def check_competitions(self):
+        result = self.run("competitions", [None], verify.verify_competitions, self.teams)
+        self.competitions, self.index = result or (None, None)
+
+    def check_entity(self, entities, slug, path, check, *args):
+        if os.path.isdir(path):
+            entity = self.run("entities", [path], verify.check_entity, partial(check, *args), path, slug)
+        else:
+            entity = self.run("entities", [path], lambda: None)
+        if entity is None:
+            entities.pop(slug, None)
+        else:
+            entities[slug] = entity
+
+    def region(self, path):
+        _, confederation, country, region = path.split("/")
+        try:
+            return self.locations.confederations[confederation].countries[country].regions[region]
+        except (AttributeError, KeyError):
+            return None
+
+    def update(self, changes):
+        stadiums, cities, teams = set(), set(), set()
+        reload = competitions = False
+        for change in changes:
+            if change.path is None:
+                reload = True
+                continue
+            parts = os.path.normpath(change.path).split(os.sep)
+            entity = parts if change.directory else parts[:-1]
+            if parts[0] == "stadium" and len(entity) > 1:
+                stadiums.add(entity[1])
+            elif parts[0] == "teams" and len(entity) > 1:
+                teams.add(entity[1])
+            elif parts[0] == "world" and len(entity) > 4:
+                cities.add("/".join(entity[:5]))
+            elif parts[0] == "world":
+                reload = True
+            elif parts[0] == "competitions":
+                competitions = True
+
+        self.found = []
+        verify.index_assets.cache_clear()
+        if reload or any(self.region(os.path.dirname(city)) is None for city in cities):
+            self.load()
+            return "the whole dataset"
+
+        for stadium in stadiums:
+            self.check_entity(self.stadiums, stadium, "stadium/" + stadium, verify.check_stadium)
+        for city in cities:
+            base_path, slug = os.path.split(city)
+            self.check_entity(self.region(base_path).cities, slug, city, verify.check_city, base_path, os.listdir(base_path))
+        if stadiums or cities:
+            # Teams already failing may have been waiting for the stadium or city.
+            changed = set("stadium/" + stadium for stadium in stadiums) | cities
+            teams.update(team for team, value in self.teams.items() if changed & set(verify.team_dependencies(value)))
+            teams.update(team for team in os.listdir("teams") if not team in self.teams)
+        for team in teams:
+            self.check_entity(self.teams, team, "teams/" + team, verify.check_team, self.stadiums, self.locations)
+        if teams or competitions:
+            self.check_competitions()
+        return ", ".join(filter(None, [
+            count(len(stadiums), "stadium"),
+            count(len(cities), "city", "cities"),
+            count(len(teams), "team"),
+            "the competitions" if teams or competitions else "",
+        ])) or "nothing"
+
+
+def count(number, singular, plural=None):
+    if number == 0:
+        return ""
+    return "{number} {noun}".format(number=number, noun=singular if number == 1 else plural or singular + "s")
+
+
+def print_problems(problems):
+    for problem in problems:
+        print("  {path}: {message}".format(path=problem.path or "dataset", message=problem.message))
+
+
+def watch(args):
+    cache = None if args.no_cache else verify.Cache(args.cache)
+    workspace = Workspace(cache)
+    started = time.perf_counter()
+    workspace.load()
+    if cache is not None:
+        cache.save()
+    problems = [problem for problems in workspace.problems.values() for problem in problems]
+    print_problems(problems)
+    print("Loaded in {elapsed:.0f}ms, {problems}".format(elapsed=(time.perf_counter() - started) * 1000, problems=count(len(problems), "problem") or "everything looks good"))
+
+    watcher = create_watcher(WATCHED_ROOTS, args.poll)
+    print("Watching", ", ".join(WATCHED_ROOTS), "for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            changes = watcher.wait()
+            started = time.perf_counter()
+            try:
+                rechecked = workspace.update(changes)
+            except Exception:
+                traceback.print_exc()
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            print_problems(workspace.found)
+            total = sum(len(problems) for problems in workspace.problems.values())
+            if total:
+                print("Rechecked {rechecked} in {elapsed:.0f}ms, {total} left".format(rechecked=rechecked, elapsed=elapsed, total=count(total, "problem")))
+            else:
+                print("Rechecked {rechecked} in {elapsed:.0f}ms, everything looks good".format(rechecked=rechecked, elapsed=elapsed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()